@@ -1,13 +1,13 @@
+import json
 import os
+import sys
 import traceback
-import pandas as pd
-from src.data_handler import get_data_summary
-from src.utils import init_prompt, get_coder_prompt, postprocess_code, get_evaluator_prompt, get_coder_init_prompt, get_evaluator_init_prompt
-# from src.ollama_llms import get_coder_response, get_evaluator_response
-from src.openai_llm import get_coder_response, get_evaluator_response
-from src.code_excuter import execute_code, display_figures
+from contextlib import redirect_stderr, redirect_stdout
 
-import json
+from src.dataset_catalog import get_data_entries
+from src.job_scheduler import run_jobs
+from src.metrics import aggregate_metrics, compare_to_baseline, format_aggregate, format_regressions, get_failed_trial_metrics
+from src.workflow import run_trial
 
 model_name_list = [
 #    "gemma3:1b",
@@ -23,23 +23,27 @@ model_name_list = [
     # "exaone-deep:32b",
 ]
 
+n_trials = 20
+# total number of worker processes
+max_workers = 4
+# concurrent trials per model; models missing here use default_model_concurrency
+model_concurrency = {
+    # "deepseek-r1:70b": 1,
+}
+default_model_concurrency = 2
+
+
 coder_temperature = 0.3
 evaluator_temperature = 0.5
+# coder candidates sampled per attempt; more than 1 runs them concurrently and keeps the first that works
+n_candidates = 1
+
+# metrics_summary.json of an earlier run to compare this run against (None: no comparison), and the
+# regression thresholds overriding src/metrics.py REGRESSION_THRESHOLDS, e.g. {"wall_time.p90": 0.3}
+baseline_path = None
+regression_thresholds = {}
 
-# Add default data loading here
-default_file_path = (
-    "brca_umich_proteomics_imputed.csv"  # Default data file in project root
-)
-if os.path.exists(default_file_path):
-    data = pd.read_csv(default_file_path)  # or pd.read_excel() for xlsx
-    data_description = get_data_summary(data)
-    data_entry = [{
-        "file_path": os.path.abspath(default_file_path),
-        "data_description": data_description,
-    }]
-for model_name in model_name_list:
-    print(f"===================model_name: {model_name}====================")
-    user_input = """열: 유전자  
+user_input = """열: 유전자  
     행: 샘플
 
     clustermap의 계층적 클러스터링을 사용하여 클러스터 정의
@@ -55,7 +59,8 @@ for model_name in model_name_list:
     행/열 둘다 색갈 표시되는지 확인
 
     각 클러스터에 해당하는 유전자 print"""
-    qmd_content = f"""---
+
+qmd_header = f"""---
 title: "생성된 시각화 코드"
 format:
     html:
@@ -72,85 +77,56 @@ jupyter: python3
 {user_input}
 ```
 """
-    output_dir = f"benchmark_results_{model_name}"
-    os.makedirs(output_dir, exist_ok=True)
-    for i in range(20):
-        coder_messages = get_coder_init_prompt(data_entry[0]["file_path"])
-        evaluator_messages = get_evaluator_init_prompt()
-
-        prompt = init_prompt(data_entry, user_input)
-
-        coder_messages.append({"role": "user", "content": prompt[0]["content"] + prompt[1]["content"]})
-        evaluator_messages.append({"role": "user", "content": prompt[0]["content"] + prompt[1]["content"]})
-
-        try:
-            coder_response, coder_messages = get_coder_response(model_name=model_name, message=coder_messages, history=True, temperature=coder_temperature)
-        except:
-            coder_response, coder_messages = {"code": "llm error"}, coder_messages
-
-        code = postprocess_code(coder_response["code"])
-        print("===================code====================")
-        print(code)
-        print("===========================================")
-        success = False
-        retry = False
-        max_retries = 20
-        n = 0
-
-
-        while True:
-            scope = {}
-            # 코드에 위험한 함수가 있는지 확인
-            dangerous_functions = ['os.system', 'subprocess.call', 'subprocess.Popen', 'eval', 'exec', 'shutil.rmtree', 'os.remove', 'exit', 'input']
-            
-            # 코드에서 위험한 함수 검사
-            has_dangerous_function = []
-            for func in dangerous_functions:
-                if func in code:
-                    has_dangerous_function.append(func)
-            
-            if has_dangerous_function != []:
-                stdout = stdout = f"Warning: Code contains dangerous function: '{has_dangerous_function}'! ** Never use ['os.system', 'subprocess.call', 'subprocess.Popen', 'eval', 'exec', 'open', 'shutil.rmtree', 'os.remove', 'exit', 'input']**"
-                success = False
-            else:
-                try:
-                    stdout = exec(code,scope)
-                    success = True
-                except Exception as e:
-                    stdout = traceback.format_exc()
-                    success = False
-            print(retry, n < max_retries, not success)
-            if not success:
-                print("===================error====================")
-                print(stdout)
-            else:
-                print("===================success====================")
-                stdout = "No error"
-                print(stdout)
-            # get evaluator prompt
-            evaluator_messages += get_evaluator_prompt(code, stdout)
-            # get evaluator response
-            try:
-                evaluator_response, evaluator_messages = get_evaluator_response(model_name=model_name, message=evaluator_messages, history=True, temperature=evaluator_temperature)
-                retry = evaluator_response["retry"]
-            except:
-                evaluator_response, evaluator_messages = {"retry": False, "comment": "llm error"}, evaluator_messages
-            if (not success) and (n < max_retries and not success):
-                n += 1
-                # get coder prompt
-                coder_messages += get_coder_prompt(code, stdout, evaluator_response["comment"])
-                # get coder response
-                try:
-                    coder_response, coder_messages = get_coder_response(model_name=model_name, message=coder_messages, history=True, temperature=coder_temperature)
-                    code = postprocess_code(coder_response["code"])
-                    print("===================code====================")
-                    print(code)
-                    print("===========================================")
-                except:
-                    coder_response, coder_messages = {"code": "llm error"}, coder_messages
-            else:
-                break
-        qmd_content += f"""
+
+
+def get_output_dir(model_name):
+    return f"benchmark_results_{model_name}"
+
+
+def benchmark_trial(model_name, trial, data_entry):
+    """
+    Run one (model, trial) pair in a worker process.
+
+    The streamed LLM output of the trial goes to its own log file so parallel trials don't interleave.
+    Generated code runs in the execution pool of this worker, never in the worker itself.
+    """
+    log_path = os.path.join(get_output_dir(model_name), f"trial_{trial + 1}.log")
+    with open(log_path, "w", encoding="utf-8") as log, redirect_stdout(log), redirect_stderr(log):
+        return run_trial(model_name, data_entry, user_input, coder_temperature, evaluator_temperature, n_candidates=n_candidates, trial=trial + 1)
+
+
+if __name__ == "__main__":
+    # Add default data loading here
+    default_file_path = (
+        "brca_umich_proteomics_imputed.csv"  # Default data file in project root
+    )
+    if os.path.exists(default_file_path):
+        data_entry = get_data_entries([default_file_path])
+
+    qmd_content = {}
+    for model_name in model_name_list:
+        os.makedirs(get_output_dir(model_name), exist_ok=True)
+        open(f"{get_output_dir(model_name)}/profiles.jsonl", "w").close()
+        open(f"{get_output_dir(model_name)}/metrics.jsonl", "w").close()
+        qmd_content[model_name] = qmd_header
+
+    # interleave models so every model gets workers from the start
+    jobs = [(model_name, i, data_entry) for i in range(n_trials) for model_name in model_name_list]
+    for (model_name, i, _), result, error in run_jobs(jobs, benchmark_trial, max_workers=max_workers, max_per_key=model_concurrency, default_per_key=default_model_concurrency):
+        print(f"===================model_name: {model_name} trial: {i+1}====================")
+        if error is not None:
+            print("".join(traceback.format_exception(error)), file=sys.stderr)
+            code = f"# trial failed: {error!r}"
+            figures = []
+        else:
+            print(f"success: {result['success']} retries: {result['retries']}")
+            code = result["code"]
+            figures = result["figures"]
+        # one structured record per trial, for aggregate_metrics and the baseline comparison
+        metrics = result["metrics"] if error is None else get_failed_trial_metrics(model_name, error)
+        with open(f"{get_output_dir(model_name)}/metrics.jsonl", "a", encoding="utf-8") as f:
+            f.write(json.dumps({**metrics, "trial": i + 1}, ensure_ascii=False) + "\n")
+        qmd_content[model_name] += f"""
 
 ## generated code {i+1}
 ```{{python}}
@@ -158,7 +134,28 @@ jupyter: python3
 ```
 
 """
-        with open(f"{output_dir}/generated_code.qmd", "w", encoding="utf-8") as f:
-            f.write(qmd_content)
-
-
+        # the figures the run saved, so the report shows them even where the code is not executed again
+        for artifact in figures:
+            image = os.path.relpath(artifact["files"].get("png") or next(iter(artifact["files"].values())), get_output_dir(model_name))
+            qmd_content[model_name] += f"![trial {i+1}, figure {artifact['figure'] + 1}]({image})\n\n"
+        with open(f"{get_output_dir(model_name)}/generated_code.qmd", "w", encoding="utf-8") as f:
+            f.write(qmd_content[model_name])
+        if error is None:
+            # one line per attempt: wall/CPU time, peak memory and hot spots of the generated code
+            with open(f"{get_output_dir(model_name)}/profiles.jsonl", "a", encoding="utf-8") as f:
+                for attempt, profile in enumerate(result["profiles"]):
+                    f.write(json.dumps({"trial": i + 1, "attempt": attempt, "profile": profile}, ensure_ascii=False) + "\n")
+
+    records = []
+    for model_name in model_name_list:
+        with open(f"{get_output_dir(model_name)}/metrics.jsonl", encoding="utf-8") as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    aggregates = aggregate_metrics(records)
+    for model_name, aggregate in aggregates.items():
+        print(format_aggregate(model_name, aggregate))
+        with open(f"{get_output_dir(model_name)}/metrics_summary.json", "w", encoding="utf-8") as f:
+            json.dump({model_name: aggregate}, f, ensure_ascii=False, indent=2)
+    if baseline_path is not None:
+        with open(baseline_path, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(format_regressions(compare_to_baseline(aggregates, baseline, regression_thresholds)))
@@ -0,0 +1,102 @@
+"""
+Micro-benchmark for the per-call overhead of the LLM client.
+
+Compares the old behaviour (a new OpenAI client, and therefore a new connection, per call)
+with the pooled client from src/llm_client.py against the local mock server
+(src/mock_server.py) with no token latency.
+
+usage: python client_benchmark.py [n_calls]
+"""
+import statistics
+import sys
+import time
+
+from openai import OpenAI
+
+from src.llm_client import astream_chat_completion, close_clients, get_async_openai_client, get_openai_client, json_schema_format, stream_chat_completion
+from src.llm_scheduler import run_sync
+from src.mock_server import start_server
+from src.output_formats import CODER_OUTPUT_FORMAT
+
+
+def call_legacy(base_url):
+    """
+    Old behaviour: a fresh client per call and the SDK stream helper
+    """
+    client = OpenAI(base_url=base_url + "/v1", api_key='ollama')
+    with client.beta.chat.completions.stream(
+        model="stub",
+        messages=[{"role": "user", "content": "hi"}],
+        response_format=CODER_OUTPUT_FORMAT,
+    ) as stream:
+        for _ in stream:
+            pass
+        return stream.get_final_completion()
+
+
+def call_pooled(base_url):
+    """
+    New behaviour: the shared pooled client, with the stream read to the end
+    """
+    client = get_openai_client(base_url)
+    return list(stream_chat_completion(
+        client,
+        model="stub",
+        messages=[{"role": "user", "content": "hi"}],
+        response_format=json_schema_format(CODER_OUTPUT_FORMAT),
+    ))
+
+
+async def acall_pooled(base_url):
+    """
+    Async path used by get_coder_response: pooled async client on the shared event loop
+    """
+    client = get_async_openai_client(base_url)
+    return [chunk async for chunk in astream_chat_completion(
+        client,
+        model="stub",
+        messages=[{"role": "user", "content": "hi"}],
+        response_format=json_schema_format(CODER_OUTPUT_FORMAT),
+    )]
+
+
+def measure(n_calls, call, base_url):
+    timings = []
+    for _ in range(n_calls):
+        start = time.perf_counter()
+        call(base_url)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def report(name, timings, connections):
+    timings_ms = sorted(t * 1000 for t in timings)
+    p90 = timings_ms[int(len(timings_ms) * 0.9) - 1]
+    print(f"{name:<22} mean {statistics.mean(timings_ms):7.2f} ms | p50 {statistics.median(timings_ms):7.2f} ms | p90 {p90:7.2f} ms | connections {connections}")
+
+
+if __name__ == "__main__":
+    n_calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    server = start_server(ttft=0, tokens_per_sec=0)
+    base_url = server.base_url
+
+    # warm up imports and the server
+    call_legacy(base_url)
+    call_pooled(base_url)
+    run_sync(acall_pooled(base_url))
+
+    server.connections = 0
+    before = measure(n_calls, call_legacy, base_url)
+    report("new client per call", before, server.connections)
+
+    server.connections = 0
+    after = measure(n_calls, call_pooled, base_url)
+    report("pooled client", after, server.connections)
+
+    server.connections = 0
+    after_async = measure(n_calls, lambda url: run_sync(acall_pooled(url)), base_url)
+    report("pooled async client", after_async, server.connections)
+
+    print(f"per-call overhead saved: {(statistics.mean(before) - statistics.mean(after)) * 1000:.2f} ms")
+    close_clients()
+    server.shutdown()
@@ -1,11 +1,12 @@
 import os
 import traceback
-import pandas as pd
-from src.data_handler import get_data_summary
-from src.utils import init_prompt, get_coder_prompt, postprocess_code, get_evaluator_prompt, get_coder_init_prompt, get_evaluator_init_prompt
-# from src.ollama_llms import get_coder_response, get_evaluator_response
-from src.openai_llm import get_coder_response, get_evaluator_response
+from src.dataset_catalog import get_data_entries
+from src.dataset_registry import register_dataset
+from src.utils import init_prompt, build_messages, get_coder_prompt, postprocess_code, get_evaluator_prompt, get_coder_init_prompt, get_evaluator_init_prompt
+# OpenAI-compatible or native Ollama transport: set LLM_BACKEND in .env
+from src.llm_backend import get_coder_response, get_evaluator_response
 from src.code_excuter import execute_code, display_figures
+from src.exec_pool import get_exec_pool
 
 import json
 
@@ -19,12 +20,7 @@ def llm_workflow(model_name, user_input):
         "brca_umich_proteomics_imputed.csv"  # Default data file in project root
     )
     if os.path.exists(default_file_path):
-        data = pd.read_csv(default_file_path)  # or pd.read_excel() for xlsx
-        data_description = get_data_summary(data)
-        data_entry = [{
-            "file_path": os.path.abspath(default_file_path),
-            "data_description": data_description,
-        }]
+        data_entry = get_data_entries([default_file_path])
 
     user_input = """열: 유전자  
     행: 샘플
@@ -43,12 +39,12 @@ def llm_workflow(model_name, user_input):
 
     각 클러스터에 해당하는 유전자 print"""
 
-    coder_messages = get_coder_init_prompt(data_entry[0]["file_path"])
-    evaluator_messages = get_evaluator_init_prompt()
+    datasets = [register_dataset(entry["file_path"]) for entry in data_entry]
 
+    # shared static prompt first, so coder and evaluator calls start with the same cached prefix
     prompt = init_prompt(data_entry, user_input)
-    coder_messages.append({"role": "user", "content": prompt[0]["content"] + prompt[1]["content"]})
-    evaluator_messages.append({"role": "user", "content": prompt[0]["content"] + prompt[1]["content"]})
+    coder_messages = build_messages(prompt, get_coder_init_prompt(data_entry[0]["file_path"]))
+    evaluator_messages = build_messages(prompt, get_evaluator_init_prompt())
 
     coder_response, coder_messages = get_coder_response(model_name=model_name, message=coder_messages, history=True, temperature=coder_temperature)
 
@@ -63,12 +59,9 @@ def llm_workflow(model_name, user_input):
 
 
     while True:
-        try:
-            stdout = exec(code)
-            success = True
-        except Exception as e:
-            stdout = traceback.format_exc()
-            success = False
+        result = get_exec_pool().run(code, datasets=datasets)
+        success = result["success"]
+        stdout = result["error"]
         print(retry, n < max_retries, not success)
         if not success:
             print("===================error====================")
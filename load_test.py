@@ -0,0 +1,45 @@
+"""
+Load test of the workflow orchestration against the local mock server.
+
+Runs the same batch of workflows at increasing scheduler concurrency and reports wall time and
+request throughput, so orchestration overhead and concurrency scaling can be measured on a CPU box.
+
+usage: python load_test.py [n_workflows] [--ttft 0.2] [--tokens-per-sec 50] [--max-parallel 4]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import time
+
+import src.llm_client as llm_client
+from src.mock_server import start_server
+from src.workflow import run_workflows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("n_workflows", type=int, nargs="?", default=16)
+    parser.add_argument("--ttft", type=float, default=0.2)
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0)
+    parser.add_argument("--max-parallel", type=int, default=0, help="server-side parallel generations (0: unlimited)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8, 16])
+    args = parser.parse_args()
+
+    server = start_server(ttft=args.ttft, tokens_per_sec=args.tokens_per_sec, max_parallel=args.max_parallel)
+    llm_client.OLLAMA_URL = server.base_url
+    data_entry = [{"file_path": "mock.csv", "data_description": {}}]
+
+    print(f"{args.n_workflows} workflows, ttft {args.ttft}s, {args.tokens_per_sec} tokens/s")
+    baseline = None
+    for concurrency in args.concurrency:
+        requests_before = server.requests
+        start = time.perf_counter()
+        # the streamed tokens of concurrent runs are just noise here
+        with contextlib.redirect_stdout(io.StringIO()):
+            asyncio.run(run_workflows("mock", data_entry, ["load test"] * args.n_workflows, max_concurrency=concurrency))
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+        n_requests = server.requests - requests_before
+        print(f"concurrency {concurrency:>3}: {elapsed:7.2f} s | {n_requests / elapsed:6.2f} req/s | speedup {baseline / elapsed:5.2f}x")
+    server.shutdown()
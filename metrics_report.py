@@ -0,0 +1,41 @@
+"""
+Per-model percentiles and success curves of benchmark runs, and regression checks against a baseline.
+
+Reads the metrics.jsonl files benchmark.py writes into benchmark_results_{model}/. Exits with
+status 1 when a metric regressed by more than its threshold, so it can gate a change in CI.
+
+usage: python metrics_report.py benchmark_results_*/metrics.jsonl [--baseline baseline.json] [--thresholds thresholds.json] [--save-baseline baseline.json]
+"""
+import argparse
+import json
+import sys
+
+from src.metrics import aggregate_metrics, compare_to_baseline, format_aggregate, format_regressions, read_metrics
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("metrics", nargs="+", help="metrics.jsonl files of the run")
+    parser.add_argument("--baseline", help="aggregates of the baseline run (written with --save-baseline, or a metrics_summary.json)")
+    parser.add_argument("--thresholds", help='JSON file of regression thresholds overriding the defaults, e.g. {"wall_time.p90": 0.3}')
+    parser.add_argument("--save-baseline", help="write the aggregates of this run as a baseline")
+    args = parser.parse_args()
+
+    aggregates = aggregate_metrics(read_metrics(args.metrics))
+    for model, aggregate in aggregates.items():
+        print(format_aggregate(model, aggregate))
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(aggregates, f, ensure_ascii=False, indent=2)
+        print(f"baseline saved to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        thresholds = None
+        if args.thresholds:
+            with open(args.thresholds, encoding="utf-8") as f:
+                thresholds = json.load(f)
+        regressions = compare_to_baseline(aggregates, baseline, thresholds)
+        print(format_regressions(regressions))
+        sys.exit(1 if regressions else 0)
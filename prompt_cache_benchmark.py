@@ -0,0 +1,120 @@
+"""
+Time to first token of a coder/evaluator retry loop with the old and the prefix-stable prompt layout.
+
+The old layout starts every conversation with the role's own system prompt and puts the static
+rules and dataset block in the same user message as the request, so coder and evaluator calls
+share no prefix. The new layout (src/utils.init_prompt + build_messages) starts both with the same
+static message. Runs against the mock server with prompt-cache emulation by default, or a real
+Ollama server with --base-url.
+
+usage: python prompt_cache_benchmark.py [--retries 5] [--prefill-tokens-per-sec 300] [--base-url http://localhost:11434 --model gemma3:12b]
+"""
+import argparse
+import os
+import statistics
+import time
+
+import src.llm_client as llm_client
+from src.dataset_catalog import get_data_entries
+from src.history import compact_messages
+from src.llm_client import astream_chat_completion, get_async_openai_client, get_openai_extra_body, json_schema_format, load_model
+from src.llm_scheduler import run_sync
+from src.mock_server import start_server
+from src.output_formats import CODER_OUTPUT_FORMAT, EVALUATOR_OUTPUT_FORMAT
+from src.utils import build_messages, get_coder_init_prompt, get_coder_prompt, get_evaluator_init_prompt, get_evaluator_prompt, init_prompt
+
+ERROR = "Traceback (most recent call last):\n  File \"<string>\", line 12, in <module>\nKeyError: 'cluster'"
+
+
+def legacy_messages(prompt, role_messages):
+    """
+    Old layout: the role's system prompt first, then static and per-request content in one user message
+    """
+    return role_messages + [{"role": "user", "content": prompt[0]["content"] + prompt[1]["content"]}]
+
+
+async def measure_ttft(model_name, messages, output_format):
+    """
+    Seconds until the first content token, and the full response text
+    """
+    client = get_async_openai_client()
+    start = time.perf_counter()
+    ttft = None
+    text = ""
+    async for chunk in astream_chat_completion(
+        client,
+        model=model_name,
+        messages=messages,
+        response_format=json_schema_format(output_format),
+        max_tokens=4000,
+        extra_body=get_openai_extra_body(),
+    ):
+        if chunk.choices and chunk.choices[0].delta.content:
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            text += chunk.choices[0].delta.content
+    return ttft, text
+
+
+def run_loop(model_name, data_entry, user_input, layout, retries):
+    """
+    Replay a retry loop (coder, evaluator, coder, ...) and return the TTFT of every call
+    """
+    prompt = init_prompt(data_entry, user_input)
+    build = build_messages if layout == "stable" else legacy_messages
+    coder_messages = build(prompt, get_coder_init_prompt(data_entry[0]["file_path"]))
+    evaluator_messages = build(prompt, get_evaluator_init_prompt())
+    ttfts = []
+    for _ in range(retries):
+        ttft, code = run_sync(measure_ttft(model_name, compact_messages(coder_messages, model_name), CODER_OUTPUT_FORMAT))
+        ttfts.append(ttft)
+        coder_messages.append({"role": "assistant", "content": code})
+        evaluator_messages += get_evaluator_prompt(code, ERROR)
+        ttft, comment = run_sync(measure_ttft(model_name, compact_messages(evaluator_messages, model_name, include_replies=True), EVALUATOR_OUTPUT_FORMAT))
+        ttfts.append(ttft)
+        evaluator_messages.append({"role": "assistant", "content": comment})
+        coder_messages += get_coder_prompt(code, ERROR, comment)
+    return ttfts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--retries", type=int, default=5)
+    parser.add_argument("--base-url", help="real Ollama server (default: mock server with prompt-cache emulation)")
+    parser.add_argument("--model", default="mock")
+    parser.add_argument("--data", default="brca_umich_proteomics_imputed.csv")
+    parser.add_argument("--prefill-tokens-per-sec", type=float, default=300.0, help="mock server prompt processing speed")
+    parser.add_argument("--keep-alive", default=None, help="keep_alive sent with every request (e.g. 30m)")
+    parser.add_argument("--num-ctx", type=int, default=None, help="context size sent with every request")
+    args = parser.parse_args()
+
+    if args.keep_alive is not None:
+        llm_client.LLM_KEEP_ALIVE = args.keep_alive
+    if args.num_ctx is not None:
+        llm_client.LLM_NUM_CTX = args.num_ctx
+
+    server = None
+    if args.base_url:
+        llm_client.OLLAMA_URL = args.base_url
+        # load the model first so the first measured call does not include the load time
+        run_sync(load_model(args.model))
+    else:
+        server = start_server(ttft=0.02, tokens_per_sec=0, prefill_tokens_per_sec=args.prefill_tokens_per_sec, prompt_cache=True)
+        llm_client.OLLAMA_URL = server.base_url
+
+    if os.path.exists(args.data):
+        data_entry = get_data_entries([args.data])
+    else:
+        data_entry = [{"file_path": args.data, "data_description": {"shape": (100, 10000), "columns (first 7)": [f"GENE{i}" for i in range(7)]}}]
+    user_input = "Draw a clustermap of the 100 most variable genes per sample cluster and print the genes of each cluster."
+
+    for layout in ("legacy", "stable"):
+        if server is not None:
+            server.prompt_cache = [None] * len(server.prompt_cache)
+        ttfts = run_loop(args.model, data_entry, user_input, layout, args.retries)
+        print(
+            f"{layout:>6}: mean TTFT {statistics.mean(ttfts) * 1000:7.1f} ms | median {statistics.median(ttfts) * 1000:7.1f} ms"
+            f" | first call {ttfts[0] * 1000:7.1f} ms | {len(ttfts)} calls"
+        )
+    if server is not None:
+        server.shutdown()
@@ -0,0 +1,98 @@
+"""
+Time to first success of the sequential retry loop and of the speculative mode.
+
+Runs the same trials against the mock server with both loops. The server serves scripted coder
+responses in random order, a --success-rate fraction of which run; the others fail with a
+traceback the triage recognizes or one that needs the evaluator. Trials run one after another,
+so each time is the latency a user waits for a working plot.
+
+usage: python speculative_benchmark.py [--trials 20] [--candidates 4] [--success-rate 0.3] [--ttft 0.3 --tokens-per-sec 50]
+"""
+import argparse
+import contextlib
+import io
+import statistics
+import time
+
+import src.exec_pool as exec_pool
+import src.llm_cache as llm_cache
+import src.llm_client as llm_client
+from src.llm_scheduler import run_sync
+from src.mock_server import start_server
+from src.workflow import async_run_trial
+
+FAILING_CODE = [
+    # recognized by the triage
+    "import pandas as pd\nimport time\ntime.sleep({seconds})\ndata = pd.DataFrame({{'a': [1, 2]}})\nprint(data['gene'])\n",
+    # needs the evaluator
+    "import numpy as np\nimport time\ntime.sleep({seconds})\nprint(np.linalg.inv(np.zeros((2, 2))))\n",
+]
+WORKING_CODE = "import pandas as pd\nimport time\ntime.sleep({seconds})\nprint(pd.DataFrame({{'a': [1, 2]}}).describe())\n"
+
+
+def make_script(success_rate, exec_seconds, size=20):
+    n_working = max(1, round(success_rate * size))
+    coder = [{"thought": "working", "code": WORKING_CODE.format(seconds=exec_seconds)} for _ in range(n_working)]
+    coder += [
+        {"thought": "failing", "code": FAILING_CODE[i % len(FAILING_CODE)].format(seconds=exec_seconds)}
+        for i in range(size - n_working)
+    ]
+    # the mock evaluator cannot tell runs apart: it accepts every run, and the loops retry failures regardless
+    evaluator = [
+        {"thought": "Reviewed the output.", "retry": False, "comment": "If the code failed, the matrix is singular; use np.linalg.pinv."},
+    ]
+    return {"coder": coder, "evaluator": evaluator}
+
+
+def summarize(name, times, successes, requests):
+    times = sorted(times)
+    p90 = times[min(len(times) - 1, int(round(0.9 * (len(times) - 1))))]
+    print(
+        f"{name:>22}: median {statistics.median(times):6.2f} s | p90 {p90:6.2f} s | mean {statistics.mean(times):6.2f} s"
+        f" | max {times[-1]:6.2f} s | success {sum(successes)}/{len(successes)} | {requests / len(times):5.1f} LLM requests/trial"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trials", type=int, default=20)
+    parser.add_argument("--candidates", type=int, default=4)
+    parser.add_argument("--concurrency", type=int, default=0, help="candidates running at once (0: all)")
+    parser.add_argument("--success-rate", type=float, default=0.3, help="fraction of coder samples that run")
+    parser.add_argument("--exec-seconds", type=float, default=0.3, help="run time of every generated snippet")
+    parser.add_argument("--ttft", type=float, default=0.3)
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0)
+    parser.add_argument("--max-parallel", type=int, default=0, help="server-side parallel generations (0: unlimited)")
+    parser.add_argument("--max-retries", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # every candidate needs its own sandbox, and every sample has to reach the model
+    exec_pool.EXEC_POOL_SIZE = max(exec_pool.EXEC_POOL_SIZE, args.candidates)
+    llm_cache.LLM_CACHE_MODE = "off"
+    data_entry = [{"file_path": "mock.csv", "data_description": {}}]
+    user_input = "Draw a clustermap of the most variable genes."
+
+    print(
+        f"{args.trials} trials, success rate {args.success_rate:.0%}, ttft {args.ttft}s, {args.tokens_per_sec} tokens/s,"
+        f" {args.exec_seconds}s per execution"
+    )
+    for name, n_candidates in (("sequential", 1), (f"speculative x{args.candidates}", args.candidates)):
+        server = start_server(
+            script=make_script(args.success_rate, args.exec_seconds), ttft=args.ttft, tokens_per_sec=args.tokens_per_sec,
+            max_parallel=args.max_parallel, shuffle=True, seed=args.seed,
+        )
+        llm_client.OLLAMA_URL = server.base_url
+        times, successes = [], []
+        for _ in range(args.trials):
+            start = time.perf_counter()
+            # the streamed tokens are just noise here
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = run_sync(async_run_trial(
+                    "mock", data_entry, user_input, max_retries=args.max_retries,
+                    n_candidates=n_candidates, candidate_concurrency=args.concurrency or None,
+                ))
+            times.append(time.perf_counter() - start)
+            successes.append(result["success"])
+        summarize(name, times, successes, server.requests)
+        server.shutdown()
@@ -0,0 +1,271 @@
+"""
+Statement-level checkpoints of generated code.
+
+Generated scripts usually start with a costly prefix (reading the data, selecting the most
+variable genes, the hierarchical clustering of sns.clustermap) followed by cheap plotting and
+printing code, and the coder's fixes mostly touch that tail. run_statements executes the code one
+top-level statement at a time and, after statements that took long, pickles the namespace
+together with the open pyplot figures, the random state and the output printed so far. A
+checkpoint is keyed by the statements up to that point, the datasets and the files those
+statements name, so the next run of code that starts with the same statements on the same data
+resumes after the latest checkpoint instead of starting over. Process-wide settings the skipped
+statements may have changed (matplotlib rcParams and so the seaborn theme, pandas and numpy print
+options, warning filters, the working directory) are saved and restored with the namespace.
+"""
+import ast
+import hashlib
+import importlib
+import json
+import os
+import pickle
+import random
+import time
+import types
+import warnings
+
+import numpy
+from dotenv import load_dotenv
+
+try:
+    import cloudpickle
+except ImportError:  # optional: without it, namespaces holding functions defined by the code are not checkpointed
+    cloudpickle = None
+
+# load .env
+load_dotenv()
+
+
+# on: resume from checkpoints, off: always run the whole code
+EXEC_CHECKPOINTS = os.getenv("EXEC_CHECKPOINTS", "on")
+EXEC_CHECKPOINT_DIR = os.getenv("EXEC_CHECKPOINT_DIR", ".exec_checkpoints")
+EXEC_CHECKPOINT_MAX_MB = float(os.getenv("EXEC_CHECKPOINT_MAX_MB", "2048"))
+# statements since the last checkpoint that ran for less than this are not worth a snapshot
+CHECKPOINT_MIN_SECONDS = float(os.getenv("CHECKPOINT_MIN_SECONDS", "0.5"))
+
+
+def get_file_dependencies(statement):
+    """
+    Files a statement names in string literals (other than registered datasets), with their size and mtime
+    """
+    files = []
+    for node in ast.walk(statement):
+        if isinstance(node, ast.Constant) and isinstance(node.value, str) and len(node.value) < 1024 and "\n" not in node.value:
+            try:
+                if os.path.isfile(node.value):
+                    stat = os.stat(node.value)
+                    files.append([os.path.abspath(node.value), stat.st_size, stat.st_mtime_ns])
+            except (OSError, ValueError):
+                continue
+    return files
+
+
+def get_prefix_keys(statements, datasets=None):
+    """
+    One key per statement, identifying the statements up to and including it and everything they read
+    """
+    digest = hashlib.sha256(json.dumps(sorted([h["path"], h["fingerprint"]] for h in datasets or []), default=str).encode("utf-8"))
+    keys = []
+    for statement in statements:
+        digest.update(ast.dump(statement).encode("utf-8"))
+        digest.update(json.dumps(get_file_dependencies(statement)).encode("utf-8"))
+        keys.append(digest.copy().hexdigest())
+    return keys
+
+
+def get_checkpoint_path(key: str, directory: str = None):
+    return os.path.join(directory or EXEC_CHECKPOINT_DIR, f"{key}.pkl")
+
+
+def get_global_state():
+    """
+    Process-wide settings generated code commonly changes, outside of its namespace
+    """
+    import matplotlib
+    import pandas
+
+    # the backend is the worker's choice, not the code's
+    rc = {name: value for name, value in matplotlib.rcParams.items() if name != "backend"}
+    options = {}
+    with warnings.catch_warnings():
+        # deprecated options warn when they are read
+        warnings.simplefilter("ignore")
+        for name in pandas._config.config._registered_options:
+            try:
+                options[name] = pandas.get_option(name)
+            except Exception:
+                continue
+    return {
+        "rcParams": rc,
+        "pandas": options,
+        "numpy": (numpy.get_printoptions(), numpy.geterr()),
+        "warnings": list(warnings.filters),
+        "cwd": os.getcwd(),
+    }
+
+
+def set_global_state(state: dict):
+    import matplotlib
+    import pandas
+
+    with warnings.catch_warnings():
+        # deprecated rcParams warn when they are set, even to their current value
+        warnings.simplefilter("ignore")
+        matplotlib.rcParams.update(state["rcParams"])
+        for name, value in state["pandas"].items():
+            try:
+                if pandas.get_option(name) != value:
+                    pandas.set_option(name, value)
+            except Exception:
+                continue
+    printoptions, errors = state["numpy"]
+    numpy.set_printoptions(**printoptions)
+    numpy.seterr(**errors)
+    warnings.filters[:] = state["warnings"]
+    warnings._filters_mutated()
+    os.chdir(state["cwd"])
+
+
+def save_checkpoint(key: str, scope: dict, output: str, directory: str = None):
+    """
+    Pickle the namespace, open figures, random state, process-wide settings and output so far
+
+    Returns:
+        True when saved; False when the namespace cannot be pickled or is too large to keep
+    """
+    import matplotlib.pyplot as plt
+
+    modules = {}
+    values = {}
+    for name, value in scope.items():
+        if name == "__builtins__":
+            continue
+        if isinstance(value, types.ModuleType):
+            modules[name] = value.__name__
+        else:
+            values[name] = value
+    state = {
+        "modules": modules,
+        "values": values,
+        # figures pickled from pyplot are registered with it again when they are loaded
+        "figures": [plt.figure(number) for number in plt.get_fignums()],
+        "random": (random.getstate(), numpy.random.get_state()),
+        "globals": get_global_state(),
+        "output": output,
+    }
+    try:
+        data = (cloudpickle or pickle).dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        return False
+    max_bytes = int(EXEC_CHECKPOINT_MAX_MB * 1024 * 1024)
+    if len(data) > max_bytes // 4:
+        return False
+
+    path = get_checkpoint_path(key, directory)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    evict_checkpoints(directory, max_bytes, keep=path)
+    return True
+
+
+def load_checkpoint(key: str, scope: dict, directory: str = None):
+    """
+    Restore a checkpoint into scope
+
+    Returns:
+        The output printed up to the checkpoint, or None when there is no usable checkpoint
+    """
+    path = get_checkpoint_path(key, directory)
+    try:
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        for name, module in state["modules"].items():
+            scope[name] = importlib.import_module(module)
+        set_global_state(state["globals"])
+    except Exception:
+        return None
+    scope.update(state["values"])
+    random.setstate(state["random"][0])
+    numpy.random.set_state(state["random"][1])
+    # last use, for the LRU eviction
+    os.utime(path)
+    return state["output"]
+
+
+def evict_checkpoints(directory: str = None, max_bytes: int = None, keep: str = None):
+    """
+    Delete least recently used checkpoints until the directory fits in max_bytes
+    """
+    directory = directory or EXEC_CHECKPOINT_DIR
+    max_bytes = max_bytes or int(EXEC_CHECKPOINT_MAX_MB * 1024 * 1024)
+    entries = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith(".pkl"):
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            continue
+
+
+def run_statements(code: str, scope: dict, datasets: list = None, output=None, stats: dict = None):
+    """
+    Execute code one top-level statement at a time, resuming from and saving checkpoints
+
+    Tracebacks keep pointing at the lines of the full code ("<string>", line N).
+
+    Args:
+        scope: Namespace to run the code in
+        datasets: Dataset registry handles the code may read; part of the checkpoint key
+        output: StringIO the code prints to; the output of skipped statements is written to it again
+        stats: Optional dict updated as the code runs (so it is also filled in when the code raises) with
+            "statements" (number of statements), "resumed" (statements skipped thanks to a checkpoint)
+            and "checkpoints" (checkpoints saved)
+    """
+    stats = stats if stats is not None else {}
+    stats.update(statements=0, resumed=0, checkpoints=0)
+    try:
+        statements = ast.parse(code).body
+    except SyntaxError:
+        # raise the usual error
+        exec(code, scope)
+        raise
+    keys = get_prefix_keys(statements, datasets)
+    stats["statements"] = len(statements)
+
+    resumed = 0
+    for i in range(len(statements) - 2, -1, -1):
+        if not os.path.exists(get_checkpoint_path(keys[i])):
+            continue
+        printed = load_checkpoint(keys[i], scope)
+        if printed is not None:
+            resumed = i + 1
+            stats["resumed"] = resumed
+            if output is not None:
+                output.write(printed)
+            break
+
+    elapsed = 0.0
+    for i in range(resumed, len(statements)):
+        compiled = compile(ast.Module(body=[statements[i]], type_ignores=[]), "<string>", "exec")
+        start = time.perf_counter()
+        exec(compiled, scope)
+        elapsed += time.perf_counter() - start
+        # nothing can resume after the last statement
+        if elapsed >= CHECKPOINT_MIN_SECONDS and i < len(statements) - 1:
+            if save_checkpoint(keys[i], scope, output.getvalue() if output is not None else ""):
+                stats["checkpoints"] += 1
+            elapsed = 0.0
@@ -0,0 +1,310 @@
+"""
+Static checks of generated code before it is executed, memoized by code hash.
+
+The code is parsed once and analyzed on its syntax tree: calls of forbidden functions are found
+through import aliases (`import os as o; o.system(...)`) without flagging harmless text such as
+"execute" in a string, imports are resolved against the installed packages, and column names used
+on frames read from a known dataset are checked against that dataset's header. Problems found here
+are exact, so the workflow sends them straight back to the coder without running the code or
+asking the evaluator.
+
+The coder stream starts the analysis as soon as the code field of its response is complete
+(see src/stream_parser.py), so by the time the workflow runs the code it is usually already known.
+"""
+import ast
+import asyncio
+import difflib
+import hashlib
+import importlib.util
+import os
+import threading
+
+DANGEROUS_FUNCTIONS = ['os.system', 'subprocess.call', 'subprocess.Popen', 'eval', 'exec', 'shutil.rmtree', 'os.remove', 'exit', 'input']
+# equivalents of the functions above, rejected the same way
+DANGEROUS_ALIASES = ['os.popen', 'os.unlink', 'subprocess.run', 'subprocess.check_call', 'subprocess.check_output', 'quit', '__import__']
+FORBIDDEN = frozenset(DANGEROUS_FUNCTIONS + DANGEROUS_ALIASES)
+NEVER_USE = "** Never use ['os.system', 'subprocess.call', 'subprocess.Popen', 'eval', 'exec', 'open', 'shutil.rmtree', 'os.remove', 'exit', 'input']**"
+
+# pandas readers whose result is checked against the dataset header
+READERS = {"pandas.read_csv", "pandas.read_table", "pandas.read_excel"}
+# reader arguments that change the columns; frames read with them are not checked
+COLUMN_CHANGING_KWARGS = {"names", "header", "sep", "delimiter", "skiprows", "sheet_name"}
+
+# analyses of recent code by code hash
+CHECK_CACHE_SIZE = 1024
+
+EMPTY_CODE_MESSAGE = "The response contained no code. Return the complete script in the code field."
+
+STATIC_CHECK_COMMENT = "The code was rejected before execution by the static check. Fix exactly the problems listed in the error."
+
+_results = {}
+_specs = {}
+_lock = threading.Lock()
+
+
+def get_code_hash(code: str):
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+
+def format_syntax_error(error: SyntaxError):
+    line = (error.text or "").rstrip()
+    location = f"line {error.lineno}" + (f": {line.strip()}" if line else "")
+    return f"SyntaxError: {error.msg} ({location})"
+
+
+def is_installed(module: str):
+    """
+    True when a top-level module can be imported in this environment (the one the workers run in)
+    """
+    if module not in _specs:
+        try:
+            _specs[module] = importlib.util.find_spec(module) is not None
+        except (ImportError, ValueError):
+            _specs[module] = True
+    return _specs[module]
+
+
+def get_aliases(tree):
+    """
+    Map of the names bound by import statements to the qualified names they stand for
+    """
+    aliases = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.asname:
+                    aliases[alias.asname] = alias.name
+                else:
+                    top = alias.name.split(".")[0]
+                    aliases[top] = top
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            for alias in node.names:
+                if alias.name != "*":
+                    aliases[alias.asname or alias.name] = f"{node.module}.{alias.name}"
+    return aliases
+
+
+def get_bound_names(tree):
+    """
+    Names the code assigns itself (variables, functions, classes, arguments), with their assignment count
+    """
+    counts = {}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Name) and isinstance(node.ctx, (ast.Store, ast.Del)):
+            names = [node.id]
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            names = [node.name]
+        elif isinstance(node, ast.arg):
+            names = [node.arg]
+        else:
+            continue
+        for name in names:
+            counts[name] = counts.get(name, 0) + 1
+    return counts
+
+
+def resolve_name(node, aliases, bound):
+    """
+    Qualified name of a referenced object (e.g. "os.system" for o.system after `import os as o`), or None
+    """
+    if isinstance(node, ast.Name):
+        if node.id in aliases:
+            return aliases[node.id]
+        # a builtin, unless the code defines a name of its own (e.g. a variable called input)
+        return node.id if node.id not in bound else None
+    if isinstance(node, ast.Attribute):
+        value = resolve_name(node.value, aliases, bound)
+        return f"{value}.{node.attr}" if value else None
+    return None
+
+
+def get_string_list(node):
+    """
+    The string constants of a literal "a" or ["a", "b"], or None for anything else
+    """
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return [node.value]
+    if isinstance(node, (ast.List, ast.Tuple)) and node.elts and all(isinstance(e, ast.Constant) and isinstance(e.value, str) for e in node.elts):
+        return [e.value for e in node.elts]
+    return None
+
+
+def find_reads(tree, aliases, bound):
+    """
+    Variables assigned once from a pandas reader called on a literal path
+
+    Returns:
+        ({variable: path}, [(path, column, lineno)] for usecols/index_col given by name)
+    """
+    frames = {}
+    read_columns = []
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.Call) or resolve_name(node.func, aliases, bound) not in READERS:
+            continue
+        keywords = {k.arg: k.value for k in node.keywords if k.arg}
+        source = node.args[0] if node.args else keywords.get("filepath_or_buffer", keywords.get("io"))
+        if not (isinstance(source, ast.Constant) and isinstance(source.value, str)) or len(node.args) > 1 or None in (k.arg for k in node.keywords):
+            continue
+        if set(keywords) & COLUMN_CHANGING_KWARGS:
+            continue
+        path = source.value
+        for name in ("usecols", "index_col"):
+            for column in get_string_list(keywords.get(name)) or []:
+                read_columns.append((path, column, node.lineno))
+        node.read_path = path
+    for node in ast.walk(tree):
+        if (
+            isinstance(node, ast.Assign)
+            and len(node.targets) == 1
+            and isinstance(node.targets[0], ast.Name)
+            and getattr(node.value, "read_path", None) is not None
+            and bound.get(node.targets[0].id) == 1
+        ):
+            frames[node.targets[0].id] = node.value.read_path
+    return frames, read_columns
+
+
+def find_column_references(tree, frames):
+    """
+    Column names read from the frames: df["a"], df[["a", "b"]] and df.loc[rows, "a"]
+
+    Columns the code creates with a literal name (df["new"] = ...) are left out. Frames whose column
+    set cannot be followed statically are not checked at all: any method call on the frame (insert,
+    drop, set_index, rename(inplace=True), ... or a helper that mutates it), an attribute store
+    (df.columns = ...) and a store under a computed column name (df[name] = ...).
+    """
+    created = {}
+    changed = set()
+    references = []
+
+    def add(name, columns, node):
+        if columns is None:
+            # a computed column name: reading it is unchecked, storing it adds an unknown column
+            if not isinstance(node.ctx, ast.Load):
+                changed.add(name)
+        elif isinstance(node.ctx, ast.Load):
+            references.extend((name, column, node.lineno) for column in columns)
+        else:
+            created.setdefault(name, set()).update(columns)
+
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Subscript) and isinstance(node.value, ast.Name) and node.value.id in frames:
+            add(node.value.id, get_string_list(node.slice), node)
+        elif (
+            isinstance(node, ast.Subscript)
+            and isinstance(node.value, ast.Attribute)
+            and node.value.attr == "loc"
+            and isinstance(node.value.value, ast.Name)
+            and node.value.value.id in frames
+        ):
+            columns = get_string_list(node.slice.elts[1]) if isinstance(node.slice, ast.Tuple) and len(node.slice.elts) == 2 else None
+            add(node.value.value.id, columns, node)
+        elif isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and isinstance(node.func.value, ast.Name):
+            changed.add(node.func.value.id)
+        elif isinstance(node, ast.Attribute) and isinstance(node.ctx, ast.Store) and isinstance(node.value, ast.Name):
+            changed.add(node.value.id)
+    return [
+        (name, column, lineno)
+        for name, column, lineno in references
+        if name not in changed and column not in created.get(name, ())
+    ]
+
+
+def analyze_code(code: str):
+    """
+    Everything the checks need to know about a piece of code, independent of the datasets
+
+    Returns:
+        dict with syntax_error (message or None), dangerous and imports ([(name, lineno)]),
+        and columns ([(path, column, lineno)] of column names used on frames read from a literal path)
+    """
+    try:
+        tree = ast.parse(code)
+    except SyntaxError as e:
+        return {"syntax_error": format_syntax_error(e), "dangerous": [], "imports": [], "columns": []}
+
+    aliases = get_aliases(tree)
+    bound = get_bound_names(tree)
+    dangerous = []
+    imports = []
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.Name, ast.Attribute)) and isinstance(node.ctx, ast.Load):
+            name = resolve_name(node, aliases, bound)
+            if name in FORBIDDEN and (name, node.lineno) not in dangerous:
+                dangerous.append((name, node.lineno))
+        elif isinstance(node, ast.Import):
+            imports += [(alias.name.split(".")[0], node.lineno) for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            imports.append((node.module.split(".")[0], node.lineno))
+
+    frames, columns = find_reads(tree, aliases, bound)
+    columns += [(frames[name], column, lineno) for name, column, lineno in find_column_references(tree, frames)]
+    return {
+        "syntax_error": None,
+        "dangerous": sorted(dangerous, key=lambda item: item[1]),
+        "imports": imports,
+        "columns": sorted(columns, key=lambda item: item[2]),
+    }
+
+
+def get_analysis(code: str):
+    """
+    analyze_code, memoized by code hash
+    """
+    key = get_code_hash(code)
+    with _lock:
+        if key in _results:
+            return _results[key]
+    result = analyze_code(code)
+    with _lock:
+        if len(_results) >= CHECK_CACHE_SIZE:
+            _results.pop(next(iter(_results)))
+        _results[key] = result
+    return result
+
+
+def check_code(code: str, schema: dict = None):
+    """
+    Check code before it is executed
+
+    Args:
+        code: Python code to check
+        schema: Optional {absolute file path: set of column names} of the datasets the code reads
+
+    Returns:
+        (ok, message): message lists every problem found, one per line; None when ok
+    """
+    if not code.strip():
+        # an empty script runs without error but does nothing
+        return False, EMPTY_CODE_MESSAGE
+    analysis = get_analysis(code)
+    if analysis["syntax_error"]:
+        return False, analysis["syntax_error"]
+
+    problems = []
+    if analysis["dangerous"]:
+        found = ", ".join(f"'{name}' (line {lineno})" for name, lineno in analysis["dangerous"])
+        problems.append(f"Warning: Code contains dangerous function: {found}! {NEVER_USE}")
+    for module, lineno in analysis["imports"]:
+        if not is_installed(module):
+            problems.append(f"ModuleNotFoundError: No module named '{module}' (line {lineno}). Use only the installed libraries.")
+    for path, column, lineno in analysis["columns"]:
+        columns = (schema or {}).get(os.path.abspath(path))
+        if columns is not None and column not in columns:
+            message = f"KeyError: '{column}' is not a column of {path} (line {lineno})"
+            close = difflib.get_close_matches(column, sorted(map(str, columns)), n=3)
+            problems.append(message + (f"; did you mean {', '.join(repr(c) for c in close)}?" if close else ""))
+    if problems:
+        return False, "\n".join(problems)
+    return True, None
+
+
+def precheck_code(key, value):
+    """
+    on_field callback of the coder stream: start checking the code field while the model is still
+    writing the rest of its response; the result is memoized, so run_code finds it ready
+    """
+    from src.utils import postprocess_code
+
+    if key == "code" and isinstance(value, str):
+        asyncio.get_running_loop().run_in_executor(None, check_code, postprocess_code(value))
@@ -2,10 +2,14 @@ import io
 from contextlib import redirect_stderr, redirect_stdout
 from typing import List
 import traceback
+import matplotlib
+
+# headless: 그래프는 화면에 표시하지 않고 파일로 저장 (src/figure_export.py)
+matplotlib.use("Agg")
+
 import matplotlib.pyplot as plt
 
-# 인터랙티브 모드 활성화 (그래프가 즉시 표시되도록 함)
-plt.ion()
+from src.figure_export import export_figures
 
 def execute_code(code_string: str) -> bool:
     """
@@ -77,12 +81,10 @@ def display_figures(stdout, current_figures):
         print("코드가 실행되었지만 그래프가 생성되지 않았습니다.")
         return False
     
-    # 모든 그림 표시하기
+    # 모든 그림을 PNG/SVG로 저장하고 경로 출력
+    for artifact in export_figures(current_figures):
+        print(f"figure {artifact['figure'] + 1}: {', '.join(artifact['files'].values())}")
     for fig in current_figures:
-        # 터미널에서 실행 시 그래프를 표시하기 위해 non-blocking 모드로 설정
-        plt.figure(fig.number)
-        plt.show(block=False)
-        plt.pause(0.1)  # 그래프가 화면에 표시될 시간을 주기 위한 짧은 일시 정지
         plt.close(fig)
 
     # Display any print statements
@@ -1,53 +1,136 @@
-from io import BytesIO
+import os
+import warnings
 
+import numpy as np
 import pandas as pd
 
+from src.dataset_registry import get_cache, get_cache_key, get_content_hash
 
-def load_data(file):
+
+# arguments load_data parses each format with; part of the cache key
+READ_ARGUMENTS = {
+    ".csv": ("read_csv", {"on_bad_lines": "skip"}),
+    ".tsv": ("read_csv", {"sep": "\t", "on_bad_lines": "skip"}),
+    ".xlsx": ("read_excel", {}),
+}
+
+# rows parsed at a time when downcasting, so the full float64 table never exists in memory
+INGEST_CHUNK_ROWS = 10_000
+
+# rows sampled to profile very long tables, and the size of the summary put into the prompt
+PROFILE_MAX_ROWS = 100_000
+SUMMARY_MAX_COLUMNS = 7
+SUMMARY_MAX_CHARS = 1500
+
+
+def downcast_numeric(data: pd.DataFrame):
     """
-    Load data from uploaded file with improved error handling and debugging
+    Shrink float64 columns to float32 and integer columns to the smallest integer type holding their values
     """
-    try:
-        # Debug information
+    dtypes = {}
+    for position, dtype in enumerate(data.dtypes):
+        if dtype == np.float64:
+            dtypes[position] = np.float32
+        elif isinstance(dtype, np.dtype) and dtype.kind in "iu" and len(data):
+            dtypes[position] = pd.to_numeric(data.iloc[:, position], downcast="integer").dtype
+    if not dtypes:
+        return data
+    if data.columns.is_unique:
+        return data.astype({data.columns[position]: dtype for position, dtype in dtypes.items()})
+    # by position, so duplicate column names are handled
+    return pd.concat(
+        [data.iloc[:, i].astype(dtypes[i]) if i in dtypes else data.iloc[:, i] for i in range(data.shape[1])],
+        axis=1,
+    )
+
 
-        # Read file in chunks to handle large files
-        chunks = []
-        chunk_size = 1024 * 1024  # 1MB chunks
+def iter_data(file, chunksize: int, usecols=None, downcast=False):
+    """
+    Parse a CSV/TSV upload or path chunk by chunk, without loading the whole file
 
-        while True:
-            chunk = file.read(chunk_size)
-            if not chunk:
-                break
-            chunks.append(chunk)
+    Yields:
+        DataFrames of at most `chunksize` rows
+    """
+    name = os.fspath(file) if isinstance(file, (str, os.PathLike)) else file.name
+    extension = os.path.splitext(name)[1]
+    if extension not in (".csv", ".tsv"):
+        raise ValueError("Chunked loading supports CSV and TSV files only")
+    _, read_kwargs = READ_ARGUMENTS[extension]
+    with pd.read_csv(file, chunksize=chunksize, usecols=usecols, **read_kwargs) as reader:
+        for chunk in reader:
+            yield downcast_numeric(chunk) if downcast else chunk
 
-        # Combine chunks and create BytesIO object
-        file_content = BytesIO(b"".join(chunks))
-        file.seek(0)  # Reset file pointer for potential future reads
 
-        if file.name.endswith(".csv"):
+def load_data(file, use_cache=True, usecols=None, downcast=False, chunksize=None):
+    """
+    Load data from uploaded file with improved error handling and debugging
+
+    The file is parsed straight from the upload object (or path), never copied into memory first.
+    Parsed files are kept in the dataset cache (see src/dataset_registry.py) keyed by their
+    content hash, so loading the same content again memory-maps the cached columns instead of parsing.
+
+    Args:
+        file: Uploaded file object (with a .name) or a path
+        usecols: Only parse these columns
+        downcast: Store float64 as float32 and integers in the smallest type that fits
+        chunksize: Return an iterator of DataFrames with this many rows instead of one DataFrame (CSV/TSV, uncached)
+    """
+    try:
+        is_path = isinstance(file, (str, os.PathLike))
+        name = os.fspath(file) if is_path else file.name
+        extension = os.path.splitext(name)[1]
+        if extension not in READ_ARGUMENTS:
+            raise ValueError(
+                "Unsupported file format. Please upload a CSV, TSV, or Excel file."
+            )
+        if chunksize:
+            return iter_data(file, chunksize, usecols, downcast)
+
+        reader, read_kwargs = READ_ARGUMENTS[extension]
+        cache_key = None
+        if use_cache:
+            # hashed in 1 MB chunks; paths whose size and mtime are unchanged are not even re-read
+            content_hash = get_cache().get_content_hash(name) if is_path else get_content_hash(file)
+            options = dict(read_kwargs, usecols=list(usecols) if usecols is not None else None, downcast=downcast)
+            cache_key = get_cache_key(content_hash, reader, options)
+            data = get_cache().get(cache_key)
+            if data is not None:
+                return data
+        if not is_path:
+            file.seek(0)
+
+        if extension == ".csv":
             try:
-                data = pd.read_csv(file_content, on_bad_lines="skip")
+                if downcast:
+                    data = pd.concat(iter_data(file, INGEST_CHUNK_ROWS, usecols, downcast), ignore_index=True)
+                else:
+                    data = pd.read_csv(file, usecols=usecols, **read_kwargs)
             except Exception as e:
                 raise ValueError(f"Error reading CSV file: {str(e)}")
-        elif file.name.endswith(".tsv"):
+        elif extension == ".tsv":
             try:
-                data = pd.read_csv(file_content, sep="\t", on_bad_lines="skip")
+                if downcast:
+                    data = pd.concat(iter_data(file, INGEST_CHUNK_ROWS, usecols, downcast), ignore_index=True)
+                else:
+                    data = pd.read_csv(file, usecols=usecols, **read_kwargs)
             except Exception as e:
                 raise ValueError(f"Error reading TSV file: {str(e)}")
-        elif file.name.endswith(".xlsx"):
+        else:
             try:
-                data = pd.read_excel(file_content)
+                data = pd.read_excel(file, usecols=usecols)
+                if downcast:
+                    data = downcast_numeric(data)
             except Exception as e:
                 raise ValueError(f"Error reading Excel file: {str(e)}")
-        else:
-            raise ValueError(
-                "Unsupported file format. Please upload a CSV, TSV, or Excel file."
-            )
+        if not is_path:
+            file.seek(0)  # Reset file pointer for potential future reads
 
         # Basic data validation
         if data is None or data.empty:
             raise ValueError("The uploaded file contains no data")
 
+        if cache_key is not None:
+            get_cache().put(cache_key, data)
         return data
     except Exception as e:
         raise Exception(f"Error loading file: {str(e)}")
@@ -69,24 +152,113 @@ def validate_data(data):
         raise ValueError(f"Data validation error: {str(e)}")
 
 
+def profile_data(data: pd.DataFrame, max_rows: int = None, seed: int = 0):
+    """
+    Per-column dtype, missing rate, mean/std and cardinality, computed in one vectorized pass
+
+    Tables longer than max_rows are profiled on a fixed random sample of rows.
+    """
+    max_rows = max_rows or PROFILE_MAX_ROWS
+    n_rows, n_columns = data.shape
+    sample = data.sample(n=max_rows, random_state=seed) if n_rows > max_rows else data
+
+    dtypes = sample.dtypes
+    missing = sample.isna().to_numpy().mean(axis=0) if len(sample) else np.zeros(n_columns)
+    means = np.full(n_columns, np.nan)
+    stds = np.full(n_columns, np.nan)
+    unique = np.zeros(n_columns, dtype=np.int64)
+
+    numeric = [i for i, dtype in enumerate(dtypes) if isinstance(dtype, np.dtype) and dtype.kind in "iuf"]
+    if numeric and len(sample):
+        values = sample.iloc[:, numeric].to_numpy()
+        with np.errstate(all="ignore"), warnings.catch_warnings():
+            # all-missing columns are reported as NaN
+            warnings.simplefilter("ignore", RuntimeWarning)
+            means[numeric] = np.nanmean(values, axis=0, dtype=np.float64)
+            stds[numeric] = np.nanstd(values, axis=0, dtype=np.float64, ddof=1) if len(sample) > 1 else np.nan
+        # distinct values per column from one sort of the whole block; NaNs sort last and are not counted
+        ordered = np.sort(values, axis=0)
+        changes = (ordered[1:] != ordered[:-1]) & ~np.isnan(ordered[1:]) if values.dtype.kind == "f" else ordered[1:] != ordered[:-1]
+        unique[numeric] = changes.sum(axis=0) + (~np.isnan(ordered[0]) if values.dtype.kind == "f" else 1)
+    numeric_set = set(numeric)
+    for i in range(n_columns):
+        if i not in numeric_set:
+            unique[i] = sample.iloc[:, i].nunique()
+
+    columns = [
+        {
+            "name": str(name),
+            "dtype": str(dtypes.iloc[i]),
+            "missing": round(float(missing[i]), 4),
+            "mean": None if np.isnan(means[i]) else float(means[i]),
+            "std": None if np.isnan(stds[i]) else float(stds[i]),
+            "unique": int(unique[i]),
+        }
+        for i, name in enumerate(sample.columns)
+    ]
+    return {
+        "shape": [n_rows, n_columns],
+        "sampled_rows": len(sample) if len(sample) < n_rows else None,
+        "dtypes": {str(dtype): int(count) for dtype, count in dtypes.astype(str).value_counts().items()},
+        "missing_rate": round(float(missing.mean()), 4) if n_columns else 0.0,
+        "columns": columns,
+    }
+
+
+def format_number(value):
+    return None if value is None else float(f"{value:.4g}")
+
+
+def summarize_profile(profile, max_columns: int = None, max_chars: int = None):
+    """
+    Compact summary of a profile for the prompt: its size does not depend on the number of rows,
+    and at most max_columns columns are listed, fewer if the summary would exceed max_chars
+    """
+    max_columns = max_columns or SUMMARY_MAX_COLUMNS
+    max_chars = max_chars or SUMMARY_MAX_CHARS
+    columns = profile["columns"]
+    numeric = [c for c in columns if c["mean"] is not None]
+    summary = {
+        "shape": tuple(profile["shape"]),
+        "dtypes": profile["dtypes"],
+        "missing_rate": profile["missing_rate"],
+    }
+    if profile.get("rows_estimated"):
+        summary["rows_estimated_from_file_size"] = True
+    if profile.get("sampled_rows"):
+        summary["stats_from_sampled_rows"] = profile["sampled_rows"]
+    if numeric:
+        summary["numeric_columns"] = {
+            "count": len(numeric),
+            "mean_range": [format_number(min(c["mean"] for c in numeric)), format_number(max(c["mean"] for c in numeric))],
+            "std_range": [
+                format_number(min((c["std"] for c in numeric if c["std"] is not None), default=None)),
+                format_number(max((c["std"] for c in numeric if c["std"] is not None), default=None)),
+            ],
+            "with_missing": sum(c["missing"] > 0 for c in numeric),
+        }
+
+    def describe(column):
+        text = f"{column['dtype']}, {column['missing']:.0%} missing, {column['unique']} unique"
+        if column["mean"] is not None:
+            text += f", mean {format_number(column['mean'])}, std {format_number(column['std'])}"
+        return text
+
+    n = min(max_columns, len(columns))
+    while True:
+        summary[f"columns (first {n})"] = {column["name"]: describe(column) for column in columns[:n]}
+        if n == 0 or len(str(summary)) <= max_chars:
+            return summary
+        del summary[f"columns (first {n})"]
+        n -= 1
+
+
 def get_data_summary(data: pd.DataFrame):
     """
     Generate a comprehensive summary of the data including basic statistics,
     column types, and missing value information
     """
     try:
-        # Get column types
-        numeric_cols = data.select_dtypes(include=["number"]).columns.tolist()
-        categorical_cols = data.select_dtypes(include=["object"]).columns.tolist()
-
-        # Calculate missing values percentage
-        missing_percentages = (data.isnull().sum() / len(data) * 100).round(2)
-        summary = {
-            "shape": data.shape,
-            "rows": data.index,
-            "columns (first 7)": data.columns.tolist()[:7],
-            # "null_percentage": missing_percentages.to_dict(),
-        }
-        return summary
+        return summarize_profile(profile_data(data))
     except Exception as e:
         raise Exception(f"Error generating data summary: {str(e)}")
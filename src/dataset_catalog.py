@@ -0,0 +1,184 @@
+"""
+Dataset catalog: describe many data files for the prompt without loading any of them fully.
+
+Each file's schema is sniffed from its header and first rows only, and its row count is estimated
+from the file size. Descriptions are kept in a persistent index keyed by path, size and mtime, so a
+rescan only re-sniffs files that changed. The files actually being analyzed go through the same
+index, sniffed on a larger but still bounded row sample (CATALOG_PROFILE_ROWS), so their statistics
+do not come from a few rows and no file is ever loaded in full.
+"""
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from src.data_handler import READ_ARGUMENTS, profile_data, summarize_profile
+from src.dataset_registry import DATASET_CACHE_DIR, get_fingerprint
+
+# load .env
+load_dotenv()
+
+
+CATALOG_PATH = os.getenv("CATALOG_PATH", os.path.join(DATASET_CACHE_DIR, "catalog.json"))
+CATALOG_SNIFF_ROWS = int(os.getenv("CATALOG_SNIFF_ROWS", "200"))
+# rows sampled from the files being analyzed
+CATALOG_PROFILE_ROWS = int(os.getenv("CATALOG_PROFILE_ROWS", "10000"))
+CATALOG_WORKERS = int(os.getenv("CATALOG_WORKERS", "8"))
+# every CSV/TSV/XLSX file of this directory is described to the model as well (empty: the analyzed files only)
+CATALOG_DATA_DIR = os.getenv("CATALOG_DATA_DIR", "")
+
+
+def estimate_rows(path: str, head: pd.DataFrame):
+    """
+    Estimate the number of data rows of a text file from its size and the average size of the sniffed rows
+    """
+    if len(head) == 0:
+        return 0
+    with open(path, "rb") as f:
+        header_bytes = len(f.readline())
+        row_bytes = sum(len(f.readline()) for _ in range(len(head)))
+    if row_bytes == 0:
+        return len(head)
+    return max(len(head), round((os.path.getsize(path) - header_bytes) * len(head) / row_bytes))
+
+
+def count_excel_rows(path: str):
+    """
+    Row count from the sheet dimensions, without reading the cells; None if openpyxl is unavailable
+    """
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        return None
+    workbook = load_workbook(path, read_only=True)
+    try:
+        max_row = workbook.worksheets[0].max_row
+    finally:
+        workbook.close()
+    return max(max_row - 1, 0) if max_row is not None else None
+
+
+def sniff_file(path: str, n_rows: int = None):
+    """
+    Profile a file from its header and first n_rows rows
+
+    Returns:
+        Compact description as returned by summarize_profile, with an estimated shape
+    """
+    n_rows = n_rows or CATALOG_SNIFF_ROWS
+    extension = os.path.splitext(path)[1]
+    reader, read_kwargs = READ_ARGUMENTS[extension]
+    head = getattr(pd, reader)(path, nrows=n_rows, **read_kwargs)
+    if extension == ".xlsx":
+        total_rows = count_excel_rows(path) if len(head) == n_rows else len(head)
+    else:
+        total_rows = estimate_rows(path, head) if len(head) == n_rows else len(head)
+
+    profile = profile_data(head)
+    if total_rows is not None and total_rows > len(head):
+        profile["shape"][0] = total_rows
+        profile["sampled_rows"] = len(head)
+        profile["rows_estimated"] = extension != ".xlsx"
+    return summarize_profile(profile)
+
+
+class DatasetCatalog:
+    """
+    Persistent index of data file descriptions, refreshed incrementally
+    """
+
+    def __init__(self, index_path: str = None, sniff_rows: int = None, max_workers: int = None):
+        self.index_path = index_path or CATALOG_PATH
+        self.sniff_rows = sniff_rows or CATALOG_SNIFF_ROWS
+        self.max_workers = max_workers or CATALOG_WORKERS
+        self._lock = threading.Lock()
+        self.entries = self._read_index()
+
+    def _read_index(self):
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def save(self):
+        directory = os.path.dirname(os.path.abspath(self.index_path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=directory)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self.index_path)
+
+    def describe(self, path: str, sniff_rows: int = None):
+        """
+        Description of one file, sniffed only if the file is new or changed since it was indexed
+
+        Args:
+            sniff_rows: Rows to sniff (default: the catalog's sniff_rows)
+        """
+        sniff_rows = sniff_rows or self.sniff_rows
+        path = os.path.abspath(path)
+        fingerprint = get_fingerprint(path)
+        with self._lock:
+            entry = self.entries.get(path)
+        if entry is not None and entry["fingerprint"] == fingerprint and entry["sniff_rows"] == sniff_rows:
+            return entry["description"]
+        # as read back from the index, so the prompt is the same before and after a restart
+        description = json.loads(json.dumps(sniff_file(path, sniff_rows), ensure_ascii=False))
+        with self._lock:
+            self.entries[path] = {"fingerprint": fingerprint, "sniff_rows": sniff_rows, "description": description}
+        return description
+
+    def add_files(self, paths, sniff_rows: int = None):
+        """
+        Describe files in parallel and persist the index
+
+        Returns:
+            Data entries for init_prompt: [{"file_path": ..., "data_description": ...}, ...]
+        """
+        paths = [os.path.abspath(path) for path in paths]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            descriptions = list(executor.map(lambda path: self.describe(path, sniff_rows), paths))
+        self.save()
+        return [{"file_path": path, "data_description": description} for path, description in zip(paths, descriptions)]
+
+    def scan(self, directory: str, recursive: bool = False, exclude=()):
+        """
+        Describe every CSV/TSV/XLSX file of a directory, except the paths in exclude, and drop index
+        entries of deleted files
+        """
+        if recursive:
+            paths = [os.path.join(root, name) for root, _, names in os.walk(directory) for name in names]
+        else:
+            paths = [os.path.join(directory, name) for name in os.listdir(directory)]
+        exclude = {os.path.abspath(path) for path in exclude}
+        paths = sorted(
+            path
+            for path in paths
+            if os.path.splitext(path)[1] in READ_ARGUMENTS and os.path.isfile(path) and os.path.abspath(path) not in exclude
+        )
+        with self._lock:
+            for path in [path for path in self.entries if not os.path.exists(path)]:
+                del self.entries[path]
+        return self.add_files(paths)
+
+
+def get_data_entries(paths=None, directory: str = None):
+    """
+    Data entries for init_prompt, from a list of files and/or every data file of a directory
+
+    Args:
+        paths: Files being analyzed, sniffed from their first CATALOG_PROFILE_ROWS rows
+        directory: Directory whose other data files are sniffed from their first CATALOG_SNIFF_ROWS rows
+            (default: CATALOG_DATA_DIR)
+    """
+    directory = directory or CATALOG_DATA_DIR
+    catalog = DatasetCatalog()
+    entries = catalog.add_files(paths or [], sniff_rows=CATALOG_PROFILE_ROWS)
+    if directory:
+        entries += catalog.scan(directory, exclude=paths or [])
+    return entries
@@ -0,0 +1,416 @@
+"""
+Dataset registry: parse each data file once and share it zero-copy with every execution.
+
+A parsed file is stored in a cache directory as memory-mappable column blocks (one
+Fortran-ordered .npy matrix per numeric dtype, other columns pickled, plus a meta.json sidecar).
+Entries are keyed by the content hash of the source and the reader arguments, so a changed
+file gets a new entry and an unchanged file is never parsed again, whatever its path or
+upload name. An index of (path, size, mtime) -> content hash avoids re-hashing unchanged files,
+and the directory is kept under DATASET_CACHE_MAX_MB by evicting least recently used entries.
+
+Opening a dataset maps its blocks copy-on-write, so all execution workers share the same
+page-cache pages and only pay for the parts they modify. Inside a worker, pandas.read_csv /
+read_table / read_excel of a registered path is intercepted and returns the mapped frame
+instead of parsing the file again.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+# load .env
+load_dotenv()
+
+
+DATASET_CACHE_DIR = os.getenv("DATASET_CACHE_DIR", ".dataset_cache")
+DATASET_CACHE_MAX_MB = float(os.getenv("DATASET_CACHE_MAX_MB", "4096"))
+
+# read_csv keyword arguments the mapped frame can honour; any other argument falls back to parsing
+SUPPORTED_READ_KWARGS = {"index_col", "usecols"}
+
+HASH_CHUNK_SIZE = 1024 * 1024
+INDEX_FILE = "index.json"
+META_FILE = "meta.json"
+
+_handles = {}
+_index_lock = threading.Lock()
+
+
+def get_fingerprint(path: str):
+    """
+    Cheap identity of a file version: absolute path, size and modification time
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    key = f"{path}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:24]
+
+
+def get_content_hash(file):
+    """
+    sha256 of a file's content, read in chunks
+
+    Args:
+        file: Path, or binary file object (read from the start; its position is restored)
+    """
+    digest = hashlib.sha256()
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, "rb") as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+    else:
+        position = file.tell()
+        file.seek(0)
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+        file.seek(position)
+    return digest.hexdigest()
+
+
+def get_reader_name(path: str):
+    """
+    Name of the pandas reader whose default arguments parse this file
+    """
+    if path.endswith(".tsv"):
+        return "read_table"
+    if path.endswith(".xlsx"):
+        return "read_excel"
+    return "read_csv"
+
+
+def get_reader(name: str):
+    """
+    The real pandas reader, also when the worker hooks are installed
+    """
+    reader = getattr(pd, name)
+    return getattr(reader, "__wrapped__", reader)
+
+
+def read_file(path: str):
+    """
+    Parse a data file the same way a plain pd.read_csv / pd.read_table / pd.read_excel call would
+    """
+    return get_reader(get_reader_name(path))(path)
+
+
+def get_cache_key(content_hash: str, reader: str, read_kwargs: dict = None):
+    """
+    Cache entry name: the same bytes parsed with different arguments give different frames
+    """
+    payload = json.dumps({"content": content_hash, "reader": reader, "kwargs": read_kwargs or {}}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+def write_buffer(data: pd.DataFrame, directory: str):
+    """
+    Write a DataFrame as memory-mappable column blocks
+    """
+    os.makedirs(directory, exist_ok=True)
+    groups = {}
+    others = []
+    for position, dtype in enumerate(data.dtypes):
+        if isinstance(dtype, np.dtype) and dtype.kind in "biuf":
+            groups.setdefault(dtype.str, []).append(position)
+        else:
+            others.append(position)
+
+    # one 2D block per dtype, largest first; Fortran order keeps every column contiguous on disk
+    blocks = sorted(groups.values(), key=len, reverse=True)
+    for i, positions in enumerate(blocks):
+        matrix = np.asfortranarray(data.iloc[:, positions].to_numpy())
+        np.save(os.path.join(directory, f"block{i}.npy"), matrix)
+    if others:
+        data.iloc[:, others].to_pickle(os.path.join(directory, "others.pkl"))
+    pd.to_pickle(data.columns, os.path.join(directory, "columns.pkl"))
+    if not isinstance(data.index, pd.RangeIndex):
+        pd.to_pickle(data.index, os.path.join(directory, "index.pkl"))
+
+    meta = {
+        "shape": list(data.shape),
+        "blocks": blocks,
+        "others": others,
+    }
+    with open(os.path.join(directory, META_FILE), "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+
+
+def read_buffer(directory: str):
+    """
+    Open a block directory as a DataFrame backed by copy-on-write memory maps (no copy, no parsing)
+    """
+    with open(os.path.join(directory, META_FILE), encoding="utf-8") as f:
+        meta = json.load(f)
+    columns = pd.read_pickle(os.path.join(directory, "columns.pkl"))
+    n_rows = meta["shape"][0]
+
+    # start from the largest numeric block: a 2D array becomes a single pandas block without copying
+    data = None
+    placed = {}
+    for i, positions in enumerate(meta["blocks"]):
+        matrix = np.load(os.path.join(directory, f"block{i}.npy"), mmap_mode="c")
+        if data is None:
+            data = pd.DataFrame(matrix, columns=columns[positions], copy=False)
+        else:
+            for j, position in enumerate(positions):
+                placed[position] = matrix[:, j]
+    if data is None:
+        data = pd.DataFrame(index=pd.RangeIndex(n_rows))
+    if meta["others"]:
+        others = pd.read_pickle(os.path.join(directory, "others.pkl"))
+        for j, position in enumerate(meta["others"]):
+            placed[position] = others.iloc[:, j].to_numpy()
+
+    # insert the remaining columns in file order, so every insert lands at its original position
+    for position in sorted(placed):
+        data.insert(position, columns[position], placed[position], allow_duplicates=True)
+
+    index_path = os.path.join(directory, "index.pkl")
+    if os.path.exists(index_path):
+        data.index = pd.read_pickle(index_path)
+    return data
+
+
+class DatasetCache:
+    """
+    Directory of parsed datasets with a content-hash index and size-based LRU eviction
+    """
+
+    def __init__(self, directory: str = None, max_mb: float = None):
+        self.directory = directory or DATASET_CACHE_DIR
+        self.max_bytes = int((max_mb or DATASET_CACHE_MAX_MB) * 1024 * 1024)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def entry_path(self, key: str):
+        return os.path.join(self.directory, key)
+
+    def has(self, key: str):
+        return os.path.exists(os.path.join(self.entry_path(key), META_FILE))
+
+    def touch(self, key: str):
+        # the sidecar's mtime is the entry's last access time for eviction
+        try:
+            os.utime(os.path.join(self.entry_path(key), META_FILE))
+        except FileNotFoundError:
+            pass
+
+    def get(self, key: str):
+        """
+        Memory-mapped frame of an entry, or None when it is not cached
+        """
+        if not self.has(key):
+            return None
+        self.touch(key)
+        try:
+            return read_buffer(self.entry_path(key))
+        except FileNotFoundError:
+            # evicted by another process in the meantime
+            return None
+
+    def put(self, key: str, data: pd.DataFrame):
+        """
+        Store a parsed frame; written next to its final location and renamed, so readers never see a partial entry
+        """
+        directory = self.entry_path(key)
+        if not self.has(key):
+            tmp_directory = tempfile.mkdtemp(prefix=f"{key}.", suffix=".tmp", dir=self.directory)
+            try:
+                write_buffer(data, tmp_directory)
+                os.rename(tmp_directory, directory)
+            except OSError:
+                # another process stored the same entry first
+                if not self.has(key):
+                    raise
+            finally:
+                shutil.rmtree(tmp_directory, ignore_errors=True)
+        self.evict(keep={key})
+        return directory
+
+    def get_content_hash(self, path: str):
+        """
+        Content hash of a file, re-hashed only when its size or mtime changed since the last call
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with _index_lock:
+            index = self._read_index()
+        entry = index.get(path)
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry["content_hash"]
+        content_hash = get_content_hash(path)
+        with _index_lock:
+            index = self._read_index()
+            index[path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "content_hash": content_hash}
+            self._write_index(index)
+        return content_hash
+
+    def _read_index(self):
+        try:
+            with open(os.path.join(self.directory, INDEX_FILE), encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write_index(self, index):
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, os.path.join(self.directory, INDEX_FILE))
+
+    def evict(self, keep=()):
+        """
+        Delete least recently used entries until the directory fits in max_bytes
+
+        Entries in `keep` and entries registered by this process are never evicted.
+        """
+        protected = set(keep) | {os.path.basename(handle["directory"]) for handle in _handles.values()}
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            directory = self.entry_path(name)
+            meta_path = os.path.join(directory, META_FILE)
+            if not os.path.exists(meta_path):
+                continue
+            size = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+            total += size
+            entries.append((os.path.getmtime(meta_path), name, size))
+        for _, name, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if name in protected:
+                continue
+            shutil.rmtree(self.entry_path(name), ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            path = self.entry_path(name)
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+
+
+_caches = {}
+
+
+def get_cache(directory: str = None):
+    directory = directory or DATASET_CACHE_DIR
+    if directory not in _caches:
+        _caches[directory] = DatasetCache(directory)
+    return _caches[directory]
+
+
+def register_dataset(path: str, cache_dir: str = None):
+    """
+    Make sure a parsed, memory-mappable copy of the file exists and return its handle
+
+    Returns:
+        {"path": absolute path, "fingerprint": ..., "directory": block directory}
+    """
+    path = os.path.abspath(path)
+    fingerprint = get_fingerprint(path)
+    handle = _handles.get(path)
+    if handle is not None and handle["fingerprint"] == fingerprint and os.path.exists(handle["directory"]):
+        return handle
+
+    cache = get_cache(cache_dir)
+    key = get_cache_key(cache.get_content_hash(path), get_reader_name(path))
+    if cache.has(key):
+        cache.touch(key)
+        directory = cache.entry_path(key)
+    else:
+        directory = cache.put(key, read_file(path))
+
+    handle = {"path": path, "fingerprint": fingerprint, "directory": directory}
+    _handles[path] = handle
+    return handle
+
+
+def open_dataset(handle):
+    """
+    Open a registered dataset as a DataFrame backed by copy-on-write memory maps (no copy, no parsing)
+    """
+    return read_buffer(handle["directory"])
+
+
+def get_dataset_columns(handle):
+    """
+    Column names of a registered dataset, read without opening its blocks
+    """
+    return pd.read_pickle(os.path.join(handle["directory"], "columns.pkl"))
+
+
+def load_dataset(path: str):
+    """
+    Register a file (parsing it only if this content was never seen) and open it memory-mapped
+    """
+    return open_dataset(register_dataset(path))
+
+
+def select_columns(data: pd.DataFrame, usecols):
+    """
+    The columns read_csv(usecols=...) would return, in file order like pandas
+
+    Returns:
+        The selected frame, or None when the real reader has to decide (a callable, a mix of names and
+        positions, unknown names or positions out of range; the reader raises for the last two)
+    """
+    if usecols is None:
+        return data
+    if callable(usecols) or isinstance(usecols, str):
+        return None
+    usecols = list(usecols)
+    if all(isinstance(c, int) for c in usecols):
+        if not all(0 <= c < data.shape[1] for c in usecols):
+            return None
+        return data.iloc[:, sorted(set(usecols))]
+    if all(isinstance(c, str) for c in usecols) and set(usecols) <= set(data.columns):
+        return data[[c for c in data.columns if c in set(usecols)]]
+    return None
+
+
+def install_read_hooks(handles):
+    """
+    Make pd.read_csv / pd.read_table / pd.read_excel return the shared frame for registered paths.
+
+    Only calls that a plain parse would answer identically are intercepted: the registered path,
+    unchanged on disk, read with its default reader and no arguments besides index_col/usecols.
+    Everything else goes to the real reader.
+    """
+    by_path = {handle["path"]: handle for handle in handles}
+
+    def hook(name, reader):
+        def read(filepath_or_buffer, *args, **kwargs):
+            if isinstance(filepath_or_buffer, (str, os.PathLike)) and not args and set(kwargs) <= SUPPORTED_READ_KWARGS:
+                path = os.path.abspath(os.fspath(filepath_or_buffer))
+                handle = by_path.get(path)
+                data = None
+                if (
+                    handle is not None
+                    and get_reader_name(path) == name
+                    and get_fingerprint(path) == handle["fingerprint"]
+                    and os.path.exists(os.path.join(handle["directory"], META_FILE))
+                ):
+                    data = select_columns(open_dataset(handle), kwargs.get("usecols"))
+                if data is not None:
+                    index_col = kwargs.get("index_col")
+                    if index_col is not None and index_col is not False:
+                        keys = index_col if isinstance(index_col, list) else [index_col]
+                        data = data.set_index([data.columns[k] if isinstance(k, int) else k for k in keys])
+                        # like pandas: an index column with a blank header has no name
+                        data.index.names = [None if isinstance(n, str) and n.startswith("Unnamed: ") else n for n in data.index.names]
+                    return data
+            return reader(filepath_or_buffer, *args, **kwargs)
+
+        read.__wrapped__ = reader
+        read.__doc__ = reader.__doc__
+        return read
+
+    for name in ("read_csv", "read_table", "read_excel"):
+        setattr(pd, name, hook(name, get_reader(name)))
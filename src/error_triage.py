@@ -0,0 +1,217 @@
+"""
+Rule-based triage of execution errors.
+
+Many failed attempts end in a traceback whose fix is mechanical: a misspelled column, a missing
+import, a module that is not installed. For those classify_error writes the fix hint directly,
+so the retry loop can go back to the coder without an evaluator generation. Everything it does
+not recognize (and every successful run, which needs a semantic review) still goes to the
+evaluator. triage_report.py measures how many errors the rules cover and how often they are right.
+"""
+import difflib
+import os
+import pkgutil
+import re
+
+# imports for the short names generated code usually forgets
+COMMON_IMPORTS = {
+    "np": "import numpy as np",
+    "pd": "import pandas as pd",
+    "plt": "import matplotlib.pyplot as plt",
+    "sns": "import seaborn as sns",
+    "mpl": "import matplotlib as mpl",
+    "sp": "import scipy as sp",
+    "stats": "from scipy import stats",
+    "linkage": "from scipy.cluster.hierarchy import linkage",
+    "fcluster": "from scipy.cluster.hierarchy import fcluster",
+    "dendrogram": "from scipy.cluster.hierarchy import dendrogram",
+    "pdist": "from scipy.spatial.distance import pdist",
+    "KMeans": "from sklearn.cluster import KMeans",
+    "PCA": "from sklearn.decomposition import PCA",
+    "StandardScaler": "from sklearn.preprocessing import StandardScaler",
+    "Patch": "from matplotlib.patches import Patch",
+}
+
+INSTALLED_LIBRARIES = "matplotlib, seaborn, pandas, numpy, scipy, scikit-learn, PyComplexHeatmap, gseapy"
+
+_module_names = None
+
+
+def parse_traceback(error: str):
+    """
+    Exception name, message and the line of the generated code a traceback points to
+
+    Returns:
+        {"exception": name or None, "message": str, "lineno": int or None}
+    """
+    lines = str(error or "").rstrip().splitlines()
+    exception, message = None, ""
+    for i in range(len(lines) - 1, -1, -1):
+        match = re.match(r"^([A-Za-z_][\w.]*(?:Error|Exception|Exit|Interrupt))(?::\s?(.*))?$", lines[i])
+        if match:
+            exception = match.group(1).rsplit(".", 1)[-1]
+            # the message can span several lines (e.g. pandas KeyError listing the missing labels)
+            message = "\n".join([match.group(2) or ""] + lines[i + 1:]).strip()
+            break
+    # the generated code runs as "<string>"; its innermost frame is the line to fix
+    frames = re.findall(r'File "<string>", line (\d+)', str(error or ""))
+    if exception == "SyntaxError" or exception == "IndentationError":
+        frames = frames or re.findall(r"line (\d+)", str(error or ""))
+    return {"exception": exception, "message": message, "lineno": int(frames[-1]) if frames else None}
+
+
+def get_module_names():
+    """
+    Top-level modules importable in this environment (listed once, for "did you mean" hints)
+    """
+    global _module_names
+    if _module_names is None:
+        _module_names = sorted({module.name for module in pkgutil.iter_modules()})
+    return _module_names
+
+
+def get_close_names(name: str, names, n: int = 3):
+    names = list(names)
+    matches = difflib.get_close_matches(name, names, n=n)
+    # also catch differences in case only (pycomplexheatmap -> PyComplexHeatmap)
+    matches += [other for other in names if other.lower() == name.lower() and other not in matches]
+    return matches[:n]
+
+
+def format_matches(matches):
+    return f" Did you mean {', '.join(repr(m) for m in matches)}?" if matches else ""
+
+
+def triage_module_not_found(exception, message, context):
+    match = re.search(r"No module named '([\w.]+)'", message)
+    if exception not in ("ModuleNotFoundError", "ImportError") or not match:
+        return None
+    module = match.group(1)
+    top = module.split(".")[0]
+    if top != module and top in get_module_names():
+        return "import_path", f"'{module}' does not exist in the installed {top}. Check the submodule path of the import."
+    return "module_not_found", f"Module '{top}' is not installed.{format_matches(get_close_names(top, get_module_names()))} Use only the installed libraries: {INSTALLED_LIBRARIES}."
+
+
+def triage_import_name(exception, message, context):
+    match = re.search(r"cannot import name '(\w+)' from '([\w.]+)'", message)
+    if exception != "ImportError" or not match:
+        return None
+    name, module = match.groups()
+    return "import_name", f"'{name}' cannot be imported from {module}. Check the spelling, or import it from the module that defines it in the installed version."
+
+
+def triage_name_error(exception, message, context):
+    match = re.search(r"name '(\w+)' is not defined", message)
+    if exception not in ("NameError", "UnboundLocalError") or not match:
+        return None
+    name = match.group(1)
+    if name in COMMON_IMPORTS:
+        return "missing_import", f"'{name}' is used without being imported. Add `{COMMON_IMPORTS[name]}` at the top of the code."
+    return "undefined_name", f"'{name}' is used before it is defined. Define it before this line, or import it explicitly if it comes from a library."
+
+
+def triage_key_error(exception, message, context):
+    if exception != "KeyError" or not message:
+        return None
+    # 'a', or from pandas "None of [Index(['a', 'b'], dtype='object')] are in the [columns]" and "['a'] not in index"
+    missing = [name for name in re.findall(r"'([^']*)'", message.splitlines()[0]) if name not in ("object", "columns", "index")]
+    if not missing:
+        return None
+    columns = context["columns"]
+    hints = []
+    for name in missing[:5]:
+        hints.append(f"'{name}' is not a column/key of the data.{format_matches(get_close_names(name, columns)) if columns else ''}")
+    return "missing_column", " ".join(hints) + " Use only the column names shown in the dataset description, or check the labels with data.columns / data.index before selecting them."
+
+
+def triage_file_not_found(exception, message, context):
+    match = re.search(r"No such file or directory: '([^']+)'", message)
+    if exception != "FileNotFoundError" or not match:
+        return None
+    paths = ", ".join(repr(path) for path in context["paths"]) or "the paths given in the dataset description"
+    return "file_not_found", f"'{match.group(1)}' does not exist. Read the data from {paths}, exactly as written."
+
+
+def triage_unexpected_argument(exception, message, context):
+    match = re.search(r"([\w.]+)\(\) got an unexpected keyword argument '(\w+)'", message)
+    if exception not in ("TypeError", "AttributeError") or not match:
+        return None
+    function, argument = match.groups()
+    if function.endswith(".set"):
+        # matplotlib artists get the keyword arguments a plotting function did not recognize
+        return "unexpected_argument", f"'{argument}' is not a parameter of the function called at this line (it was passed through to {function}()). Remove it or use the documented parameter name."
+    return "unexpected_argument", f"{function}() does not accept the argument '{argument}' in the installed version. Remove it or use the documented parameter name."
+
+
+def triage_module_attribute(exception, message, context):
+    match = re.search(r"module '([\w.]+)' has no attribute '(\w+)'", message)
+    if exception != "AttributeError" or not match:
+        return None
+    module, attribute = match.groups()
+    return "module_attribute", f"{module} has no attribute '{attribute}' in the installed version. Check the function name, or import the submodule that defines it."
+
+
+def triage_syntax_error(exception, message, context):
+    if exception not in ("SyntaxError", "IndentationError", "TabError"):
+        return None
+    return "syntax_error", f"The code does not parse ({exception}: {message.splitlines()[0] if message else 'invalid syntax'}). Fix the syntax at this line and return complete code."
+
+
+def triage_numeric_conversion(exception, message, context):
+    match = re.search(r"could not convert string to float: (.+)", message)
+    if exception != "ValueError" or not match:
+        return None
+    return "non_numeric_data", f"A text value ({match.group(1).splitlines()[0][:60]}) was used in a numeric operation. Keep only numeric columns (e.g. data.select_dtypes('number')) or move the identifier column to the index before computing."
+
+
+# checked in order; the first rule that recognizes the error writes the hint
+TRIAGE_RULES = [
+    triage_syntax_error,
+    triage_module_not_found,
+    triage_import_name,
+    triage_name_error,
+    triage_key_error,
+    triage_file_not_found,
+    triage_unexpected_argument,
+    triage_module_attribute,
+    triage_numeric_conversion,
+]
+
+
+def classify_error(error: str, code: str = None, schema: dict = None):
+    """
+    Fix hint for a traceback, when it belongs to a failure class with a mechanical fix
+
+    Args:
+        error: Traceback or error message of the failed execution
+        code: The code that failed, to quote the line the error points to
+        schema: Optional {absolute file path: column names} of the datasets, for "did you mean" hints
+
+    Returns:
+        {"error_class", "exception", "lineno", "comment"}, or None when the error needs the evaluator
+    """
+    parsed = parse_traceback(error)
+    if parsed["exception"] is None or str(error).startswith(("ResourceLimitError", "TimeoutError")):
+        # limits are left to the evaluator, which gets the execution profile
+        return None
+    context = {
+        "columns": sorted({str(column) for columns in (schema or {}).values() for column in columns}),
+        "paths": [os.path.relpath(path) for path in (schema or {})],
+    }
+    for rule in TRIAGE_RULES:
+        result = rule(parsed["exception"], parsed["message"], context)
+        if result is None:
+            continue
+        error_class, hint = result
+        location = ""
+        if parsed["lineno"] and code:
+            lines = code.splitlines()
+            if 0 < parsed["lineno"] <= len(lines):
+                location = f"Line {parsed['lineno']}: `{lines[parsed['lineno'] - 1].strip()}`. "
+        return {
+            "error_class": error_class,
+            "exception": parsed["exception"],
+            "lineno": parsed["lineno"],
+            "comment": location + hint,
+        }
+    return None
@@ -0,0 +1,177 @@
+"""
+Memo of execution outcomes by normalized code and dataset fingerprint.
+
+Small models often return the code of a failed attempt again, and benchmark trials at low
+temperature repeat the same programs across runs. Executing such code again costs the full data
+load and clustering for an outcome that is already known. The memo keys every outcome by the
+code's syntax tree (so comments, blank lines and formatting do not matter) and the fingerprints
+of the datasets it may read, and stores it in SQLite like the LLM response cache, so it is shared
+by benchmark worker processes and kept across runs.
+
+Outcomes that depend on the machine's state rather than the code (limit exceeded, killed,
+cancelled, worker died) are never stored. A reused outcome is marked memoized, and so is its
+profile, so metrics do not count its execution time again; an outcome whose figure files are
+gone is run again.
+"""
+import ast
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from dotenv import load_dotenv
+
+# load .env
+load_dotenv()
+
+
+# off: always execute, on: reuse the outcome of code that already ran on the same data. Off by default:
+# a reused outcome reports an execution that did not happen in this run
+EXEC_MEMO_MODE = os.getenv("EXEC_MEMO_MODE", "off")
+EXEC_MEMO_PATH = os.getenv("EXEC_MEMO_PATH", ".exec_memo.sqlite")
+EXEC_MEMO_MAX_MB = float(os.getenv("EXEC_MEMO_MAX_MB", "256"))
+
+MEMO_MODES = ("off", "on")
+
+
+def normalize_code(code: str):
+    """
+    Canonical form of the code: its syntax tree, without comments, blank lines or formatting
+    """
+    try:
+        return ast.dump(ast.parse(code))
+    except SyntaxError:
+        return "\n".join(line.rstrip() for line in code.strip().splitlines() if line.strip())
+
+
+def get_code_key(code: str):
+    return hashlib.sha256(normalize_code(code).encode("utf-8")).hexdigest()
+
+
+def get_outcome_key(code: str, datasets: list = None):
+    """
+    Hash of everything that determines an execution outcome: the normalized code and the data it may read
+    """
+    payload = json.dumps(
+        {
+            "code": get_code_key(code),
+            "datasets": sorted([handle["path"], handle["fingerprint"]] for handle in datasets or []),
+        },
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def is_reproducible(result: dict):
+    """
+    True when an outcome follows from the code and data alone and may be reused
+    """
+    if result.get("timed_out") or (result.get("profile") or {}).get("limit_exceeded"):
+        return False
+    if result.get("profile") is None:
+        # killed, cancelled or the worker died
+        return False
+    return True
+
+
+class ExecutionMemo:
+    """
+    Persistent execution outcome memo in SQLite with size-based LRU eviction
+    """
+
+    def __init__(self, path: str = None, max_mb: float = None):
+        self.path = path or EXEC_MEMO_PATH
+        self.max_bytes = int((max_mb or EXEC_MEMO_MAX_MB) * 1024 * 1024)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS outcomes ("
+                "key TEXT PRIMARY KEY, outcome TEXT, size INTEGER, created REAL, last_access REAL, hits INTEGER)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS outcomes_last_access ON outcomes (last_access)")
+
+    def _connect(self):
+        # one short-lived connection per operation: safe across threads and benchmark worker processes
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key):
+        with self._connect() as conn:
+            row = conn.execute("SELECT outcome FROM outcomes WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE outcomes SET last_access = ?, hits = hits + 1 WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key, outcome):
+        value = json.dumps(outcome, ensure_ascii=False, default=str)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO outcomes (key, outcome, size, created, last_access, hits) VALUES (?, ?, ?, ?, ?, 0)",
+                (key, value, len(value.encode("utf-8")), now, now),
+            )
+            self._evict(conn)
+
+    def _evict(self, conn):
+        """
+        Drop least recently used outcomes until the memo fits in max_bytes
+        """
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM outcomes").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        stale = []
+        for key, size in conn.execute("SELECT key, size FROM outcomes ORDER BY last_access"):
+            stale.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        conn.executemany("DELETE FROM outcomes WHERE key = ?", stale)
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM outcomes")
+
+
+_memos = {}
+
+
+def get_memo(path: str = None):
+    path = path or EXEC_MEMO_PATH
+    if path not in _memos:
+        _memos[path] = ExecutionMemo(path)
+    return _memos[path]
+
+
+def memoized_run(code: str, datasets: list, run, mode: str = None):
+    """
+    Return the stored outcome of this code on these datasets, or call run() and store its result.
+
+    Args:
+        run: Function that executes the code and returns the execution pool's result dict
+        mode: "off" or "on" (default: EXEC_MEMO_MODE)
+
+    Returns:
+        The result dict; "memoized" is True when it comes from the memo, and its profile is marked the same way
+    """
+    mode = mode or EXEC_MEMO_MODE
+    if mode not in MEMO_MODES:
+        raise ValueError(f"Unknown execution memo mode: {mode} (expected one of {MEMO_MODES})")
+    if mode == "off":
+        return run()
+
+    memo = get_memo()
+    key = get_outcome_key(code, datasets)
+    result = memo.get(key)
+    figure_files = [path for artifact in (result or {}).get("figures", []) for path in artifact["files"].values()]
+    if result is not None and all(os.path.exists(path) for path in figure_files):
+        print(f"(memoized outcome {key[:12]})")
+        # the stored profile describes the run that produced the outcome, not this one
+        profile = {**result["profile"], "memoized": True} if result.get("profile") else result.get("profile")
+        return {**result, "profile": profile, "memoized": True}
+    result = run()
+    if is_reproducible(result):
+        memo.put(key, result)
+    return {**result, "memoized": False}
@@ -0,0 +1,242 @@
+import atexit
+import contextlib
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+import traceback
+import types
+
+from dotenv import load_dotenv
+
+# load .env
+load_dotenv()
+
+
+# number of warm workers kept ready, and the resource limits of one snippet (override in .env; 0 disables a limit)
+EXEC_POOL_SIZE = int(os.getenv("EXEC_POOL_SIZE", "2"))
+EXEC_TIMEOUT = float(os.getenv("EXEC_TIMEOUT", "300"))
+EXEC_MAX_CPU_SECONDS = float(os.getenv("EXEC_MAX_CPU_SECONDS", "0"))
+EXEC_MAX_MEMORY_MB = float(os.getenv("EXEC_MAX_MEMORY_MB", "0"))
+
+# extra time a worker gets to report an interrupted snippet before it is killed
+KILL_GRACE_SECONDS = 10
+# how often a running snippet checks whether it was cancelled
+CANCEL_POLL_SECONDS = 0.05
+
+# imported once by the fork server; workers are forked from it with the stack already loaded
+PRELOAD_MODULES = ["src.exec_worker"]
+
+
+@contextlib.contextmanager
+def _hidden_main():
+    """
+    Start processes without the calling script as their __main__
+
+    A new process re-runs the parent's main script before it gets its target (the fork server's
+    "__main__" preload does not prevent this on Python 3.11), which costs a worker the import time
+    of everything the script imports. Workers only need src.exec_worker, so they get an empty
+    __main__ instead.
+    """
+    main = sys.modules["__main__"]
+    sys.modules["__main__"] = types.ModuleType("__main__")
+    try:
+        yield
+    finally:
+        sys.modules["__main__"] = main
+
+
+def _worker_main(conn):
+    """
+    Worker process entry point: run exactly one snippet, send back the result and exit
+    """
+    try:
+        code, limits, datasets = conn.recv()
+    except EOFError:
+        # the pool was closed before this worker got any work
+        return
+    try:
+        from src.exec_worker import run_snippet
+
+        result = run_snippet(code, limits, datasets)
+    except BaseException:
+        result = {
+            "success": False,
+            "stdout": "",
+            "error": traceback.format_exc(),
+            "n_figures": 0,
+            "figures": [],
+            "duration": 0.0,
+            "timed_out": False,
+            "profile": None,
+        }
+    conn.send(result)
+    conn.close()
+
+
+class ExecutionPool:
+    """
+    Pool of pre-forked worker processes for generated code.
+
+    Every worker has numpy/pandas/scipy/sklearn/seaborn and matplotlib (Agg) imported before it
+    is handed a snippet. A worker runs one snippet under a wall-clock timeout and is then
+    replaced, so no state leaks between attempts and runaway code is killed instead of
+    stalling the orchestrator.
+
+    Registered datasets are memory-mapped by the worker instead of parsed, so every snippet
+    shares the same copy of the data.
+
+    Every run is profiled (wall time, CPU time, peak RSS, sampled hot lines and functions) and
+    interrupted when it passes one of the configured limits.
+    """
+
+    def __init__(self, size: int = None, timeout: float = None, max_cpu_seconds: float = None, max_memory_mb: float = None):
+        self.size = size or EXEC_POOL_SIZE
+        self.timeout = timeout or EXEC_TIMEOUT
+        self.max_cpu_seconds = max_cpu_seconds if max_cpu_seconds is not None else EXEC_MAX_CPU_SECONDS
+        self.max_memory_mb = max_memory_mb if max_memory_mb is not None else EXEC_MAX_MEMORY_MB
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            self._context = multiprocessing.get_context("forkserver")
+            self._context.set_forkserver_preload(PRELOAD_MODULES)
+        else:
+            # no fork server (Windows): each spawned worker imports the stack while it waits in the pool
+            self._context = multiprocessing.get_context("spawn")
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        for _ in range(self.size):
+            self._start_worker()
+
+    def _start_worker(self):
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        with _hidden_main():
+            process.start()
+        child_conn.close()
+        self._idle.put((process, parent_conn))
+
+    def run(self, code: str, timeout: float = None, datasets: list = None, cancel: threading.Event = None):
+        """
+        Run a snippet in a warm worker. Blocks while every worker is busy.
+
+        Args:
+            datasets: Dataset registry handles the snippet may read without parsing (see src/dataset_registry.py)
+            cancel: Optional event; setting it kills the worker and returns a failed result right away
+
+        Returns:
+            dict with success, stdout, error (traceback or None), n_figures, figures, duration, timed_out and profile
+
+        Raises:
+            RuntimeError: when the pool is closed, including while waiting for a worker
+        """
+        timeout = timeout or self.timeout
+        limits = {
+            "wall_time": timeout,
+            "cpu_time": self.max_cpu_seconds or None,
+            "memory_mb": self.max_memory_mb or None,
+        }
+        if self._closed:
+            raise RuntimeError("ExecutionPool is closed")
+        worker = self._idle.get()
+        if worker is None:
+            # closed while waiting: pass the wake-up on to the next waiting caller
+            self._idle.put(None)
+            raise RuntimeError("ExecutionPool is closed")
+        process, conn = worker
+        with self._lock:
+            if not self._closed:
+                # replace the worker right away so the next attempt finds a warm one
+                self._start_worker()
+
+        start = time.perf_counter()
+        try:
+            conn.send((code, limits, datasets))
+            # the worker interrupts itself at the limit; the deadline only catches code stuck in C calls
+            deadline = start + timeout + KILL_GRACE_SECONDS
+            ready = False
+            while not ready and time.perf_counter() < deadline and not (cancel is not None and cancel.is_set()):
+                ready = conn.poll(min(CANCEL_POLL_SECONDS, max(deadline - time.perf_counter(), 0)) if cancel is not None else deadline - time.perf_counter())
+            if ready:
+                result = conn.recv()
+            elif cancel is not None and cancel.is_set():
+                result = {
+                    "success": False,
+                    "stdout": "",
+                    "error": "CancelledError: execution was cancelled",
+                    "n_figures": 0,
+                    "figures": [],
+                    "duration": time.perf_counter() - start,
+                    "timed_out": False,
+                    "profile": None,
+                }
+            else:
+                duration = time.perf_counter() - start
+                result = {
+                    "success": False,
+                    "stdout": "",
+                    "error": f"TimeoutError: execution exceeded the {timeout:g} s limit and was killed",
+                    "n_figures": 0,
+                    "figures": [],
+                    "duration": duration,
+                    "timed_out": True,
+                    "profile": {"wall_time": round(duration, 3), "limit_exceeded": "wall_time"},
+                }
+        except (EOFError, OSError):
+            process.join(1)
+            result = {
+                "success": False,
+                "stdout": "",
+                "error": f"Execution worker died unexpectedly (exit code {process.exitcode})",
+                "n_figures": 0,
+                "figures": [],
+                "duration": time.perf_counter() - start,
+                "timed_out": False,
+                "profile": None,
+            }
+        finally:
+            conn.close()
+            if process.is_alive():
+                process.kill()
+            process.join()
+        return result
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if worker is None:
+                continue
+            process, conn = worker
+            process.kill()
+            process.join()
+            conn.close()
+        # wakes up callers blocked waiting for a worker
+        self._idle.put(None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_exec_pool():
+    """
+    Return the process-wide execution pool, starting it on first use
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ExecutionPool()
+            atexit.register(_pool.close)
+    return _pool
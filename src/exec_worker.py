@@ -0,0 +1,158 @@
+"""
+Execution worker for generated code.
+
+Importing this module warms up the scientific stack, so the fork server of src/exec_pool.py
+preloads it once and every worker forked from it starts with everything already imported.
+"""
+import _thread
+import io
+import math
+import signal
+import sys
+import time
+import traceback
+import warnings
+from contextlib import redirect_stderr, redirect_stdout
+
+import matplotlib
+
+# headless: workers never have a display
+matplotlib.use("Agg")
+
+import matplotlib.pyplot as plt
+import numpy
+import pandas
+import scipy
+import scipy.cluster.hierarchy
+import seaborn
+import sklearn
+
+from src.checkpoint import EXEC_CHECKPOINTS, run_statements
+from src.dataset_registry import install_read_hooks
+from src.figure_export import FIGURE_EXPORT, export_figures
+from src.profiler import SamplingProfiler
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def get_peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class LimitWatchdog(SamplingProfiler):
+    """
+    Sampling profiler that also interrupts the snippet when it passes its wall-time or memory limit
+    """
+
+    def __init__(self, max_wall_seconds: float = None, max_memory_mb: float = None, **kwargs):
+        super().__init__(**kwargs)
+        self.deadline = time.perf_counter() + max_wall_seconds if max_wall_seconds else None
+        self.max_memory_mb = max_memory_mb
+        self.limit_exceeded = None
+
+    def _sample(self, frame):
+        super()._sample(frame)
+        if self.limit_exceeded:
+            return
+        if self.deadline and time.perf_counter() > self.deadline:
+            self.limit_exceeded = "wall_time"
+        elif self.max_memory_mb and (get_peak_rss_mb() or 0) > self.max_memory_mb:
+            self.limit_exceeded = "memory"
+        if self.limit_exceeded:
+            # a real SIGINT also wakes up blocking calls such as time.sleep; the handler raises KeyboardInterrupt
+            if hasattr(signal, "pthread_kill"):
+                signal.pthread_kill(self.thread_id, signal.SIGINT)
+            else:
+                _thread.interrupt_main()
+
+
+def run_snippet(code: str, limits: dict = None, datasets: list = None):
+    """
+    Execute one snippet in a fresh scope, capture its output and profile it
+
+    Args:
+        limits: Optional {"wall_time": s, "cpu_time": s, "memory_mb": MB}; a snippet over a limit is interrupted
+        datasets: Optional dataset registry handles; reading one of their paths maps the shared copy instead of parsing
+
+    Returns:
+        dict with success, stdout, error (traceback or None), n_figures, figures (artifacts saved by
+        src/figure_export.py, successful runs only), duration, timed_out and profile
+    """
+    limits = limits or {}
+    if datasets:
+        install_read_hooks(datasets)
+    plt.close('all')
+    scope = {}
+    stdout = io.StringIO()
+
+    watchdog = LimitWatchdog(limits.get("wall_time"), limits.get("memory_mb"))
+    if limits.get("cpu_time") and resource is not None:
+        def on_cpu_limit(signum, frame):
+            watchdog.limit_exceeded = "cpu_time"
+            raise KeyboardInterrupt
+
+        signal.signal(signal.SIGXCPU, on_cpu_limit)
+        cpu_limit = math.ceil(time.process_time() + limits["cpu_time"])
+        # the hard limit kills the worker if the snippet is stuck in C code and ignores SIGXCPU
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, cpu_limit + 10))
+
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    watchdog.start()
+    with warnings.catch_warnings():
+        with redirect_stdout(stdout), redirect_stderr(stdout):
+            execution = {"resumed": 0}
+            try:
+                if EXEC_CHECKPOINTS == "on":
+                    # resume after the longest unchanged statement prefix of an earlier run
+                    run_statements(code, scope, datasets, stdout, stats=execution)
+                else:
+                    exec(code, scope)
+                error = None
+            except BaseException:
+                error = traceback.format_exc()
+    duration = time.perf_counter() - start
+    cpu_time = time.process_time() - cpu_start
+    watchdog.stop()
+
+    if watchdog.limit_exceeded:
+        limit = limits[watchdog.limit_exceeded if watchdog.limit_exceeded != "memory" else "memory_mb"]
+        unit = "MB" if watchdog.limit_exceeded == "memory" else "s"
+        error = f"ResourceLimitError: {watchdog.limit_exceeded} limit of {limit:g} {unit} exceeded, execution was interrupted\n{error}"
+
+    figures = []
+    render_start = time.perf_counter()
+    if error is None and FIGURE_EXPORT == "on" and plt.get_fignums():
+        try:
+            figures = export_figures()
+        except Exception:
+            # a figure that cannot be saved is reported, but the code itself ran
+            stdout.write(f"\n[figure export failed]\n{traceback.format_exc()}")
+    render_time = time.perf_counter() - render_start
+
+    return {
+        "success": error is None,
+        "stdout": stdout.getvalue(),
+        "error": error,
+        "n_figures": len(plt.get_fignums()),
+        "figures": figures,
+        "duration": duration,
+        "timed_out": watchdog.limit_exceeded == "wall_time",
+        "profile": {
+            "wall_time": round(duration, 3),
+            "cpu_time": round(cpu_time, 3),
+            "peak_rss_mb": get_peak_rss_mb(),
+            "limit_exceeded": watchdog.limit_exceeded,
+            "hot_lines": watchdog.top_lines(code) if watchdog.samples else [],
+            "hot_functions": watchdog.top_functions() if watchdog.samples else [],
+            "resumed_statements": execution["resumed"],
+            "render_time": round(render_time, 3),
+        },
+    }
@@ -0,0 +1,197 @@
+"""
+Headless figure rendering and export.
+
+Generated code draws on the Agg backend of the execution workers. export_figures saves every
+open figure of an execution as PNG and/or SVG under FIGURE_DIR, so benchmarks and reports can
+show the plots without running the code again. Files are named by the hash of the rendered
+figure: a retry or another trial that draws the same plot reuses the files already saved.
+
+Dense artists (the cell mesh of sns.heatmap/clustermap, scatter plots with many points, large
+dendrograms) are rasterized before saving, so the SVG of a clustermap of thousands of genes
+embeds one image instead of a vector path per cell. With several figures and
+FIGURE_RENDER_WORKERS > 1 the figures are rendered in forked child processes, which inherit
+them from the execution without pickling.
+"""
+import hashlib
+import io
+import json
+import os
+
+import matplotlib
+from dotenv import load_dotenv
+
+# load .env
+load_dotenv()
+
+
+# on: save the figures of every successful execution, off: keep nothing
+FIGURE_EXPORT = os.getenv("FIGURE_EXPORT", "on")
+FIGURE_DIR = os.getenv("FIGURE_DIR", "figure_artifacts")
+FIGURE_FORMATS = [fmt.strip() for fmt in os.getenv("FIGURE_FORMATS", "png,svg").split(",") if fmt.strip()]
+FIGURE_DPI = int(os.getenv("FIGURE_DPI", "100"))
+# artists with at least this many cells/points/segments are rasterized (0: never)
+RASTERIZE_MIN_ELEMENTS = int(os.getenv("RASTERIZE_MIN_ELEMENTS", "2000"))
+FIGURE_RENDER_WORKERS = int(os.getenv("FIGURE_RENDER_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# fixed SVG element ids and no creation date, so the same figure always renders to the same bytes
+SVG_RC = {"svg.hashsalt": "figure-export"}
+METADATA = {"svg": {"Date": None}, "pdf": {"CreationDate": None}}
+
+
+def count_elements(artist):
+    """
+    Number of cells, points or segments an artist draws
+    """
+    from matplotlib.collections import LineCollection, PathCollection, QuadMesh
+
+    if isinstance(artist, QuadMesh):
+        array = artist.get_array()
+        return array.size if array is not None else 0
+    if isinstance(artist, PathCollection):
+        return len(artist.get_offsets())
+    if isinstance(artist, LineCollection):
+        return len(artist.get_segments())
+    return len(artist.get_paths())
+
+
+def rasterize_dense_artists(figure, min_elements: int = None):
+    """
+    Rasterize the collections with at least min_elements elements (default: RASTERIZE_MIN_ELEMENTS)
+
+    Returns:
+        The number of artists rasterized
+    """
+    min_elements = RASTERIZE_MIN_ELEMENTS if min_elements is None else min_elements
+    if not min_elements:
+        return 0
+    rasterized = 0
+    for ax in figure.axes:
+        for artist in ax.collections:
+            if not artist.get_rasterized() and count_elements(artist) >= min_elements:
+                artist.set_rasterized(True)
+                rasterized += 1
+    return rasterized
+
+
+def render_figure(figure, formats: list, dpi: int):
+    """
+    Rendered bytes of a figure per format
+    """
+    rendered = {}
+    with matplotlib.rc_context(SVG_RC):
+        for fmt in formats:
+            buffer = io.BytesIO()
+            figure.savefig(buffer, format=fmt, dpi=dpi, bbox_inches="tight", metadata=METADATA.get(fmt))
+            rendered[fmt] = buffer.getvalue()
+    return rendered
+
+
+def save_rendered(rendered: dict, directory: str):
+    """
+    Write rendered formats under the hash of the first one, unless they are saved already
+
+    Returns:
+        (content hash, {format: path}, reused)
+    """
+    digest = hashlib.sha256(next(iter(rendered.values()))).hexdigest()[:16]
+    os.makedirs(directory, exist_ok=True)
+    files = {}
+    reused = True
+    for fmt, data in rendered.items():
+        path = os.path.join(directory, f"{digest}.{fmt}")
+        files[fmt] = path
+        if os.path.exists(path):
+            continue
+        reused = False
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    return digest, files, reused
+
+
+def export_figure(figure, index: int, formats: list, dpi: int, directory: str):
+    """
+    Render and save one figure
+
+    Returns:
+        Artifact dict: figure (position in the execution), hash, files ({format: path}), width/height in
+        inches, rasterized artists and whether identical files already existed
+    """
+    rasterized = rasterize_dense_artists(figure)
+    digest, files, reused = save_rendered(render_figure(figure, formats, dpi), directory)
+    width, height = figure.get_size_inches()
+    return {
+        "figure": index,
+        "hash": digest,
+        "files": files,
+        "width": round(float(width), 2),
+        "height": round(float(height), 2),
+        "rasterized": rasterized,
+        "reused": reused,
+    }
+
+
+def export_in_children(figures: list, workers: int, formats: list, dpi: int, directory: str):
+    """
+    Render figures round-robin in forked children, which inherit them without pickling. Plain fork
+    instead of a process pool: the execution workers are daemonic and may not start pool processes.
+
+    Returns:
+        {index: artifact} of the figures the children rendered; a child that failed leaves its figures out
+    """
+    children = []
+    for worker in range(workers):
+        indices = list(range(worker, len(figures), workers))
+        read_end, write_end = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_end)
+            status = 1
+            try:
+                artifacts = [export_figure(figures[i], i, formats, dpi, directory) for i in indices]
+                with os.fdopen(write_end, "w") as pipe:
+                    json.dump(artifacts, pipe)
+                status = 0
+            finally:
+                os._exit(status)
+        os.close(write_end)
+        children.append((pid, read_end))
+
+    rendered = {}
+    for pid, read_end in children:
+        with os.fdopen(read_end) as pipe:
+            data = pipe.read()
+        _, status = os.waitpid(pid, 0)
+        if status == 0 and data:
+            rendered.update((artifact["figure"], artifact) for artifact in json.loads(data))
+    return rendered
+
+
+def export_figures(figures: list = None, formats: list = None, dpi: int = None, directory: str = None, workers: int = None):
+    """
+    Save figures (default: every open pyplot figure) as image files
+
+    Args:
+        formats: Image formats (default: FIGURE_FORMATS); the first names the content hash
+        workers: Render processes for more than one figure (default: FIGURE_RENDER_WORKERS)
+
+    Returns:
+        list of artifact dicts (see export_figure), in figure order
+    """
+    import matplotlib.pyplot as plt
+
+    formats = formats or FIGURE_FORMATS
+    dpi = dpi or FIGURE_DPI
+    directory = directory or FIGURE_DIR
+    workers = min(workers or FIGURE_RENDER_WORKERS, len(figures) if figures is not None else len(plt.get_fignums()))
+    if figures is None:
+        figures = [plt.figure(number) for number in plt.get_fignums()]
+    if not figures:
+        return []
+
+    rendered = {}
+    if workers > 1 and hasattr(os, "fork"):
+        rendered = export_in_children(figures, workers, formats, dpi, directory)
+    # inline: a single worker, no fork on this platform, or figures a child failed to render
+    return [rendered.get(i) or export_figure(figure, i, formats, dpi, directory) for i, figure in enumerate(figures)]
@@ -0,0 +1,234 @@
+"""
+Per-call generation statistics of streamed LLM responses.
+
+GenerationStats collects what a stream tells about one generation. Client-side it records the
+queue time, the time to first token, the decode time and a histogram of the gaps between
+streamed tokens (inter-token latency). From the server it keeps the token counts and timings:
+the usage chunk of the OpenAI-compatible endpoint (requested with stream_options.include_usage),
+and prompt_eval_count / prompt_eval_duration / eval_count / eval_duration from the last message
+of native Ollama. Prefill and decode speed per model can then be compared, which is what sizing
+hardware and choosing models needs. The LLM functions return the stats with return_stats=True
+and record them on their llm.request span, so traces and trace_summary.py show them as well.
+"""
+import time
+
+from src.metrics import percentile
+
+# upper bounds in seconds of the latency histogram buckets; the last bucket counts everything slower
+LATENCY_BUCKETS = (0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0, 10.0)
+
+
+def new_histogram():
+    return [0] * (len(LATENCY_BUCKETS) + 1)
+
+
+def add_to_histogram(histogram: list, seconds: float):
+    for i, bound in enumerate(LATENCY_BUCKETS):
+        if seconds <= bound:
+            histogram[i] += 1
+            return
+    histogram[-1] += 1
+
+
+def merge_histograms(histograms):
+    merged = new_histogram()
+    for histogram in histograms:
+        for i, count in enumerate(histogram or []):
+            merged[i] += count
+    return merged
+
+
+def format_histogram(histogram: list):
+    """
+    Non-empty buckets as "<=20ms: 31 | <=50ms: 4 | >10s: 1"
+    """
+    labels = [f"<={bound * 1000:g}ms" if bound < 1 else f"<={bound:g}s" for bound in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]:g}s"]
+    parts = [f"{label}: {count}" for label, count in zip(labels, histogram) if count]
+    return " | ".join(parts) if parts else "-"
+
+
+def get_field(data, name: str):
+    """
+    Field of a dict or of a response object (OpenAI usage, Ollama ChatResponse)
+    """
+    if data is None:
+        return None
+    if isinstance(data, dict):
+        return data.get(name)
+    return getattr(data, name, None)
+
+
+class GenerationStats:
+    """
+    Timings and token counts of one LLM call
+
+    Args:
+        model: Model name
+        role: "coder" or "evaluator"
+        prompt_tokens: Estimated prompt size, used until the server reports the real one
+    """
+
+    def __init__(self, model: str, role: str, prompt_tokens: int = None):
+        self.model = model
+        self.role = role
+        # answered by the response cache: no request, no timings
+        self.cached = True
+        self.queue_time = None
+        self.prompt_tokens = prompt_tokens
+        self.prompt_tokens_reported = False
+        self.cached_prompt_tokens = None
+        self.completion_tokens = None
+        self.chunks = 0
+        self.chars = 0
+        self.inter_token = new_histogram()
+        self.gaps = []
+        # native Ollama timings, in seconds
+        self.prompt_eval_count = None
+        self.prompt_eval_duration = None
+        self.eval_count = None
+        self.eval_duration = None
+        self.load_duration = None
+        self.total_duration = None
+        self._sent = None
+        self._first = None
+        self._last = None
+        self._end = None
+
+    def start(self, queue_time: float = None):
+        """
+        Mark the request as sent (after it left the scheduler queue)
+        """
+        self.cached = False
+        self.queue_time = queue_time
+        self._sent = time.perf_counter()
+
+    async def observe(self, deltas):
+        """
+        Pass streamed text deltas through, timing every token
+        """
+        if self._sent is None:
+            self.start()
+        try:
+            async for delta in deltas:
+                if not delta:
+                    continue
+                now = time.perf_counter()
+                if self._first is None:
+                    self._first = now
+                else:
+                    gap = now - self._last
+                    self.gaps.append(gap)
+                    add_to_histogram(self.inter_token, gap)
+                self._last = now
+                self.chunks += 1
+                self.chars += len(delta)
+                yield delta
+        finally:
+            self._end = time.perf_counter()
+
+    def record_usage(self, usage):
+        """
+        Token counts of the OpenAI-compatible usage chunk
+        """
+        if usage is None:
+            return
+        if get_field(usage, "prompt_tokens") is not None:
+            self.prompt_tokens = get_field(usage, "prompt_tokens")
+            self.prompt_tokens_reported = True
+        self.completion_tokens = get_field(usage, "completion_tokens")
+        self.cached_prompt_tokens = get_field(get_field(usage, "prompt_tokens_details"), "cached_tokens")
+
+    def record_ollama(self, part):
+        """
+        Counts and durations (nanoseconds) of the final message of a native Ollama stream
+        """
+        if not get_field(part, "done"):
+            return
+        for name in ("prompt_eval_duration", "eval_duration", "load_duration", "total_duration"):
+            value = get_field(part, name)
+            setattr(self, name, value / 1e9 if value is not None else None)
+        self.prompt_eval_count = get_field(part, "prompt_eval_count")
+        self.eval_count = get_field(part, "eval_count")
+        if self.eval_count is not None:
+            self.completion_tokens = self.eval_count
+
+    @property
+    def ttft(self):
+        return self._first - self._sent if self._first is not None else None
+
+    @property
+    def decode_time(self):
+        return self._last - self._first if self._first is not None else None
+
+    @property
+    def output_tokens(self):
+        # the servers stream one token per chunk when they do not report a count
+        return self.completion_tokens if self.completion_tokens is not None else self.chunks
+
+    @property
+    def tokens_per_sec(self):
+        """
+        Client-side decode speed: tokens after the first over the time they took to arrive
+        """
+        if not self.decode_time or self.output_tokens < 2:
+            return None
+        return (self.output_tokens - 1) / self.decode_time
+
+    @property
+    def prefill_tokens_per_sec(self):
+        if not self.prompt_eval_duration or not self.prompt_eval_count:
+            return None
+        return self.prompt_eval_count / self.prompt_eval_duration
+
+    @property
+    def decode_tokens_per_sec(self):
+        """
+        Server-side decode speed (native Ollama), free of network and client overhead
+        """
+        if not self.eval_duration or not self.eval_count:
+            return None
+        return self.eval_count / self.eval_duration
+
+    def to_dict(self):
+        def rounded(value, digits=4):
+            return round(value, digits) if value is not None else None
+
+        return {
+            "model": self.model,
+            "role": self.role,
+            "cached": self.cached,
+            "queue_time": rounded(self.queue_time),
+            "ttft": rounded(self.ttft),
+            "decode_time": rounded(self.decode_time),
+            "total_time": rounded(self._end - self._sent) if self._end is not None and self._sent is not None else None,
+            "prompt_tokens": self.prompt_tokens,
+            "prompt_tokens_reported": self.prompt_tokens_reported,
+            "cached_prompt_tokens": self.cached_prompt_tokens,
+            "output_tokens": self.output_tokens if not self.cached else None,
+            "output_chars": self.chars,
+            "tokens_per_sec": rounded(self.tokens_per_sec, 2),
+            "inter_token_p50": rounded(percentile(self.gaps, 50)),
+            "inter_token_p90": rounded(percentile(self.gaps, 90)),
+            "inter_token_p99": rounded(percentile(self.gaps, 99)),
+            "inter_token_histogram": self.inter_token,
+            "prompt_eval_count": self.prompt_eval_count,
+            "prompt_eval_duration": rounded(self.prompt_eval_duration),
+            "eval_count": self.eval_count,
+            "eval_duration": rounded(self.eval_duration),
+            "load_duration": rounded(self.load_duration),
+            "total_duration": rounded(self.total_duration),
+            "prefill_tokens_per_sec": rounded(self.prefill_tokens_per_sec, 2),
+            "decode_tokens_per_sec": rounded(self.decode_tokens_per_sec, 2),
+        }
+
+    def get_span_attributes(self):
+        """
+        The stats as llm.request span attributes (model and role are tags of the span already)
+        """
+        attributes = self.to_dict()
+        for name in ("model", "role", "cached"):
+            attributes.pop(name)
+        return {name: value for name, value in attributes.items() if value is not None}
+
+    def __repr__(self):
+        return f"GenerationStats({self.to_dict()})"
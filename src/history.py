@@ -0,0 +1,194 @@
+"""
+Token-budgeted conversation history for the coder/evaluator retry loop.
+
+Every retry adds the full code and traceback to the history, so without compaction the prompt
+(and the prefill time) grows with every attempt. compact_messages builds the context actually
+sent to the model: the leading system/request messages and the latest attempt stay verbatim,
+older attempts collapse into one short summary of the errors already seen, and the result is
+trimmed to the model's context budget.
+"""
+import ast
+import os
+
+from dotenv import load_dotenv
+
+try:
+    import tiktoken
+except ImportError:  # optional: token counts fall back to an estimate
+    tiktoken = None
+
+# load .env
+load_dotenv()
+
+
+# context size served for a model (default: LLM_NUM_CTX; override in .env); tokens kept free for the response
+LLM_CONTEXT_TOKENS = int(os.getenv("LLM_CONTEXT_TOKENS") or os.getenv("LLM_NUM_CTX") or "8192")
+LLM_RESPONSE_TOKENS = int(os.getenv("LLM_RESPONSE_TOKENS", "2048"))
+MODEL_CONTEXT_TOKENS = {
+    # "gemma3:27b": 16384,
+}
+
+# messages at the end of the history that are never summarized: the latest code with its error and feedback
+KEEP_RECENT_MESSAGES = 2
+# length of one error or feedback line of the summary
+SUMMARY_LINE_CHARS = 200
+# most recent feedback lines kept in the summary
+SUMMARY_MAX_FEEDBACK = 5
+# characters per token of the estimate used without tiktoken
+CHARS_PER_TOKEN = 4
+# overhead of one message (role, separators) in the chat template
+MESSAGE_TOKENS = 4
+
+SUMMARY_HEADER = "Summary of earlier attempts (their code was replaced by the latest version):"
+
+_encoding = None
+
+
+def count_tokens(text: str):
+    """
+    Token count of a text: exact with tiktoken installed, otherwise estimated from its UTF-8 size
+    """
+    global _encoding
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        return len(_encoding.encode(text, disallowed_special=()))
+    # UTF-8 bytes rather than characters, so Korean text is not undercounted
+    return len(text.encode("utf-8")) // CHARS_PER_TOKEN + 1
+
+
+def count_message_tokens(messages):
+    return sum(count_tokens(str(m.get("content", ""))) + MESSAGE_TOKENS for m in messages)
+
+
+def get_context_budget(model_name: str):
+    """
+    Prompt tokens available for a model: its context size minus the tokens reserved for the response
+    """
+    return MODEL_CONTEXT_TOKENS.get(model_name, LLM_CONTEXT_TOKENS) - LLM_RESPONSE_TOKENS
+
+
+def parse_turn(content: str):
+    """
+    Fields of a retry turn built by get_coder_prompt / get_evaluator_prompt (a dict rendered with str())
+    """
+    try:
+        fields = ast.literal_eval(content)
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        return None
+    return fields if isinstance(fields, dict) else None
+
+
+def shorten(text, limit: int = SUMMARY_LINE_CHARS):
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+def get_error_line(error):
+    """
+    The line of a traceback that names the exception, e.g. "KeyError: 'gene'"
+    """
+    lines = [line.strip() for line in str(error).strip().splitlines() if line.strip()]
+    if not lines:
+        return ""
+    for line in reversed(lines):
+        if not line.startswith(("File ", "^", "~")) and (":" in line or line.endswith(("Error", "Exception"))):
+            return shorten(line)
+    return shorten(lines[-1])
+
+
+def summarize_turns(messages, include_replies: bool):
+    """
+    One user message summarizing older attempts: each distinct error once, with the attempts it occurred in,
+    followed by the most recent feedback given
+
+    Args:
+        include_replies: Summarize the assistant replies too (evaluator comments); coder replies are code and are dropped
+    """
+    errors = {}
+    feedback = []
+    attempt = 0
+    for message in messages:
+        if message["role"] == "assistant":
+            if include_replies:
+                feedback.append(f"attempt {attempt}: {shorten(message['content'])}")
+            continue
+        fields = parse_turn(str(message["content"]))
+        if fields is None:
+            feedback.append(shorten(message["content"]))
+            continue
+        attempt += 1
+        if "error" in fields:
+            errors.setdefault(get_error_line(fields["error"]), []).append(attempt)
+        if fields.get("comment"):
+            feedback.append(f"attempt {attempt}: {shorten(fields['comment'])}")
+
+    lines = [SUMMARY_HEADER]
+    if errors:
+        lines.append("Errors already seen:")
+        lines += [f"- {error} (attempt {', '.join(map(str, attempts))})" for error, attempts in errors.items()]
+    if feedback:
+        lines.append("Feedback already given:")
+        lines += [f"- {line}" for line in feedback[-SUMMARY_MAX_FEEDBACK:]]
+    return {"role": "user", "content": "\n".join(lines)}
+
+
+def truncate_middle(text: str, max_tokens: int):
+    """
+    Keep the head and tail of a long text (a traceback's cause is usually at its end)
+    """
+    if count_tokens(text) <= max_tokens:
+        return text
+    keep = max(max_tokens * CHARS_PER_TOKEN // 2, 1)
+    return text[:keep] + "\n...[truncated]...\n" + text[-keep:]
+
+
+def compact_messages(messages, model_name: str, include_replies: bool = False, budget: int = None):
+    """
+    Context to send for a conversation history, within the model's token budget
+
+    The leading system messages and first request, and the last KEEP_RECENT_MESSAGES messages,
+    are kept verbatim; everything in between becomes one summary message. If that is still over
+    budget, the oldest summary lines are dropped and then the latest turn's long fields are cut
+    in the middle. The history itself is not modified.
+    """
+    budget = budget or get_context_budget(model_name)
+    n_prefix = 0
+    while n_prefix < len(messages) and messages[n_prefix]["role"] == "system":
+        n_prefix += 1
+    n_prefix = min(n_prefix + 1, len(messages))
+    prefix = messages[:n_prefix]
+    older = messages[n_prefix:-KEEP_RECENT_MESSAGES] if len(messages) - n_prefix > KEEP_RECENT_MESSAGES else []
+    recent = messages[n_prefix + len(older):]
+
+    summary = summarize_turns(older, include_replies) if older else None
+    context = prefix + ([summary] if summary else []) + recent
+    if count_message_tokens(context) <= budget:
+        return context
+
+    # drop the oldest summary lines first
+    if summary is not None:
+        lines = summary["content"].splitlines()
+        fixed_tokens = count_message_tokens(prefix + recent) + MESSAGE_TOKENS
+        while any(line.startswith("- ") for line in lines) and fixed_tokens + count_tokens("\n".join(lines)) > budget:
+            lines.pop(next(i for i, line in enumerate(lines) if line.startswith("- ")))
+        lines = [line for i, line in enumerate(lines) if line.startswith("- ") or i == 0 or (i + 1 < len(lines) and lines[i + 1].startswith("- "))]
+        summary = {"role": "user", "content": "\n".join(lines)} if len(lines) > 1 else None
+        context = prefix + ([summary] if summary else []) + recent
+        if count_message_tokens(context) <= budget:
+            return context
+
+    # then shorten the latest turn: cut its longest fields, never the code the model has to fix
+    available = budget - count_message_tokens(prefix + ([summary] if summary else []))
+    shortened = []
+    for message in recent:
+        fields = parse_turn(str(message["content"])) if message["role"] == "user" else None
+        share = max(available // max(len(recent), 1), 1)
+        if fields is not None:
+            for key, value in fields.items():
+                if key != "code" and isinstance(value, str):
+                    fields[key] = truncate_middle(value, share // 2)
+            shortened.append({**message, "content": str(fields)})
+        else:
+            shortened.append({**message, "content": truncate_middle(str(message["content"]), share)})
+    return prefix + ([summary] if summary else []) + shortened
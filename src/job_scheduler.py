@@ -0,0 +1,55 @@
+import multiprocessing
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+
+def init_worker():
+    """
+    Worker process initializer: headless matplotlib, so figures never need a display
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def run_jobs(jobs, func, max_workers=4, max_per_key=None, default_per_key=1, key=lambda job: job[0], initializer=init_worker):
+    """
+    Fan jobs out across worker processes and yield results as they complete.
+
+    Args:
+        jobs: Iterable of argument tuples; each job runs as func(*job) in a worker process
+        func: Picklable (module-level) function
+        max_workers: Number of worker processes
+        max_per_key: Dict of per-key concurrency caps, e.g. {"gemma3:27b": 1}
+        default_per_key: Cap for keys missing from max_per_key
+        key: Maps a job to its concurrency key (default: the first argument, the model name)
+
+    Yields:
+        (job, result, error): error is the exception raised by the job, or None
+    """
+    max_per_key = max_per_key or {}
+    pending = deque(jobs)
+    running = {}
+    in_flight = Counter()
+
+    # spawn: workers must not inherit the parent's threads (event loop, connection pools)
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context, initializer=initializer) as executor:
+        while pending or running:
+            # submit every pending job whose key is below its cap, keeping the original order otherwise
+            skipped = deque()
+            while pending and len(running) < max_workers:
+                job = pending.popleft()
+                job_key = key(job)
+                if in_flight[job_key] >= max(1, max_per_key.get(job_key, default_per_key)):
+                    skipped.append(job)
+                    continue
+                running[executor.submit(func, *job)] = job
+                in_flight[job_key] += 1
+            pending.extendleft(reversed(skipped))
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = running.pop(future)
+                in_flight[key(job)] -= 1
+                error = future.exception()
+                yield job, None if error else future.result(), error
@@ -0,0 +1,57 @@
+"""
+Runtime selection of the LLM transport.
+
+Both backends expose the same functions with the same arguments and return values:
+src/openai_llm.py talks to the OpenAI-compatible endpoint of the server, src/ollama_llms.py to
+the native Ollama API (which reports prefill/decode timings and takes every Ollama option).
+LLM_BACKEND picks one for the workflow and the scripts; transport_benchmark.py compares them.
+"""
+import os
+
+from dotenv import load_dotenv
+
+from src import ollama_llms, openai_llm
+
+# load .env
+load_dotenv()
+
+
+# openai: OpenAI-compatible endpoint (/v1/chat/completions), ollama: native API (/api/chat)
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")
+
+BACKENDS = {
+    "openai": openai_llm,
+    "ollama": ollama_llms,
+}
+
+
+def get_backend(name: str = None):
+    """
+    Module of the backend called name (default: LLM_BACKEND)
+    """
+    name = name or LLM_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend: {name} (expected one of {tuple(BACKENDS)})")
+    return BACKENDS[name]
+
+
+async def async_get_coder_response(model_name: str, message: list, history: bool = False, temperature: float = 0.0, scheduler=None,
+                                   return_stats: bool = False, backend: str = None):
+    return await get_backend(backend).async_get_coder_response(
+        model_name, message, history=history, temperature=temperature, scheduler=scheduler, return_stats=return_stats,
+    )
+
+
+async def async_get_evaluator_response(model_name: str, message: list, history: bool = False, temperature: float = 0.0, scheduler=None,
+                                       return_stats: bool = False, backend: str = None):
+    return await get_backend(backend).async_get_evaluator_response(
+        model_name, message, history=history, temperature=temperature, scheduler=scheduler, return_stats=return_stats,
+    )
+
+
+def get_coder_response(model_name: str, message: list, history: bool = False, temperature: float = 0.0, return_stats: bool = False, backend: str = None):
+    return get_backend(backend).get_coder_response(model_name, message, history=history, temperature=temperature, return_stats=return_stats)
+
+
+def get_evaluator_response(model_name: str, message: list, history: bool = False, temperature: float = 0.0, return_stats: bool = False, backend: str = None):
+    return get_backend(backend).get_evaluator_response(model_name, message, history=history, temperature=temperature, return_stats=return_stats)
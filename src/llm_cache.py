@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+from dotenv import load_dotenv
+
+from src.stream_parser import RepairedResponse
+
+# load .env
+load_dotenv()
+
+
+# off: always call the model, on: read-through cache, replay: cache only, never hit the network
+LLM_CACHE_MODE = os.getenv("LLM_CACHE_MODE", "off")
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", ".llm_cache.sqlite")
+LLM_CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "512"))
+
+CACHE_MODES = ("off", "on", "replay")
+
+
+class CacheMiss(Exception):
+    """
+    Raised in replay mode when a request is not in the cache
+    """
+
+
+def get_cache_key(model_name, temperature, messages, output_format):
+    """
+    Hash of everything that determines the response: model, temperature, messages and output schema
+    """
+    payload = json.dumps(
+        {
+            "model": model_name,
+            "temperature": temperature,
+            "messages": messages,
+            "schema": output_format.model_json_schema() if output_format is not None else None,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Persistent LLM response cache in SQLite with size-based LRU eviction
+    """
+
+    def __init__(self, path: str = None, max_mb: float = None):
+        self.path = path or LLM_CACHE_PATH
+        self.max_bytes = int((max_mb or LLM_CACHE_MAX_MB) * 1024 * 1024)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, model TEXT, response TEXT, size INTEGER, created REAL, last_access REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+
+    def _connect(self):
+        # one short-lived connection per operation: safe across threads and benchmark worker processes
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, key):
+        with self._connect() as conn:
+            row = conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+        return json.loads(row[0])
+
+    def put(self, key, model_name, response):
+        value = json.dumps(response, ensure_ascii=False)
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created, last_access) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model_name, value, len(value.encode("utf-8")), now, now),
+            )
+            self._evict(conn)
+
+    def _evict(self, conn):
+        """
+        Drop least recently used responses until the cache fits in max_bytes
+        """
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes
+        stale = []
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_access"):
+            stale.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM responses")
+
+
+_caches = {}
+
+
+def get_cache(path: str = None):
+    path = path or LLM_CACHE_PATH
+    if path not in _caches:
+        _caches[path] = LLMCache(path)
+    return _caches[path]
+
+
+async def cached_response(model_name, messages, temperature, output_format, generate, mode: str = None):
+    """
+    Return the cached response for this request, or await generate() and store its result.
+    Responses that only parsed after repair (see src/stream_parser.py) are not stored.
+
+    Args:
+        generate: Coroutine function that calls the model and returns the parsed response dict
+        mode: "off", "on" or "replay" (default: LLM_CACHE_MODE)
+
+    Raises:
+        CacheMiss: in replay mode, when the request has never been recorded
+    """
+    mode = mode or LLM_CACHE_MODE
+    if mode not in CACHE_MODES:
+        raise ValueError(f"Unknown LLM cache mode: {mode} (expected one of {CACHE_MODES})")
+    if mode == "off":
+        return await generate()
+
+    cache = get_cache()
+    key = get_cache_key(model_name, temperature, messages, output_format)
+    response = cache.get(key)
+    if response is not None:
+        print(f"(cached {key[:12]}) {json.dumps(response, ensure_ascii=False)}")
+        return response
+    if mode == "replay":
+        raise CacheMiss(f"No cached response for model {model_name} (key {key[:12]}) in replay mode")
+
+    response = await generate()
+    # truncated or repaired output is returned once, but never replayed
+    if not isinstance(response, RepairedResponse):
+        cache.put(key, model_name, response)
+    return response
@@ -0,0 +1,228 @@
+import asyncio
+import json
+import os
+import threading
+import weakref
+
+import httpx
+from dotenv import load_dotenv
+from ollama import AsyncClient as AsyncOllamaClient
+from openai import APIError, AsyncOpenAI, OpenAI
+from openai.types.chat import ChatCompletionChunk
+
+# load .env
+load_dotenv()
+
+
+OLLAMA_URL = os.getenv("OLLAMA_URL")
+
+# Connection pool settings (override in .env)
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "8"))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "300"))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "10"))
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "600"))
+
+# How long the server keeps a model (and its prompt cache) loaded after a request, and its context
+# size in tokens (override in .env; empty / 0 keeps the server defaults)
+LLM_KEEP_ALIVE = os.getenv("LLM_KEEP_ALIVE", "30m")
+LLM_NUM_CTX = int(os.getenv("LLM_NUM_CTX", "0"))
+# maximum response tokens, and CPU threads the server uses for a generation (0: server default)
+LLM_NUM_PREDICT = int(os.getenv("LLM_NUM_PREDICT", "4000"))
+LLM_NUM_THREAD = int(os.getenv("LLM_NUM_THREAD", "0"))
+
+_clients = {}
+_lock = threading.Lock()
+# async clients are bound to the event loop that created their connections
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_pool_limits(pool_size: int = None, keepalive_expiry: float = None):
+    """
+    Build the httpx connection limits shared by every LLM client
+
+    Args:
+        pool_size: Maximum number of (keep-alive) connections to the server
+        keepalive_expiry: Seconds an idle connection is kept open
+    """
+    pool_size = pool_size or LLM_POOL_SIZE
+    return httpx.Limits(
+        max_connections=pool_size,
+        max_keepalive_connections=pool_size,
+        keepalive_expiry=keepalive_expiry or LLM_KEEPALIVE_EXPIRY,
+    )
+
+
+def get_timeout(connect_timeout: float = None, read_timeout: float = None):
+    """
+    Build the httpx timeout. The read timeout bounds the gap between two streamed chunks,
+    not the whole generation.
+    """
+    return httpx.Timeout(
+        read_timeout or LLM_READ_TIMEOUT,
+        connect=connect_timeout or LLM_CONNECT_TIMEOUT,
+    )
+
+
+def get_openai_client(base_url: str = None, pool_size: int = None, connect_timeout: float = None, read_timeout: float = None):
+    """
+    Return a long-lived OpenAI client for the OpenAI-compatible Ollama endpoint.
+
+    Clients are cached per (base_url, pool settings) so that coder, evaluator and
+    benchmark iterations all reuse the same keep-alive connections instead of
+    opening a new socket for every request.
+    """
+    base_url = base_url or OLLAMA_URL
+    key = ("openai", base_url, pool_size, connect_timeout, read_timeout)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            http_client = httpx.Client(
+                limits=get_pool_limits(pool_size),
+                timeout=get_timeout(connect_timeout, read_timeout),
+            )
+            client = OpenAI(base_url=base_url + "/v1", api_key='ollama', http_client=http_client)
+            _clients[key] = client
+    return client
+
+
+def _get_loop_clients():
+    loop = asyncio.get_running_loop()
+    with _lock:
+        return _async_clients.setdefault(loop, {})
+
+
+def get_async_openai_client(base_url: str = None, pool_size: int = None, connect_timeout: float = None, read_timeout: float = None):
+    """
+    Async counterpart of get_openai_client, cached per running event loop
+    """
+    base_url = base_url or OLLAMA_URL
+    key = ("openai", base_url, pool_size, connect_timeout, read_timeout)
+    clients = _get_loop_clients()
+    client = clients.get(key)
+    if client is None:
+        http_client = httpx.AsyncClient(
+            limits=get_pool_limits(pool_size),
+            timeout=get_timeout(connect_timeout, read_timeout),
+        )
+        client = AsyncOpenAI(base_url=base_url + "/v1", api_key='ollama', http_client=http_client)
+        clients[key] = client
+    return client
+
+
+def get_async_ollama_client(base_url: str = None, pool_size: int = None, connect_timeout: float = None, read_timeout: float = None):
+    """
+    Return a native Ollama AsyncClient, cached per running event loop
+    """
+    base_url = base_url or OLLAMA_URL
+    key = ("ollama", base_url, pool_size, connect_timeout, read_timeout)
+    clients = _get_loop_clients()
+    client = clients.get(key)
+    if client is None:
+        client = AsyncOllamaClient(
+            host=base_url,
+            timeout=get_timeout(connect_timeout, read_timeout),
+            limits=get_pool_limits(pool_size),
+        )
+        clients[key] = client
+    return client
+
+
+def close_clients():
+    """
+    Close every cached client and its connection pool
+    """
+    with _lock:
+        for client in _clients.values():
+            client.close()
+        _clients.clear()
+
+
+def get_ollama_options(**options):
+    """
+    Ollama `options` of a request: the configured num_ctx, num_predict and num_thread plus the given options
+    """
+    if LLM_NUM_CTX:
+        options.setdefault("num_ctx", LLM_NUM_CTX)
+    if LLM_NUM_PREDICT:
+        options.setdefault("num_predict", LLM_NUM_PREDICT)
+    if LLM_NUM_THREAD:
+        options.setdefault("num_thread", LLM_NUM_THREAD)
+    return options
+
+
+def get_openai_extra_body():
+    """
+    Ollama fields (keep_alive, options) for requests to the OpenAI-compatible endpoint.
+    Servers that do not know them ignore them; set OLLAMA_KEEP_ALIVE / OLLAMA_CONTEXT_LENGTH on the
+    server for the same effect there.
+    """
+    body = {}
+    if LLM_KEEP_ALIVE:
+        body["keep_alive"] = LLM_KEEP_ALIVE
+    options = get_ollama_options()
+    if options:
+        body["options"] = options
+    return body
+
+
+async def load_model(model_name: str, keep_alive: str = None, base_url: str = None):
+    """
+    Load a model into server memory ahead of the first request, or unload it with keep_alive=0
+    """
+    client = get_async_ollama_client(base_url)
+    await client.generate(model=model_name, keep_alive=keep_alive if keep_alive is not None else LLM_KEEP_ALIVE, options=get_ollama_options())
+
+
+def json_schema_format(output_format):
+    """
+    Convert a pydantic output format into an OpenAI `response_format` parameter
+    """
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": output_format.__name__,
+            "schema": output_format.model_json_schema(),
+        },
+    }
+
+
+def stream_chat_completion(client, **kwargs):
+    """
+    Stream a chat completion and yield ChatCompletionChunk objects.
+
+    The SSE body is read to the end (past `data: [DONE]`) so that the connection is
+    handed back to the pool instead of being dropped, which is what the SDK stream
+    helpers do when they stop at [DONE].
+    """
+    with client.chat.completions.with_streaming_response.create(stream=True, **kwargs) as response:
+        for line in response.iter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                continue
+            chunk = json.loads(data)
+            if chunk.get("error"):
+                error = chunk["error"]
+                message = error.get("message") if isinstance(error, dict) else str(error)
+                raise APIError(message=message or "An error occurred during streaming", request=response.http_request, body=error)
+            yield ChatCompletionChunk.model_validate(chunk)
+
+
+async def astream_chat_completion(client, **kwargs):
+    """
+    Async counterpart of stream_chat_completion
+    """
+    async with client.chat.completions.with_streaming_response.create(stream=True, **kwargs) as response:
+        async for line in response.iter_lines():
+            if not line.startswith("data:"):
+                continue
+            data = line[len("data:"):].strip()
+            if data == "[DONE]":
+                continue
+            chunk = json.loads(data)
+            if chunk.get("error"):
+                error = chunk["error"]
+                message = error.get("message") if isinstance(error, dict) else str(error)
+                raise APIError(message=message or "An error occurred during streaming", request=response.http_request, body=error)
+            yield ChatCompletionChunk.model_validate(chunk)
@@ -0,0 +1,101 @@
+import asyncio
+import os
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager
+
+from dotenv import load_dotenv
+
+# load .env
+load_dotenv()
+
+
+# Maximum number of generations in flight against the LLM server (override in .env)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+
+
+class LLMScheduler:
+    """
+    Semaphore-limited request scheduler.
+
+    Every LLM request acquires a slot before it is sent, so any number of workflow runs
+    can share one event loop while at most `max_concurrency` generations are in flight.
+    """
+
+    def __init__(self, max_concurrency: int = None):
+        self.max_concurrency = max_concurrency or LLM_MAX_CONCURRENCY
+        self.in_flight = 0
+        self.waiting = 0
+        self._semaphore = None
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+        Wait for a free request slot. Yields the time spent queueing in seconds.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        start = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            yield time.perf_counter() - start
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    async def submit(self, func, *args, **kwargs):
+        """
+        Run the coroutine function `func(*args, **kwargs)` inside a request slot
+        """
+        async with self.slot():
+            return await func(*args, **kwargs)
+
+
+# one default scheduler per event loop (an asyncio.Semaphore can't be shared between loops)
+_schedulers = weakref.WeakKeyDictionary()
+
+_background_loop = None
+_background_thread = None
+_background_lock = threading.Lock()
+
+
+def get_scheduler():
+    """
+    Return the default scheduler of the running event loop
+    """
+    loop = asyncio.get_running_loop()
+    scheduler = _schedulers.get(loop)
+    if scheduler is None:
+        scheduler = LLMScheduler()
+        _schedulers[loop] = scheduler
+    return scheduler
+
+
+def _get_background_loop():
+    global _background_loop, _background_thread
+    with _background_lock:
+        if _background_loop is None:
+            _background_loop = asyncio.new_event_loop()
+            _background_thread = threading.Thread(target=_background_loop.run_forever, name="llm-event-loop", daemon=True)
+            _background_thread.start()
+    return _background_loop
+
+
+def run_sync(coro):
+    """
+    Run a coroutine on the shared background event loop and wait for its result.
+
+    This is what keeps the sync API a thin wrapper: every sync call lands on the same
+    loop, so it shares that loop's pooled async clients and default scheduler.
+    """
+    loop = _get_background_loop()
+    if threading.current_thread() is _background_thread:
+        coro.close()
+        raise RuntimeError("run_sync() can't be called from the LLM event loop; await the coroutine instead")
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
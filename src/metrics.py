@@ -0,0 +1,310 @@
+"""
+Per-trial performance metrics, per-model aggregates and regression checks against a baseline.
+
+Every trial returns a metrics record built from the spans it traced (see src/tracing.py):
+success, retries, wall time, time per stage, LLM calls and tokens, and the execution time of the
+generated code. benchmark.py appends these records to benchmark_results_{model}/metrics.jsonl;
+aggregate_metrics turns them into percentiles and a success curve per model, and
+compare_to_baseline flags the metrics that got worse than a stored baseline by more than their
+threshold. metrics_report.py does the same from the command line.
+"""
+import json
+import math
+import statistics
+from collections import defaultdict
+
+# allowed change before a metric counts as a regression: success rates (and the success curve)
+# may drop by this many points, every other metric may grow by this fraction of its baseline value
+# (any growth from a baseline of 0 counts)
+REGRESSION_THRESHOLDS = {
+    "success_rate": 0.05,
+    "success_curve": 0.10,
+    "retries_to_success.mean": 0.25,
+    "wall_time.p50": 0.10,
+    "wall_time.p90": 0.20,
+    "execution_time.p50": 0.20,
+    "input_tokens.p50": 0.20,
+    "output_tokens.p50": 0.20,
+    "llm_calls.mean": 0.20,
+}
+
+PERCENTILES = (50, 90, 99)
+
+
+def get_children(records):
+    children = defaultdict(list)
+    for record in records:
+        children[record["parent_id"]].append(record)
+    return children
+
+
+def get_descendants(record, children):
+    stack = list(children[record["span_id"]])
+    while stack:
+        child = stack.pop()
+        yield child
+        stack.extend(children[child["span_id"]])
+
+
+def get_covered_time(records):
+    """
+    Wall time covered by at least one of the spans (overlapping spans count once)
+    """
+    covered = 0.0
+    end = None
+    for start, stop in sorted((r["start"], r["start"] + r["duration"]) for r in records):
+        if end is None or start > end:
+            covered += stop - start
+            end = stop
+        elif stop > end:
+            covered += stop - end
+            end = stop
+    return covered
+
+
+def summarize_trial(trial, children):
+    """
+    Stage times and LLM request statistics of one trial span
+
+    Args:
+        trial: Record of the "trial" span
+        children: Span records by parent span id (see get_children)
+    """
+    descendants = list(get_descendants(trial, children))
+    stages = defaultdict(lambda: {"count": 0, "seconds": 0.0})
+    # a stage nested in another (prompt compaction inside an LLM call) is counted by its outer stage
+    for record in children[trial["span_id"]]:
+        stages[record["name"]]["count"] += 1
+        stages[record["name"]]["seconds"] += record["duration"]
+
+    requests = [r for r in descendants if r["name"] == "llm.request"]
+    calls = [r for r in descendants if r["name"] in ("llm.coder", "llm.evaluator")]
+    attributes = [r["attributes"] for r in requests]
+    ttfts = [a["ttft"] for a in attributes if a.get("ttft") is not None]
+    decode = sum(a.get("decode_time") or 0 for a in attributes)
+    tokens = sum(a.get("output_tokens") or 0 for a in attributes)
+    return {
+        "model": trial["attributes"].get("model"),
+        "trial": trial["attributes"].get("trial"),
+        "success": trial["attributes"].get("success"),
+        "retries": trial["attributes"].get("retries"),
+        "wall": trial["duration"],
+        "stages": dict(stages),
+        "other": max(0.0, trial["duration"] - get_covered_time(children[trial["span_id"]])),
+        "llm": {
+            "calls": len(calls),
+            # calls answered by the response cache never send a request
+            "cached": len(calls) - len(requests),
+            "queue": sum(a.get("queue_time") or 0 for a in attributes),
+            "ttft": statistics.mean(ttfts) if ttfts else None,
+            "decode": decode,
+            "prompt_tokens": sum(a.get("prompt_tokens") or 0 for a in attributes),
+            "output_tokens": tokens,
+            "tokens_per_sec": tokens / decode if decode else None,
+        },
+    }
+
+
+def get_trial_metrics(result: dict, records: list):
+    """
+    Metrics record of a finished trial
+
+    Args:
+        result: The dict returned by async_run_trial
+        records: Span records the trial collected (see tracing.collect_spans)
+
+    Returns:
+        dict with success, retries, retries_to_success (None when it failed), wall_time, stages
+        ({stage: seconds}), llm_calls, cached_calls, input_tokens, output_tokens, mean ttft, the
+        execution and figure render time of the generated code over the attempts that ran (not
+        the ones reused from the execution memo), and the files of the figures the final code drew
+    """
+    trial = next((r for r in records if r["name"] == "trial"), None)
+    summary = summarize_trial(trial, get_children(records)) if trial is not None else None
+    # outcomes reused from the execution memo did not run in this trial
+    profiles = [profile for profile in result.get("profiles", []) if profile and not profile.get("memoized")]
+    return {
+        "model": result.get("model_name"),
+        "trial": summary["trial"] if summary else None,
+        "success": bool(result.get("success")),
+        "retries": result.get("retries"),
+        "retries_to_success": result.get("retries") if result.get("success") else None,
+        "wall_time": round(summary["wall"], 4) if summary else None,
+        "stages": {name: round(stage["seconds"], 4) for name, stage in summary["stages"].items()} if summary else {},
+        "llm_calls": summary["llm"]["calls"] if summary else None,
+        "cached_calls": summary["llm"]["cached"] if summary else None,
+        "input_tokens": summary["llm"]["prompt_tokens"] if summary else None,
+        "output_tokens": summary["llm"]["output_tokens"] if summary else None,
+        "ttft": round(summary["llm"]["ttft"], 4) if summary and summary["llm"]["ttft"] is not None else None,
+        "execution_time": round(sum(profile.get("wall_time") or 0 for profile in profiles), 4),
+        "render_time": round(sum(profile.get("render_time") or 0 for profile in profiles), 4),
+        "figures": [artifact["files"] for artifact in result.get("figures", [])],
+    }
+
+
+def get_failed_trial_metrics(model_name: str, error: BaseException):
+    """
+    Metrics record of a trial that raised: the fields of get_trial_metrics, None where nothing was measured
+    """
+    record = {name: None for name in get_trial_metrics({}, [])}
+    return {**record, "model": model_name, "success": False, "stages": {}, "figures": [], "error": repr(error)}
+
+
+def percentile(values, q: float):
+    """
+    q-th percentile (0-100) with linear interpolation between the closest ranks
+    """
+    values = sorted(values)
+    if not values:
+        return None
+    rank = (len(values) - 1) * q / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+def describe(values):
+    """
+    Mean and percentiles of the values that are not None
+    """
+    values = [v for v in values if v is not None]
+    if not values:
+        return None
+    summary = {"mean": round(statistics.mean(values), 4)}
+    for q in PERCENTILES:
+        summary[f"p{q}"] = round(percentile(values, q), 4)
+    return summary
+
+
+def aggregate_metrics(records: list):
+    """
+    Per-model aggregates of trial metrics records
+
+    Returns:
+        {model: {"trials", "success_rate", "success_curve", "retries_to_success", "wall_time",
+        "execution_time", "render_time", "input_tokens", "output_tokens", "llm_calls", "ttft", "stages"}}.
+        success_curve[k] is the fraction of trials that succeeded after at most k retries.
+    """
+    by_model = defaultdict(list)
+    for record in records:
+        by_model[record["model"]].append(record)
+
+    aggregates = {}
+    for model, model_records in by_model.items():
+        n = len(model_records)
+        # records of trials that raised carry None for everything they never measured
+        retries = [r.get("retries_to_success") for r in model_records if r.get("success")]
+        max_retries = max([r.get("retries") or 0 for r in model_records], default=0)
+        stage_names = sorted({name for r in model_records for name in r.get("stages", {})})
+        aggregates[model] = {
+            "trials": n,
+            "success_rate": round(len(retries) / n, 4),
+            "success_curve": [round(sum(1 for k in retries if k <= limit) / n, 4) for limit in range(max_retries + 1)],
+            "retries_to_success": describe(retries),
+            "wall_time": describe([r.get("wall_time") for r in model_records]),
+            "execution_time": describe([r.get("execution_time") for r in model_records]),
+            "render_time": describe([r.get("render_time") for r in model_records]),
+            "input_tokens": describe([r.get("input_tokens") for r in model_records]),
+            "output_tokens": describe([r.get("output_tokens") for r in model_records]),
+            "llm_calls": describe([r.get("llm_calls") for r in model_records]),
+            "ttft": describe([r.get("ttft") for r in model_records]),
+            # a trial that never reached a stage spent 0 s in it
+            "stages": {name: describe([r.get("stages", {}).get(name, 0.0) for r in model_records]) for name in stage_names},
+        }
+    return aggregates
+
+
+def get_metric(aggregate: dict, name: str):
+    """
+    Value of a dotted metric name ("wall_time.p90"); the success curve is compared point by point
+    """
+    value = aggregate
+    for part in name.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def compare_to_baseline(aggregates: dict, baseline: dict, thresholds: dict = None):
+    """
+    Metrics that got worse than the baseline by more than their threshold
+
+    Args:
+        aggregates: aggregate_metrics of the current run
+        baseline: aggregate_metrics of the baseline run
+        thresholds: {metric: allowed change}, merged over REGRESSION_THRESHOLDS
+
+    Returns:
+        list of {"model", "metric", "baseline", "current", "change", "threshold"}, empty when nothing regressed;
+        models missing from either run are skipped
+    """
+    thresholds = {**REGRESSION_THRESHOLDS, **(thresholds or {})}
+    regressions = []
+    for model, aggregate in aggregates.items():
+        if model not in baseline:
+            continue
+        for metric, threshold in thresholds.items():
+            current, previous = get_metric(aggregate, metric), get_metric(baseline[model], metric)
+            if current is None or previous is None:
+                continue
+            if metric == "success_curve":
+                # success after at most k retries; past the last retry a run reached, its curve stays flat
+                length = max(len(current), len(previous))
+                current, previous = current + current[-1:] * (length - len(current)), previous + previous[-1:] * (length - len(previous))
+                for k, (now, before) in enumerate(zip(current, previous)):
+                    if before - now > threshold:
+                        regressions.append({"model": model, "metric": f"success_curve[{k}]", "baseline": before, "current": now, "change": round(now - before, 4), "threshold": threshold})
+                continue
+            if metric == "success_rate":
+                change = current - previous
+                regressed = -change > threshold
+            else:
+                if previous:
+                    change = (current - previous) / previous
+                else:
+                    # any increase from zero is unbounded relative to it
+                    change = float("inf") if current > 0 else 0.0
+                regressed = change > threshold
+            if regressed:
+                regressions.append({"model": model, "metric": metric, "baseline": previous, "current": current, "change": round(change, 4), "threshold": threshold})
+    return regressions
+
+
+def read_metrics(paths):
+    """
+    Metrics records of one or more metrics.jsonl files
+    """
+    records = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            records.extend(json.loads(line) for line in f if line.strip())
+    return records
+
+
+def format_aggregate(model: str, aggregate: dict):
+    def fmt(summary, unit=""):
+        if summary is None:
+            return "-"
+        return f"p50 {summary['p50']:g}{unit} p90 {summary['p90']:g}{unit} p99 {summary['p99']:g}{unit}"
+
+    lines = [
+        f"===== {model}: {aggregate['trials']} trials, success rate {aggregate['success_rate']:.0%} =====",
+        "    success within k retries: " + " ".join(f"{k}:{rate:.0%}" for k, rate in enumerate(aggregate["success_curve"])),
+        f"    retries to success: {fmt(aggregate['retries_to_success'])}",
+        f"    wall time: {fmt(aggregate['wall_time'], 's')}",
+        f"    execution time: {fmt(aggregate['execution_time'], 's')} | figure rendering {fmt(aggregate.get('render_time'), 's')}",
+        f"    tokens: input {fmt(aggregate['input_tokens'])} | output {fmt(aggregate['output_tokens'])}",
+        f"    llm calls: {fmt(aggregate['llm_calls'])} | ttft {fmt(aggregate['ttft'], 's')}",
+    ]
+    for name, summary in aggregate["stages"].items():
+        lines.append(f"    {name}: {fmt(summary, 's')}")
+    return "\n".join(lines)
+
+
+def format_regressions(regressions: list):
+    if not regressions:
+        return "no regressions against the baseline"
+    return "\n".join(
+        f"REGRESSION {r['model']} {r['metric']}: {r['baseline']:g} -> {r['current']:g} (change {r['change']:+g}, threshold {r['threshold']:g})"
+        for r in regressions
+    )
@@ -0,0 +1,418 @@
+"""
+Local stand-in for the Ollama server, for load tests on machines without a GPU.
+
+Implements the endpoints used by src/openai_llm.py and src/ollama_llms.py:
+    POST /v1/chat/completions   (OpenAI-compatible, streaming SSE or plain JSON)
+    POST /api/chat              (native Ollama, streaming NDJSON or plain JSON)
+    POST /api/generate          (model load/unload requests only)
+
+Responses are scripted CODER_OUTPUT_FORMAT / EVALUATOR_OUTPUT_FORMAT objects, picked by the
+schema the request asks for, and streamed with a configurable time-to-first-token and decode speed.
+With --prompt-cache, prefill time is only charged for the prompt tokens after the longest prefix
+cached from an earlier request, like Ollama's per-slot KV cache.
+
+usage: python -m src.mock_server --port 11434 --ttft 0.5 --tokens-per-sec 30 --error-rate 0.05
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# approximate characters per token, used to chunk responses and to count tokens
+CHARS_PER_TOKEN = 4
+
+DEFAULT_SCRIPT = {
+    "coder": [
+        {
+            "thought": "Load the data and draw a clustermap of the most variable columns.",
+            "code": (
+                "import pandas as pd\n"
+                "import seaborn as sns\n"
+                "print('mock coder output')\n"
+            ),
+        },
+    ],
+    "evaluator": [
+        {
+            "thought": "The code ran without errors.",
+            "retry": False,
+            "comment": "No changes needed.",
+        },
+    ],
+}
+
+
+def load_script(path: str):
+    """
+    Load scripted responses from a JSON file: {"coder": [...], "evaluator": [...]}
+    """
+    with open(path, encoding="utf-8") as f:
+        script = json.load(f)
+    return {role: script.get(role) or DEFAULT_SCRIPT[role] for role in DEFAULT_SCRIPT}
+
+
+def load_recorded(path: str):
+    """
+    Load recorded responses from an LLM response cache database (see src/llm_cache.py)
+    """
+    script = {"coder": [], "evaluator": []}
+    conn = sqlite3.connect(path)
+    try:
+        for (value,) in conn.execute("SELECT response FROM responses ORDER BY created"):
+            response = json.loads(value)
+            if "code" in response:
+                script["coder"].append(response)
+            elif "retry" in response:
+                script["evaluator"].append(response)
+    finally:
+        conn.close()
+    return {role: script[role] or DEFAULT_SCRIPT[role] for role in script}
+
+
+def get_role(schema):
+    """
+    Pick the scripted role from the requested output schema
+    """
+    properties = (schema or {}).get("properties", {})
+    if "retry" in properties:
+        return "evaluator"
+    return "coder"
+
+
+def count_tokens(messages):
+    return sum(len(str(m.get("content", ""))) for m in messages) // CHARS_PER_TOKEN + 1
+
+
+def render_prompt(messages):
+    """
+    Flatten chat messages the way a chat template would, for prompt-cache prefix matching
+    """
+    return "".join(f"<|{m.get('role')}|>{m.get('content', '')}" for m in messages)
+
+
+def split_tokens(text: str):
+    return [text[i:i + CHARS_PER_TOKEN] for i in range(0, len(text), CHARS_PER_TOKEN)]
+
+
+class MockLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, script=None, ttft: float = 0.2, tokens_per_sec: float = 50.0, prefill_tokens_per_sec: float = 0.0,
+                 error_rate: float = 0.0, stream_error_rate: float = 0.0, max_parallel: int = 0, prompt_cache: bool = False,
+                 shuffle: bool = False, seed: int = None):
+        """
+        Args:
+            script: {"coder": [...], "evaluator": [...]} responses, served round-robin
+            ttft: Fixed time to first token in seconds
+            tokens_per_sec: Decode speed; 0 streams everything at once
+            prefill_tokens_per_sec: Adds prompt_tokens / prefill_tokens_per_sec to the ttft; 0 disables
+            error_rate: Probability of answering HTTP 500 before streaming
+            stream_error_rate: Probability of failing in the middle of a stream
+            max_parallel: Requests generated at once (like OLLAMA_NUM_PARALLEL); 0 means unlimited
+            prompt_cache: Emulate the server's KV/prompt cache: one cached prompt per parallel slot, and only
+                the tokens after the longest cached prefix are charged prefill time
+            shuffle: Serve the scripted responses in random order instead of round-robin, e.g. to emulate
+                a model that writes working code for a fraction of its samples
+        """
+        super().__init__(address, MockLLMHandler)
+        self.script = script or DEFAULT_SCRIPT
+        self.ttft = ttft
+        self.tokens_per_sec = tokens_per_sec
+        self.prefill_tokens_per_sec = prefill_tokens_per_sec
+        self.error_rate = error_rate
+        self.stream_error_rate = stream_error_rate
+        self.random = random.Random(seed)
+        self.slots = threading.Semaphore(max_parallel) if max_parallel else None
+        self.prompt_cache = [None] * max(max_parallel, 1) if prompt_cache else None
+        self.connections = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+        self.shuffle = shuffle
+        self._cycles = {role: itertools.cycle(responses) for role, responses in self.script.items()}
+
+    def next_response(self, role: str):
+        with self._lock:
+            self.requests += 1
+            response = self.random.choice(self.script[role]) if self.shuffle else next(self._cycles[role])
+            return json.dumps(response, ensure_ascii=False)
+
+    def match_prompt_cache(self, messages):
+        """
+        Number of prompt tokens served from the emulated cache; the prompt then replaces the
+        best-matching cached one, or the least recently used one when nothing matches
+        """
+        if self.prompt_cache is None:
+            return 0
+        text = render_prompt(messages)
+        with self._lock:
+            best, best_length = len(self.prompt_cache) - 1, 0
+            for i, cached in enumerate(self.prompt_cache):
+                if cached is None:
+                    continue
+                length = len(os.path.commonprefix([cached, text]))
+                if length > best_length:
+                    best, best_length = i, length
+            del self.prompt_cache[best]
+            self.prompt_cache.insert(0, text)
+        return best_length // CHARS_PER_TOKEN
+
+    def roll(self, rate: float):
+        with self._lock:
+            return rate > 0 and self.random.random() < rate
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        with self.server._lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status: int, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def start_chunked(self, content_type: str):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def write_chunk(self, data: bytes):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def end_chunked(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path == "/api/version":
+            self.send_json(200, {"version": "mock"})
+        elif self.path in ("/", "/api/tags"):
+            self.send_json(200, {"models": []})
+        else:
+            self.send_json(404, {"error": f"unknown path {self.path}"})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path == "/api/generate" and not body.get("prompt"):
+            # model load / unload request (see llm_client.load_model)
+            self.send_json(200, {"model": body.get("model", "mock"), "response": "", "done": True, "done_reason": "load"})
+            return
+        if self.path == "/v1/chat/completions":
+            schema = ((body.get("response_format") or {}).get("json_schema") or {}).get("schema")
+            handler = self.openai_chat
+        elif self.path == "/api/chat":
+            schema = body.get("format") if isinstance(body.get("format"), dict) else None
+            handler = self.ollama_chat
+        else:
+            self.send_json(404, {"error": f"unknown path {self.path}"})
+            return
+
+        if self.server.roll(self.server.error_rate):
+            self.send_json(500, {"error": {"message": "mock server: injected error"}})
+            return
+
+        content = self.server.next_response(get_role(schema))
+        prompt_tokens = count_tokens(body.get("messages", []))
+        self.cached_tokens = min(self.server.match_prompt_cache(body.get("messages", [])), prompt_tokens)
+        if self.server.slots:
+            self.server.slots.acquire()
+        try:
+            handler(body, content, prompt_tokens)
+        except (BrokenPipeError, ConnectionResetError):
+            # the client closed the stream early (aborted or cancelled generation)
+            self.close_connection = True
+        finally:
+            if self.server.slots:
+                self.server.slots.release()
+
+    def generate(self, prompt_tokens: int, content: str):
+        """
+        Sleep for the time to first token, then yield tokens at the decode speed.
+        The (prompt eval, eval) durations in seconds are left in self.durations.
+        """
+        ttft = self.server.ttft
+        if self.server.prefill_tokens_per_sec:
+            ttft += (prompt_tokens - self.cached_tokens) / self.server.prefill_tokens_per_sec
+        time.sleep(ttft)
+        tokens = split_tokens(content)
+        fail_at = self.server.random.randrange(1, len(tokens)) if len(tokens) > 1 and self.server.roll(self.server.stream_error_rate) else None
+        start = time.perf_counter()
+        for i, token in enumerate(tokens):
+            if i == fail_at:
+                raise RuntimeError("mock server: injected stream error")
+            if i and self.server.tokens_per_sec:
+                time.sleep(1 / self.server.tokens_per_sec)
+            yield token
+        self.durations = (ttft, time.perf_counter() - start)
+
+    def openai_chat(self, body, content, prompt_tokens):
+        model = body.get("model", "mock")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(split_tokens(content)),
+            "total_tokens": prompt_tokens + len(split_tokens(content)),
+            "prompt_tokens_details": {"cached_tokens": self.cached_tokens},
+        }
+
+        if not body.get("stream"):
+            text = "".join(self.generate(prompt_tokens, content))
+            self.send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+
+        def event(delta, finish_reason=None, **extra):
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            chunk.update(extra)
+            return f"data: {json.dumps(chunk)}\n\n".encode()
+
+        self.start_chunked("text/event-stream")
+        try:
+            for i, token in enumerate(self.generate(prompt_tokens, content)):
+                delta = {"role": "assistant", "content": token} if i == 0 else {"content": token}
+                self.write_chunk(event(delta))
+        except RuntimeError as e:
+            self.write_chunk(f"data: {json.dumps({'error': {'message': str(e)}})}\n\n".encode())
+            self.end_chunked()
+            return
+        self.write_chunk(event({}, "stop"))
+        if (body.get("stream_options") or {}).get("include_usage"):
+            usage_chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model, "choices": [], "usage": usage}
+            self.write_chunk(f"data: {json.dumps(usage_chunk)}\n\n".encode())
+        self.write_chunk(b"data: [DONE]\n\n")
+        self.end_chunked()
+
+    def ollama_chat(self, body, content, prompt_tokens):
+        model = body.get("model", "mock")
+
+        def message(text, done=False, **extra):
+            part = {
+                "model": model,
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "message": {"role": "assistant", "content": text},
+                "done": done,
+            }
+            part.update(extra)
+            return part
+
+        def stats():
+            prompt_eval, decode = self.durations
+            return {
+                "done_reason": "stop",
+                "total_duration": int((prompt_eval + decode) * 1e9),
+                "load_duration": 0,
+                # like Ollama, only the tokens that were not in the prompt cache
+                "prompt_eval_count": prompt_tokens - self.cached_tokens,
+                "prompt_eval_duration": int(prompt_eval * 1e9),
+                "eval_count": len(split_tokens(content)),
+                "eval_duration": int(decode * 1e9),
+            }
+
+        if not body.get("stream", True):
+            text = "".join(self.generate(prompt_tokens, content))
+            self.send_json(200, message(text, done=True, **stats()))
+            return
+
+        self.start_chunked("application/x-ndjson")
+        try:
+            for token in self.generate(prompt_tokens, content):
+                self.write_chunk((json.dumps(message(token)) + "\n").encode())
+        except RuntimeError as e:
+            self.write_chunk((json.dumps({"error": str(e)}) + "\n").encode())
+            self.end_chunked()
+            return
+        self.write_chunk((json.dumps(message("", done=True, **stats())) + "\n").encode())
+        self.end_chunked()
+
+
+def start_server(host: str = "127.0.0.1", port: int = 0, **config):
+    """
+    Start a mock server in a background thread
+
+    Returns:
+        The running MockLLMServer; use server.base_url as OLLAMA_URL and server.shutdown() to stop it
+    """
+    server = MockLLMServer((host, port), **config)
+    threading.Thread(target=server.serve_forever, name="mock-llm-server", daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local OpenAI/Ollama-compatible mock LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--script", help="JSON file with scripted coder/evaluator responses")
+    parser.add_argument("--recorded", help="LLM response cache database to replay recorded responses from")
+    parser.add_argument("--ttft", type=float, default=0.2, help="time to first token in seconds")
+    parser.add_argument("--tokens-per-sec", type=float, default=50.0, help="decode speed (0: no delay)")
+    parser.add_argument("--prefill-tokens-per-sec", type=float, default=0.0, help="prompt processing speed (0: no delay)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="probability of an HTTP 500")
+    parser.add_argument("--stream-error-rate", type=float, default=0.0, help="probability of failing mid-stream")
+    parser.add_argument("--max-parallel", type=int, default=0, help="requests generated at once (0: unlimited)")
+    parser.add_argument("--prompt-cache", action="store_true", help="emulate the server's prompt cache (prefill only uncached tokens)")
+    parser.add_argument("--shuffle", action="store_true", help="serve scripted responses in random order")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    script = None
+    if args.script:
+        script = load_script(args.script)
+    elif args.recorded:
+        script = load_recorded(args.recorded)
+
+    server = MockLLMServer(
+        (args.host, args.port),
+        script=script,
+        ttft=args.ttft,
+        tokens_per_sec=args.tokens_per_sec,
+        prefill_tokens_per_sec=args.prefill_tokens_per_sec,
+        error_rate=args.error_rate,
+        stream_error_rate=args.stream_error_rate,
+        max_parallel=args.max_parallel,
+        prompt_cache=args.prompt_cache,
+        shuffle=args.shuffle,
+        seed=args.seed,
+    )
+    print(f"mock LLM server listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
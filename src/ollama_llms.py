@@ -1,56 +1,97 @@
-from pydantic import BaseModel
-from ollama import Client
-from dotenv import load_dotenv
-import os
+from src.code_check import precheck_code
+from src.generation_stats import GenerationStats
+from src.history import compact_messages, count_message_tokens
+from src.llm_cache import cached_response
+# settings are read at call time (llm_client.X), so scripts can override them
+import src.llm_client as llm_client
+from src.llm_client import get_async_ollama_client, get_ollama_options
+from src.llm_scheduler import get_scheduler, run_sync
+from src.output_formats import CODER_OUTPUT_FORMAT, EVALUATOR_OUTPUT_FORMAT
+from src.stream_parser import parse_stream
+from src.tracing import span
+
+
+async def async_get_coder_response(model_name: str, message: list, history: bool = False, temperature: float = 0.0, scheduler=None, return_stats: bool = False):
+    scheduler = scheduler or get_scheduler()
+
+    # older attempts are summarized so the prompt stays within the model's context budget
+    with span("prompt", stage="compact"):
+        context = compact_messages(message, model_name, include_replies=False)
+    stats = GenerationStats(model_name, "coder", count_message_tokens(context))
+
+    async def deltas(response, stats):
+        async for part in response:
+            content = part['message']['content']
+            print(content, end='', flush=True)
+            # the last message carries the server's token counts and timings
+            stats.record_ollama(part)
+            yield content
+
+    async def generate():
+        with span("llm.request") as request:
+            try:
+                async with scheduler.slot() as queued:
+                    stats.start(queued)
+                    client = get_async_ollama_client()
+                    response = await client.chat(model=model_name, messages=context, stream=True, format=CODER_OUTPUT_FORMAT.model_json_schema(), options=get_ollama_options(temperature=temperature, stop=["\n\n\n\n"]), keep_alive=llm_client.LLM_KEEP_ALIVE or None)
+                    return await parse_stream(stats.observe(deltas(response, stats)), CODER_OUTPUT_FORMAT, on_field=precheck_code)
+            finally:
+                request.set(**stats.get_span_attributes())
 
-# load .env
-load_dotenv()
-
-
-OLLAMA_URL = os.getenv("OLLAMA_URL")
-
-
-class CODER_OUTPUT_FORMAT(BaseModel):
-    thought: str
-    code: str
-
-class EVALUATOR_OUTPUT_FORMAT(BaseModel):
-    thought: str
-    retry: bool
-    comment: str
-
-def get_coder_response(model_name: str, message: list, history: bool = False):
     print("====================coder response====================")
-    client = Client(host=OLLAMA_URL)
-    response = client.chat(model=model_name, messages=message, stream=True, format=CODER_OUTPUT_FORMAT.model_json_schema(), options={"stop": ["\n\n\n\n"]})
-    full_response = ""
-
-    for part in response:
-        content = part['message']['content']
-        print(content, end='', flush=True)
-        full_response += content
-
-    full_response = full_response.choices[0].message.content
+    with span("llm.coder", temperature=temperature) as call:
+        full_response = await cached_response(model_name, context, temperature, CODER_OUTPUT_FORMAT, generate)
+        call.set(cached=stats.cached)
     if history:
-        message.append({"role": "assistant", "content": full_response})
-
-    return full_response, history
+        message.append({"role": "assistant", "content": full_response["code"]})
+
+    if return_stats:
+        return full_response, message, stats
+    return full_response, message
+
+
+async def async_get_evaluator_response(model_name: str, message: list, history: bool = False, temperature: float = 0.0, scheduler=None, return_stats: bool = False):
+    scheduler = scheduler or get_scheduler()
+
+    # older attempts are summarized so the prompt stays within the model's context budget
+    with span("prompt", stage="compact"):
+        context = compact_messages(message, model_name, include_replies=True)
+    stats = GenerationStats(model_name, "evaluator", count_message_tokens(context))
+
+    async def deltas(response, stats):
+        async for part in response:
+            content = part['message']['content']
+            print(content, end='', flush=True)
+            # the last message carries the server's token counts and timings
+            stats.record_ollama(part)
+            yield content
+
+    async def generate():
+        with span("llm.request") as request:
+            try:
+                async with scheduler.slot() as queued:
+                    stats.start(queued)
+                    client = get_async_ollama_client()
+                    response = await client.chat(model=model_name, messages=context, stream=True, format=EVALUATOR_OUTPUT_FORMAT.model_json_schema(), options=get_ollama_options(temperature=temperature, stop=["\n\n\n\n"]), keep_alive=llm_client.LLM_KEEP_ALIVE or None)
+                    return await parse_stream(stats.observe(deltas(response, stats)), EVALUATOR_OUTPUT_FORMAT)
+            finally:
+                request.set(**stats.get_span_attributes())
 
-
-def get_evaluator_response(model_name: str, message: list, history: bool = False):
     print("====================evaluator response====================")
-    client = Client(host=OLLAMA_URL)
-    response = client.chat(model=model_name, messages=message, stream=True, format=EVALUATOR_OUTPUT_FORMAT.model_json_schema(), options={"stop": ["\n\n\n\n"]})
-    full_response = ""
-    for part in response:
-        content = part['message']['content']
-        print(content, end='', flush=True)
-        full_response += content
+    with span("llm.evaluator", temperature=temperature) as call:
+        full_response = await cached_response(model_name, context, temperature, EVALUATOR_OUTPUT_FORMAT, generate)
+        call.set(cached=stats.cached)
+    if history:
+        message.append({"role": "assistant", "content": full_response["comment"]})
+
+    if return_stats:
+        return full_response, message, stats
+    return full_response, message
 
-    full_response = full_response.choices[0].message.content
-    if history is not None:
-        history.append({"role": "assistant", "content": full_response})
 
-    return full_response, history
+def get_coder_response(model_name: str, message: list, history: bool = False, temperature: float = 0.0, return_stats: bool = False):
+    return run_sync(async_get_coder_response(model_name, message, history=history, temperature=temperature, return_stats=return_stats))
 
 
+def get_evaluator_response(model_name: str, message: list, history: bool = False, temperature: float = 0.0, return_stats: bool = False):
+    return run_sync(async_get_evaluator_response(model_name, message, history=history, temperature=temperature, return_stats=return_stats))
@@ -1,74 +1,121 @@
-import json
-from pydantic import BaseModel
-from openai import OpenAI
-from dotenv import load_dotenv
-import os
+from src.code_check import precheck_code
+from src.generation_stats import GenerationStats
+from src.history import compact_messages, count_message_tokens
+from src.llm_cache import cached_response
+# settings are read at call time (llm_client.X), so scripts can override them
+import src.llm_client as llm_client
+from src.llm_client import astream_chat_completion, get_async_openai_client, get_openai_extra_body, json_schema_format
+from src.llm_scheduler import get_scheduler, run_sync
+from src.output_formats import CODER_OUTPUT_FORMAT, EVALUATOR_OUTPUT_FORMAT
+from src.stream_parser import parse_stream
+from src.tracing import span
 
-# load .env
-load_dotenv()
 
+async def async_get_coder_response(model_name: str, message: str, history: bool = False, temperature: float = 0.0, scheduler=None, return_stats: bool = False):
+    scheduler = scheduler or get_scheduler()
 
-OLLAMA_URL = os.getenv("OLLAMA_URL")
+    # older attempts are summarized so the prompt stays within the model's context budget
+    with span("prompt", stage="compact"):
+        context = compact_messages(message, model_name, include_replies=False)
+    stats = GenerationStats(model_name, "coder", count_message_tokens(context))
 
+    async def deltas(client, stats):
+        async for chunk in astream_chat_completion(
+            client,
+            model=model_name,
+            messages=context,
+            response_format=json_schema_format(CODER_OUTPUT_FORMAT),
+            temperature=temperature,
+            max_tokens=llm_client.LLM_NUM_PREDICT or None,
+            extra_body=get_openai_extra_body(),
+            stream_options={"include_usage": True},
+        ):
+            # the last chunk carries the token counts, without choices
+            if chunk.usage is not None:
+                stats.record_usage(chunk.usage)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                print(delta, end='', flush=True)
+                yield delta
+            if chunk.choices[0].finish_reason is not None:
+                print("DONE")
 
-class CODER_OUTPUT_FORMAT(BaseModel):
-    thought: str
-    code: str
-
-class EVALUATOR_OUTPUT_FORMAT(BaseModel):
-    thought: str
-    retry: bool
-    comment: str
+    async def generate():
+        with span("llm.request") as request:
+            try:
+                async with scheduler.slot() as queued:
+                    stats.start(queued)
+                    return await parse_stream(stats.observe(deltas(get_async_openai_client(), stats)), CODER_OUTPUT_FORMAT, on_field=precheck_code)
+            finally:
+                request.set(**stats.get_span_attributes())
 
-def get_coder_response(model_name: str, message: str, history: bool = False, temperature: float = 0.0):
     print("====================coder response====================")
-    client = OpenAI(base_url=OLLAMA_URL + "/v1", api_key='ollama')
-    with client.beta.chat.completions.stream(
-        model=model_name,
-        messages=message,
-        response_format=CODER_OUTPUT_FORMAT,
-        temperature=temperature,
-        max_tokens=4000,
-    ) as stream:
-        for event in stream:
-            # print(event.content)
-            if event.type == "content.delta":
-                if event.parsed is not None:
-                    # Print the parsed data as JSON
-                    print(event.delta, end='', flush=True)
-            elif event.type == "content.done":
+    with span("llm.coder", temperature=temperature) as call:
+        final_completion = await cached_response(model_name, context, temperature, CODER_OUTPUT_FORMAT, generate)
+        call.set(cached=stats.cached)
+    if history:
+        message.append({"role": "assistant", "content": final_completion["code"]})
+    if return_stats:
+        return final_completion, message, stats
+    return final_completion, message
+
+
+async def async_get_evaluator_response(model_name: str, message: str, history: bool = False, temperature: float = 0.0, scheduler=None, return_stats: bool = False):
+    scheduler = scheduler or get_scheduler()
+
+    # older attempts are summarized so the prompt stays within the model's context budget
+    with span("prompt", stage="compact"):
+        context = compact_messages(message, model_name, include_replies=True)
+    stats = GenerationStats(model_name, "evaluator", count_message_tokens(context))
+
+    async def deltas(client, stats):
+        async for chunk in astream_chat_completion(
+            client,
+            model=model_name,
+            messages=context,
+            response_format=json_schema_format(EVALUATOR_OUTPUT_FORMAT),
+            temperature=temperature,
+            max_tokens=llm_client.LLM_NUM_PREDICT or None,
+            extra_body=get_openai_extra_body(),
+            stream_options={"include_usage": True},
+        ):
+            # the last chunk carries the token counts, without choices
+            if chunk.usage is not None:
+                stats.record_usage(chunk.usage)
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                print(delta, end='', flush=True)
+                yield delta
+            if chunk.choices[0].finish_reason is not None:
                 print("DONE")
-            elif event.type == "error":
-                print("Error in stream:", event.error)
-        final_completion = stream.get_final_completion().choices[0].message.content
-        final_completion = json.loads(final_completion)
-        if history:
-            message.append({"role": "assistant", "content": final_completion["code"]})
-        return final_completion, message
 
+    async def generate():
+        with span("llm.request") as request:
+            try:
+                async with scheduler.slot() as queued:
+                    stats.start(queued)
+                    return await parse_stream(stats.observe(deltas(get_async_openai_client(), stats)), EVALUATOR_OUTPUT_FORMAT)
+            finally:
+                request.set(**stats.get_span_attributes())
 
-def get_evaluator_response(model_name: str, message: str, history: bool = False, temperature: float = 0.0):
     print("====================evaluator response====================")
-    client = OpenAI(base_url=OLLAMA_URL + "/v1", api_key='ollama')
-    with client.beta.chat.completions.stream(
-        model=model_name,
-        messages=message,
-        response_format=EVALUATOR_OUTPUT_FORMAT,
-        temperature=temperature,
-        max_tokens=4000,
-    ) as stream:
-        for event in stream:
-            # print(event.content)
-            if event.type == "content.delta":
-                if event.parsed is not None:
-                    # Print the parsed data as JSON
-                    print(event.delta, end='', flush=True)
-            elif event.type == "content.done":
-                print("DONE")
-            elif event.type == "error":
-                print("Error in stream:", event.error)
-        final_completion = stream.get_final_completion().choices[0].message.content
-        final_completion = json.loads(final_completion)
-        if history:
-            message.append({"role": "assistant", "content": final_completion["comment"]})
-        return final_completion, message
+    with span("llm.evaluator", temperature=temperature) as call:
+        final_completion = await cached_response(model_name, context, temperature, EVALUATOR_OUTPUT_FORMAT, generate)
+        call.set(cached=stats.cached)
+    if history:
+        message.append({"role": "assistant", "content": final_completion["comment"]})
+    if return_stats:
+        return final_completion, message, stats
+    return final_completion, message
+
+
+def get_coder_response(model_name: str, message: str, history: bool = False, temperature: float = 0.0, return_stats: bool = False):
+    return run_sync(async_get_coder_response(model_name, message, history=history, temperature=temperature, return_stats=return_stats))
+
+
+def get_evaluator_response(model_name: str, message: str, history: bool = False, temperature: float = 0.0, return_stats: bool = False):
+    return run_sync(async_get_evaluator_response(model_name, message, history=history, temperature=temperature, return_stats=return_stats))
@@ -0,0 +1,16 @@
+"""
+Structured output formats of the coder and the evaluator.
+
+Both LLM backends request and parse the same schemas, so they also share cached responses.
+"""
+from pydantic import BaseModel
+
+
+class CODER_OUTPUT_FORMAT(BaseModel):
+    thought: str
+    code: str
+
+class EVALUATOR_OUTPUT_FORMAT(BaseModel):
+    thought: str
+    retry: bool
+    comment: str
@@ -0,0 +1,136 @@
+import os
+import sys
+import threading
+from collections import Counter
+
+# file name used by exec() for generated code
+CODE_FILENAME = "<string>"
+
+
+def short_path(path: str):
+    """
+    Shorten a source path to the part after site-packages (or the file name)
+    """
+    marker = "site-packages" + os.sep
+    if marker in path:
+        return path.split(marker, 1)[1]
+    return os.path.basename(path)
+
+
+class SamplingProfiler:
+    """
+    Low-overhead sampling profiler for the thread running generated code.
+
+    A background thread looks at the target thread's stack every `interval` seconds and counts
+    the innermost function (where the time is spent) and the innermost line of the generated
+    code (which statement is responsible).
+    """
+
+    def __init__(self, interval: float = 0.01, thread_id: int = None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.main_thread().ident
+        self.samples = 0
+        self.functions = Counter()
+        self.lines = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self._sample(frame)
+
+    def _sample(self, frame):
+        self.samples += 1
+        code = frame.f_code
+        self.functions[(code.co_name, short_path(code.co_filename), code.co_firstlineno)] += 1
+        while frame is not None:
+            if frame.f_code.co_filename == CODE_FILENAME:
+                self.lines[frame.f_lineno] += 1
+                break
+            frame = frame.f_back
+
+    def top_functions(self, n: int = 5):
+        return [
+            {"function": f"{name} ({path}:{lineno})", "samples": count, "share": round(count / self.samples, 3)}
+            for (name, path, lineno), count in self.functions.most_common(n)
+        ]
+
+    def top_lines(self, code: str, n: int = 3):
+        source = code.splitlines()
+        return [
+            {
+                "line": lineno,
+                "code": source[lineno - 1].strip() if 0 < lineno <= len(source) else "",
+                "samples": count,
+                "share": round(count / self.samples, 3),
+            }
+            for lineno, count in self.lines.most_common(n)
+        ]
+
+
+# upper bounds in seconds of the time buckets the evaluator sees
+TIME_BUCKETS = ((1, "under 1 s"), (10, "1-10 s"), (60, "10-60 s"), (300, "1-5 min"))
+# runs faster than this get no hot lines/functions: their samples are too few to be stable
+HOT_SPOT_MIN_SECONDS = 10
+# hot spot shares are rounded to this step
+SHARE_STEP = 0.1
+
+
+def format_seconds(seconds: float):
+    for bound, label in TIME_BUCKETS:
+        if seconds < bound:
+            return label
+    return f"over {TIME_BUCKETS[-1][0] // 60} min"
+
+
+def format_megabytes(mb: float):
+    """
+    Memory rounded to one significant figure ("about 300 MB")
+    """
+    if mb < 1:
+        return "under 1 MB"
+    return f"about {float(f'{mb:.1g}'):g} MB"
+
+
+def format_share(share: float):
+    return f"{round(share / SHARE_STEP) * SHARE_STEP:.0%}"
+
+
+def format_profile(profile):
+    """
+    Render an execution profile as a short text for the evaluator prompt
+
+    Times are bucketed, memory is rounded to one significant figure and hot spots are only listed for
+    slow runs, so the same code gives the same text on every run and the prompt stays cacheable
+    (see src/llm_cache.py).
+    """
+    if not profile:
+        return None
+    parts = [f"wall time {format_seconds(profile['wall_time'])}"]
+    if profile.get("cpu_time") is not None:
+        parts.append(f"CPU time {format_seconds(profile['cpu_time'])}")
+    if profile.get("peak_rss_mb") is not None:
+        parts.append(f"peak memory {format_megabytes(profile['peak_rss_mb'])}")
+    text = ", ".join(parts)
+    if profile.get("limit_exceeded"):
+        text += f". Killed: {profile['limit_exceeded']} limit exceeded"
+    if profile["wall_time"] < HOT_SPOT_MIN_SECONDS:
+        return text
+    hot_lines = profile.get("hot_lines") or []
+    if hot_lines:
+        text += ". Slowest lines: " + "; ".join(f"line {l['line']} `{l['code']}` ({format_share(l['share'])})" for l in hot_lines)
+    hot_functions = profile.get("hot_functions") or []
+    if hot_functions:
+        text += ". Hot functions: " + "; ".join(f"{f['function']} ({format_share(f['share'])})" for f in hot_functions)
+    return text
@@ -0,0 +1,273 @@
+"""
+Incremental parsing of streamed structured (JSON object) responses.
+
+The parser follows the stream character by character and reports every top-level field as soon
+as its value is complete, so work on one field (e.g. checking the code) can start while the model
+is still writing the others. Runaway generations are cut off, and output that is truncated or
+slightly malformed is repaired instead of thrown away.
+"""
+import json
+import os
+import re
+
+from dotenv import load_dotenv
+
+# load .env
+load_dotenv()
+
+
+# generations longer than this are aborted (about 4000 tokens)
+LLM_MAX_OUTPUT_CHARS = int(os.getenv("LLM_MAX_OUTPUT_CHARS", "16000"))
+# a tail that repeats one unit (up to a few whole lines) at least REPEAT_MIN_COUNT times over at least
+# REPEAT_MIN_CHARS is treated as a generation loop; separator comments, "=" * n literals and long
+# literal lists in real code stay well below that
+REPEAT_MIN_COUNT = 12
+REPEAT_MIN_CHARS = 1500
+REPEAT_MAX_UNIT = 200
+MAX_WHITESPACE_RUN = 200
+
+
+class IncrementalJSONParser:
+    """
+    Tracks the top-level fields of a JSON object while it is being streamed
+
+    feed() returns the (key, value) pairs completed by the new text.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.fields = {}
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._value_start = None
+        self._key = None
+        # at depth 1: key, colon, value, string, scalar, nested, after (a value), done (object closed)
+        self._state = "key"
+
+    def feed(self, delta: str):
+        self.text += delta
+        text = self.text
+        completed = []
+        for i in range(self._pos, len(text)):
+            char = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._state == "key":
+                        self._key = self._loads(text[self._string_start:i + 1])
+                        self._state = "colon"
+                    elif self._depth == 1 and self._state == "string":
+                        completed.append(self._complete(self._loads(text[self._string_start:i + 1])))
+                continue
+
+            if self._depth == 0:
+                if char == "{" and self._state == "key":
+                    self._depth = 1
+                continue
+            if char == '"':
+                self._in_string = True
+                self._string_start = i
+                if self._depth == 1 and self._state == "value":
+                    self._state = "string"
+            elif char in "{[":
+                if self._depth == 1 and self._state == "value":
+                    self._state = "nested"
+                    self._value_start = i
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 1 and self._state == "nested":
+                    completed.append(self._complete(self._loads(text[self._value_start:i + 1])))
+                elif self._depth == 0:
+                    if self._state == "scalar":
+                        completed.append(self._complete(self._loads(text[self._value_start:i].strip())))
+                    self._state = "done"
+            elif self._depth == 1:
+                if char == ":" and self._state == "colon":
+                    self._state = "value"
+                elif char == ",":
+                    if self._state == "scalar":
+                        completed.append(self._complete(self._loads(text[self._value_start:i].strip())))
+                    self._state = "key"
+                elif self._state == "value" and not char.isspace():
+                    # number, true, false or null
+                    self._state = "scalar"
+                    self._value_start = i
+        self._pos = len(text)
+        return [pair for pair in completed if pair is not None]
+
+    def _loads(self, token: str):
+        try:
+            # strict=False accepts raw newlines inside strings, which models often emit in code
+            return json.loads(token, strict=False)
+        except ValueError:
+            return token[1:-1] if token.startswith('"') else token
+
+    def _complete(self, value):
+        key = self._key
+        self._key = None
+        self._state = "after"
+        if key is None or key in self.fields:
+            return None
+        self.fields[key] = value
+        return key, value
+
+
+def is_runaway(text: str, max_chars: int = None):
+    """
+    True when a generation is too long or stuck repeating the same piece of text
+    """
+    if len(text) > (max_chars or LLM_MAX_OUTPUT_CHARS):
+        return True
+    if len(text) >= MAX_WHITESPACE_RUN and text[-MAX_WHITESPACE_RUN:].isspace():
+        return True
+    for unit in range(1, REPEAT_MAX_UNIT + 1):
+        span = max(unit * REPEAT_MIN_COUNT, REPEAT_MIN_CHARS)
+        if span > len(text):
+            break
+        # cheap reject before comparing the whole span
+        if text[-1] != text[-1 - unit]:
+            continue
+        tail = text[-span:]
+        # periodic with this unit: shifting the tail by one unit gives the same text
+        if tail[unit:] == tail[:-unit] and tail[-unit:].strip():
+            return True
+    return False
+
+
+class RepairedResponse(dict):
+    """
+    A response that only parsed after repair (aborted or malformed output); never cached
+
+    Args:
+        value: The repaired object
+        aborted: Whether the generation was cut off as runaway
+    """
+
+    def __init__(self, value: dict, aborted: bool):
+        super().__init__(value)
+        self.aborted = aborted
+
+
+def repair_json(text: str):
+    """
+    Parse a JSON object from truncated or slightly malformed model output
+
+    Strips text around the object (markdown fences, <think> blocks), then closes an unterminated
+    string and any open brackets, dropping a trailing comma or a dangling key.
+
+    Returns:
+        The parsed dict, or None if it cannot be repaired
+    """
+    text = re.sub(r"<think>.*?</think>", "", text, flags=re.DOTALL)
+    start = text.find("{")
+    if start < 0:
+        return None
+    text = text[start:]
+    try:
+        value = json.loads(text, strict=False)
+        return value if isinstance(value, dict) else None
+    except ValueError:
+        pass
+    try:
+        # valid object followed by extra text
+        value, _ = json.JSONDecoder(strict=False).raw_decode(text)
+        return value if isinstance(value, dict) else None
+    except ValueError:
+        pass
+
+    # walk the text to find open strings and brackets
+    stack = []
+    in_string = escape = False
+    for char in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif char == "\\":
+                escape = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]" and stack:
+            stack.pop()
+
+    repaired = text
+    if in_string:
+        repaired = repaired[:-1] if escape else repaired
+        repaired += '"'
+    candidates = [repaired]
+    # drop a dangling key ("key" or "key":) or a trailing comma before closing
+    stripped = re.sub(r',\s*"[^"]*"\s*:?\s*$', "", repaired)
+    stripped = re.sub(r"[,:]\s*$", "", stripped)
+    candidates.append(stripped)
+    for candidate in candidates:
+        closing = "".join(reversed(stack))
+        for fixed in (candidate + closing, re.sub(r",\s*([}\]])", r"\1", candidate + closing)):
+            try:
+                value = json.loads(fixed, strict=False)
+                if isinstance(value, dict):
+                    return value
+            except ValueError:
+                continue
+    return None
+
+
+async def parse_stream(deltas, output_format, on_field=None, max_chars: int = None):
+    """
+    Consume a stream of text deltas of a structured response and return the parsed object
+
+    Args:
+        deltas: Async iterator of text deltas
+        output_format: pydantic model of the expected object; a repaired response must still have all its fields
+        on_field: Optional callback(key, value) run as soon as a top-level field is complete
+        max_chars: Abort the generation past this length (default: LLM_MAX_OUTPUT_CHARS)
+
+    Returns:
+        The parsed dict; a RepairedResponse when it had to be repaired
+
+    Raises:
+        ValueError: when the output cannot be parsed or repaired, or lacks a field of output_format
+    """
+    parser = IncrementalJSONParser()
+    aborted = False
+    try:
+        async for delta in deltas:
+            for key, value in parser.feed(delta):
+                if on_field is not None:
+                    on_field(key, value)
+            if is_runaway(parser.text, max_chars):
+                aborted = True
+                break
+    finally:
+        if hasattr(deltas, "aclose"):
+            # closes the HTTP response, which stops the generation on the server
+            await deltas.aclose()
+
+    text = parser.text
+    if not aborted:
+        try:
+            return json.loads(text)
+        except ValueError:
+            pass
+    value = repair_json(text) or {}
+    # fields that were complete before the output went wrong are kept as they were streamed
+    value = {**value, **parser.fields}
+    fields = output_format.model_fields
+    if not value or not any(name in value for name in fields):
+        raise ValueError(f"Could not parse the model output ({len(text)} chars{', aborted' if aborted else ''}): {text[:200]!r}")
+    # required fields are never made up: a response without them is a failed generation
+    missing = [name for name in fields if name not in value]
+    if missing:
+        raise ValueError(f"Model output is missing {missing} ({len(text)} chars{', aborted' if aborted else ''})")
+    print(f"\n[repaired {'aborted' if aborted else 'malformed'} output]")
+    return RepairedResponse(value, aborted)
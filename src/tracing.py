@@ -0,0 +1,250 @@
+"""
+Stage-level tracing of the workflow.
+
+Every stage of a trial (prompt construction, LLM requests, static checks, executions, triage) runs
+inside a span that records its wall time and attributes such as the LLM queue time, time to first
+token, decode time and token counts (see src/generation_stats.py). Spans are tagged with the
+model, trial and retry index of the trial they belong to (tags set with trace_context/tag are
+inherited through contextvars, so they follow asyncio tasks and asyncio.to_thread) and appended
+to TRACE_PATH as they end, one JSON line each, in this module's format or as OTLP JSON
+(TRACE_FORMAT=otlp, the OpenTelemetry file exporter format). trace_summary.py shows where the
+wall-clock time of each trial goes.
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+# load .env
+load_dotenv()
+
+
+# JSONL file the spans are appended to (empty: tracing off)
+TRACE_PATH = os.getenv("TRACE_PATH", "")
+# jsonl: one span per line in this module's format, otlp: one OTLP ExportTraceServiceRequest per line
+TRACE_FORMAT = os.getenv("TRACE_FORMAT", "jsonl")
+
+TRACE_FORMATS = ("jsonl", "otlp")
+SERVICE_NAME = "llm-visualization-workflow"
+
+_tags = contextvars.ContextVar("trace_tags", default={})
+_current = contextvars.ContextVar("trace_span", default=None)
+_collector = contextvars.ContextVar("trace_collector", default=None)
+_write_lock = threading.Lock()
+
+
+def new_id(n_bytes: int):
+    return os.urandom(n_bytes).hex()
+
+
+class Span:
+    """
+    One timed stage; attributes can be added while it runs with set()
+    """
+
+    def __init__(self, name: str, parent=None, attributes: dict = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else new_id(16)
+        self.span_id = new_id(8)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = {**_tags.get(), **(attributes or {})}
+        self.start = time.time()
+        self._start = time.perf_counter()
+        self.duration = None
+        self.error = None
+        self._collector = _collector.get()
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def end(self, error: BaseException = None):
+        self.duration = time.perf_counter() - self._start
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        if self._collector is not None:
+            self._collector.append(self.to_dict())
+        export(self)
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "duration": self.duration,
+            "status": "error" if self.error else "ok",
+            "error": self.error,
+            "attributes": self.attributes,
+        }
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Time the body as a child of the current span (or as the root of a new trace)
+
+    Yields:
+        The Span, to add attributes with span.set(...)
+    """
+    current = Span(name, _current.get(), attributes)
+    token = _current.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.end(e)
+        raise
+    else:
+        current.end()
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def trace_context(**tags):
+    """
+    Tag every span started in the body (model, trial, retry, ...)
+    """
+    token = _tags.set({**_tags.get(), **tags})
+    try:
+        yield
+    finally:
+        _tags.reset(token)
+
+
+@contextmanager
+def collect_spans():
+    """
+    Collect the records of the spans started in the body as they end, whether or not tracing writes a file
+
+    Yields:
+        The list the span records are appended to
+    """
+    records = []
+    token = _collector.set(records)
+    try:
+        yield records
+    finally:
+        _collector.reset(token)
+
+
+def tag(**tags):
+    """
+    Add tags for the rest of the current trace_context (e.g. the retry index in a loop)
+    """
+    _tags.set({**_tags.get(), **tags})
+
+
+def current_span():
+    return _current.get()
+
+
+def to_otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    if isinstance(value, (list, tuple)):
+        return {"arrayValue": {"values": [to_otlp_value(v) for v in value]}}
+    return {"stringValue": str(value)}
+
+
+def from_otlp_value(value):
+    if "intValue" in value:
+        return int(value["intValue"])
+    if "arrayValue" in value:
+        return [from_otlp_value(v) for v in value["arrayValue"].get("values", [])]
+    for key in ("boolValue", "doubleValue", "stringValue"):
+        if key in value:
+            return value[key]
+    return None
+
+
+def to_otlp(record: dict):
+    """
+    OTLP JSON (ExportTraceServiceRequest) of one span record
+    """
+    start_ns = int(record["start"] * 1e9)
+    otlp_span = {
+        "traceId": record["trace_id"],
+        "spanId": record["span_id"],
+        "name": record["name"],
+        "kind": 1,
+        "startTimeUnixNano": str(start_ns),
+        "endTimeUnixNano": str(start_ns + int(record["duration"] * 1e9)),
+        "attributes": [{"key": key, "value": to_otlp_value(value)} for key, value in record["attributes"].items() if value is not None],
+        # STATUS_CODE_OK / STATUS_CODE_ERROR
+        "status": {"code": 2, "message": record["error"]} if record["error"] else {"code": 1},
+    }
+    if record["parent_id"]:
+        otlp_span["parentSpanId"] = record["parent_id"]
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [
+                {"key": "service.name", "value": {"stringValue": SERVICE_NAME}},
+                {"key": "process.pid", "value": {"intValue": str(os.getpid())}},
+            ]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": [otlp_span]}],
+        }]
+    }
+
+
+def from_otlp(request: dict):
+    """
+    Span records of an OTLP JSON ExportTraceServiceRequest
+    """
+    records = []
+    for resource_spans in request.get("resourceSpans", []):
+        for scope_spans in resource_spans.get("scopeSpans", []):
+            for otlp_span in scope_spans.get("spans", []):
+                start_ns = int(otlp_span["startTimeUnixNano"])
+                status = otlp_span.get("status", {})
+                records.append({
+                    "trace_id": otlp_span["traceId"],
+                    "span_id": otlp_span["spanId"],
+                    "parent_id": otlp_span.get("parentSpanId") or None,
+                    "name": otlp_span["name"],
+                    "start": start_ns / 1e9,
+                    "duration": (int(otlp_span["endTimeUnixNano"]) - start_ns) / 1e9,
+                    "status": "error" if status.get("code") == 2 else "ok",
+                    "error": status.get("message"),
+                    "attributes": {a["key"]: from_otlp_value(a["value"]) for a in otlp_span.get("attributes", [])},
+                })
+    return records
+
+
+def export(current: Span, path: str = None, trace_format: str = None):
+    """
+    Append a finished span to the trace file (nothing when tracing is off)
+    """
+    path = path or TRACE_PATH
+    if not path:
+        return
+    trace_format = trace_format or TRACE_FORMAT
+    if trace_format not in TRACE_FORMATS:
+        raise ValueError(f"Unknown trace format: {trace_format} (expected one of {TRACE_FORMATS})")
+    record = current.to_dict()
+    line = json.dumps(to_otlp(record) if trace_format == "otlp" else record, ensure_ascii=False, default=str) + "\n"
+    # one write per line: lines of concurrent benchmark worker processes do not interleave
+    with _write_lock, open(path, "a", encoding="utf-8") as f:
+        f.write(line)
+
+
+def read_spans(path: str):
+    """
+    Span records of a trace file in either format
+    """
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            records.extend(from_otlp(data) if "resourceSpans" in data else [data])
+    return records
@@ -1,16 +1,39 @@
+import json
 import re
 from src.data_handler import get_data_summary
+from src.profiler import format_profile
+
+def serialize(value):
+    """
+    Deterministic compact JSON, so identical content always renders to identical prompt bytes
+    """
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"), default=str)
 
 def init_prompt(data, user_prompt, current_code=None):
     """
     Generate the system and user prompts for the LLM
 
+    Everything static (rules, dataset descriptions, task constraints) is in the first message and
+    the per-request material in the second, so every call of a trial, coder and evaluator alike,
+    starts with the same bytes and the server can reuse its prompt cache for that prefix.
+
     Args:
         data: List of data entries with file paths and descriptions
         user_prompt: User's visualization request
         current_code: Optional current visualization code for context
     """
-
+    datasets = [
+        {
+            "file_path": d["file_path"],
+            "description": d["data_description"],
+            "info": (
+            "Only the first 5 rows/columns are shown. "
+            "The full dataset may be larger. "
+            "Assume the shape is known and complete."
+            ),
+        }
+        for d in data
+    ]
     messages = [
         {
         "role": "system",
@@ -29,25 +52,8 @@ def init_prompt(data, user_prompt, current_code=None):
         8. For sns.clustermap, do not use plt.figure().
         9. Use relative file paths if loading any data.
         10. Make sure your code is minimal, readable, and logically structured.
-        """
-        },
-        {
-        "role": "user",
-        "content": str({
-            "datasets": [
-            {
-                "file_path": d["file_path"],
-                "description": d["data_description"],
-                "info": (
-                "Only the first 5 rows/columns are shown. "
-                "The full dataset may be larger. "
-                "Assume the shape is known and complete."
-                ),
-            }
-            for d in data
-            ],
-            "request": user_prompt,
-            "current_code": current_code,
+        """ + serialize({
+            "datasets": datasets,
             "task_goal": "Create a protein-level clustermap visualization from high-variance genes, colored by sample cluster, and print gene lists per cluster.",
             "constraints": [
             "Use only matplotlib/seaborn/installed libraries.",
@@ -57,6 +63,13 @@ def init_prompt(data, user_prompt, current_code=None):
             "Output must be a variable (e.g., g = sns.clustermap(...)).",
             "Don't include st.pyplot() or plt.show()."
             ],
+        })
+        },
+        {
+        "role": "user",
+        "content": serialize({
+            "request": user_prompt,
+            "current_code": current_code,
             "instruction": (
             "1. Reflect on a few different ways to approach the problem.\n"
             "2. Choose 1-2 promising strategies based on the request and data.\n"
@@ -67,6 +80,12 @@ def init_prompt(data, user_prompt, current_code=None):
     ]
     return messages
 
+def build_messages(prompt, role_messages):
+    """
+    Conversation start for one role: the shared static prompt, the role's own system prompt, then the request
+    """
+    return prompt[:1] + role_messages + prompt[1:]
+
 def get_coder_init_prompt(data_path):
     messages = [
     {
@@ -127,6 +146,7 @@ def get_evaluator_init_prompt():
         - If output is empty or incorrect, suggest specific directions for correction.
         - Only return retry=False if everything is working correctly.
         - If the code executes but doesn't meet the user's requirements, still set retry=True.
+        - If resource_usage shows the code was slow, used a lot of memory or was killed at a limit, point to the slowest lines and suggest how to make them cheaper.
 
         Never generate new code. Just give feedback and decision.
             output format:
@@ -154,14 +174,21 @@ def get_coder_prompt(current_code, error, comment):
     ]
     return messages
 
-def get_evaluator_prompt(current_code, error):
+def get_evaluator_prompt(current_code, error, profile=None):
+    """
+    Args:
+        profile: Optional execution profile (see src/profiler.py) reported as resource usage
+    """
+    content = {
+        "code": current_code,
+        "error": error,
+    }
+    if profile:
+        content["resource_usage"] = format_profile(profile)
     messages = [
         {
         "role": "user",
-        "content": str({
-            "code": current_code,
-            "error": error,
-            })
+        "content": str(content)
         }
     ]
     return messages
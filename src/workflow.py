@@ -0,0 +1,373 @@
+import asyncio
+import os
+import threading
+
+from dotenv import load_dotenv
+
+from src.code_check import STATIC_CHECK_COMMENT, check_code
+from src.dataset_registry import get_dataset_columns, register_dataset
+from src.error_triage import classify_error
+from src.exec_memo import get_code_key, memoized_run
+from src.exec_pool import get_exec_pool
+from src.history import get_error_line
+from src.llm_scheduler import LLMScheduler, run_sync
+from src.llm_backend import async_get_coder_response, async_get_evaluator_response
+from src.metrics import get_trial_metrics
+from src.tracing import collect_spans, new_id, span, tag, trace_context
+from src.utils import init_prompt, build_messages, get_coder_prompt, postprocess_code, get_evaluator_prompt, get_coder_init_prompt, get_evaluator_init_prompt
+
+# load .env
+load_dotenv()
+
+
+# speculative mode: coder candidates sampled per round, how many run at once (0: all) and the
+# temperature range they are spread over, starting at the coder temperature (override in .env)
+SPECULATIVE_CANDIDATES = int(os.getenv("SPECULATIVE_CANDIDATES", "4"))
+SPECULATIVE_CONCURRENCY = int(os.getenv("SPECULATIVE_CONCURRENCY", "0"))
+SPECULATIVE_TEMPERATURE_SPREAD = float(os.getenv("SPECULATIVE_TEMPERATURE_SPREAD", "0.6"))
+
+REPEAT_COMMENT = "This is the same code as attempt {attempt}, and it failed with the same error again. Do not return it again: change the approach."
+
+
+def run_code(code, datasets=None, cancel=None):
+    """
+    Check the generated code (see src/code_check.py) and execute it in a warm worker process,
+    unless the same code already ran on the same data (see src/exec_memo.py)
+
+    Args:
+        datasets: Dataset registry handles the code may read without parsing the file again
+        cancel: Optional threading.Event that stops the execution when set
+
+    Returns:
+        (success, stdout, profile, figures): stdout is "No error" on success, otherwise the warning or
+        traceback; profile is the execution profile, or None when the code was not run; figures are the
+        artifacts of the figures the code drew (see src/figure_export.py)
+    """
+    # usually already checked while the response was streaming
+    ok, message = check_code(code)
+    if not ok:
+        return False, message, None, []
+    with span("execute") as execution:
+        result = memoized_run(code, datasets, lambda: get_exec_pool().run(code, datasets=datasets, cancel=cancel))
+        execution.set(
+            success=result["success"], memoized=result.get("memoized", False),
+            resumed_statements=(result["profile"] or {}).get("resumed_statements"),
+            figures=len(result.get("figures", [])),
+        )
+    if not result["success"]:
+        return False, result["error"], result["profile"], []
+    return True, "No error", result["profile"], result.get("figures", [])
+
+
+async def prepare_trial(data_entry, user_input):
+    """
+    Register the datasets of a trial and build its first coder and evaluator messages
+
+    Returns:
+        (datasets, schema, coder_messages, evaluator_messages)
+    """
+    with span("datasets", n_datasets=len(data_entry)):
+        # parse every data file once; each execution maps the shared copy instead of reading the file again
+        datasets = [
+            await asyncio.to_thread(register_dataset, entry["file_path"])
+            for entry in data_entry
+            if os.path.exists(entry["file_path"])
+        ]
+        # column names the static check validates the code against
+        schema = {handle["path"]: set(get_dataset_columns(handle)) for handle in datasets}
+
+    with span("prompt", stage="init"):
+        # shared static prompt first, so coder and evaluator calls start with the same cached prefix
+        prompt = init_prompt(data_entry, user_input)
+        coder_messages = build_messages(prompt, get_coder_init_prompt(data_entry[0]["file_path"]))
+        evaluator_messages = build_messages(prompt, get_evaluator_init_prompt())
+    return datasets, schema, coder_messages, evaluator_messages
+
+
+async def async_run_trial(model_name, data_entry, user_input, coder_temperature=0.3, evaluator_temperature=0.5, max_retries=20, scheduler=None,
+                          n_candidates=1, candidate_concurrency=None, trial=None):
+    """
+    Run one coder -> exec -> evaluator retry loop
+
+    Args:
+        model_name: Model used for both coder and evaluator
+        data_entry: List of data entries with file paths and descriptions
+        user_input: User's visualization request
+        scheduler: LLMScheduler shared by concurrent trials (default: the loop's scheduler)
+        n_candidates: More than 1 runs the speculative mode (see async_run_speculative_trial)
+        candidate_concurrency: Candidates running at once in the speculative mode
+        trial: Trial id the trace spans are tagged with (default: a random id)
+
+    Returns:
+        dict with the final code, success flag, the number of retries, the number of errors answered by
+        triage instead of the evaluator, the number of repeated (same code, same error) attempts, the
+        execution profile of every attempt, the figure artifacts of the final code and the trial's
+        metrics record (see src/metrics.py)
+    """
+    with collect_spans() as records:
+        with trace_context(model=model_name, trial=trial if trial is not None else new_id(4)), span("trial", n_candidates=n_candidates) as trial_span:
+            if n_candidates > 1:
+                result = await async_run_speculative_trial(
+                    model_name, data_entry, user_input, n_candidates, candidate_concurrency, coder_temperature=coder_temperature,
+                    evaluator_temperature=evaluator_temperature, max_rounds=max_retries + 1, scheduler=scheduler,
+                )
+            else:
+                result = await async_run_sequential_trial(model_name, data_entry, user_input, coder_temperature, evaluator_temperature, max_retries, scheduler)
+            trial_span.set(success=result["success"], retries=result["retries"])
+    return {**result, "metrics": get_trial_metrics(result, records)}
+
+
+async def async_run_sequential_trial(model_name, data_entry, user_input, coder_temperature=0.3, evaluator_temperature=0.5, max_retries=20, scheduler=None):
+    """
+    Retry loop that generates one coder response per attempt (see async_run_trial)
+    """
+    tag(retry=0)
+    datasets, schema, coder_messages, evaluator_messages = await prepare_trial(data_entry, user_input)
+
+    try:
+        coder_response, coder_messages = await async_get_coder_response(model_name=model_name, message=coder_messages, history=True, temperature=coder_temperature, scheduler=scheduler)
+    except:
+        coder_response, coder_messages = {"code": "llm error"}, coder_messages
+
+    code = postprocess_code(coder_response["code"])
+    print("===================code====================")
+    print(code)
+    print("===========================================")
+    success = False
+    retry = False
+    n = 0
+    triaged = 0
+    repeats = 0
+    # (normalized code, error) -> attempt that produced it
+    seen = {}
+    profiles = []
+    figures = []
+
+    while True:
+        with span("check") as static_check:
+            checked, stdout = await asyncio.to_thread(check_code, code, schema)
+            static_check.set(ok=checked)
+        if checked:
+            success, stdout, profile, figures = await asyncio.to_thread(run_code, code, datasets)
+        else:
+            success, profile, figures = False, None, []
+        profiles.append(profile)
+        print(retry, n < max_retries, not success)
+        if not success:
+            print("===================error====================")
+            print(stdout)
+        else:
+            print("===================success====================")
+            print(stdout)
+        # tracebacks with a mechanical fix are answered by rule, without an evaluator generation
+        triage = await traced_triage(stdout, code, schema) if checked and not success else None
+        signature = (get_code_key(code), get_error_line(stdout)) if not success else None
+        if signature in seen:
+            # same code, same error: the model is going in circles, so say so instead of asking the evaluator again
+            comment = REPEAT_COMMENT.format(attempt=seen[signature])
+            hint = triage["comment"] if triage is not None else (None if checked else stdout)
+            evaluator_response = {"retry": True, "comment": comment + (f" {hint}" if hint else "")}
+            repeats += 1
+            print("===================repeated attempt====================")
+            print(evaluator_response["comment"])
+        elif triage is not None:
+            evaluator_response = {"retry": True, "comment": triage["comment"]}
+            triaged += 1
+            print(f"===================triage: {triage['error_class']}====================")
+            print(triage["comment"])
+        elif checked:
+            # get evaluator prompt
+            evaluator_messages += get_evaluator_prompt(code, stdout, profile)
+            # get evaluator response
+            try:
+                evaluator_response, evaluator_messages = await async_get_evaluator_response(model_name=model_name, message=evaluator_messages, history=True, temperature=evaluator_temperature, scheduler=scheduler)
+                retry = evaluator_response["retry"]
+            except:
+                evaluator_response, evaluator_messages = {"retry": False, "comment": "llm error"}, evaluator_messages
+        else:
+            # static check failures are exact: back to the coder without an evaluator round-trip
+            evaluator_response = {"retry": True, "comment": STATIC_CHECK_COMMENT}
+        if signature is not None:
+            seen.setdefault(signature, n + 1)
+        if (not success) and (n < max_retries and not success):
+            n += 1
+            tag(retry=n)
+            # get coder prompt
+            coder_messages += get_coder_prompt(code, stdout, evaluator_response["comment"])
+            # get coder response
+            try:
+                coder_response, coder_messages = await async_get_coder_response(model_name=model_name, message=coder_messages, history=True, temperature=coder_temperature, scheduler=scheduler)
+                code = postprocess_code(coder_response["code"])
+                print("===================code====================")
+                print(code)
+                print("===========================================")
+            except:
+                coder_response, coder_messages = {"code": "llm error"}, coder_messages
+        else:
+            break
+
+    return {
+        "model_name": model_name,
+        "code": code,
+        "success": success,
+        "retries": n,
+        "triaged": triaged,
+        "repeats": repeats,
+        "profiles": profiles,
+        "figures": figures,
+    }
+
+
+async def traced_triage(error, code, schema):
+    with span("triage") as triage_span:
+        triage = await asyncio.to_thread(classify_error, error, code, schema)
+        triage_span.set(error_class=triage["error_class"] if triage is not None else None)
+    return triage
+
+
+def get_candidate_temperatures(n: int, base: float, spread: float):
+    """
+    n sampling temperatures spread evenly from base to base + spread; the first candidate samples like the sequential loop
+    """
+    if n == 1:
+        return [base]
+    return [round(base + spread * i / (n - 1), 2) for i in range(n)]
+
+
+async def async_run_speculative_trial(model_name, data_entry, user_input, n_candidates=None, max_concurrency=None, coder_temperature=0.3,
+                                      temperature_spread=None, evaluator_temperature=0.5, max_rounds=5, scheduler=None):
+    """
+    Retry loop that samples several coder candidates per round instead of one
+
+    Every round generates n_candidates responses to the same history at different temperatures,
+    checks and executes each in its own sandbox as soon as it is complete, and has the evaluator
+    review the ones that run. The first candidate that runs and passes the review wins, and the
+    rest are cancelled (their streams closed, their executions killed). When no candidate
+    succeeds, the first failure to come back is fed to the coder like in the sequential loop.
+
+    Args:
+        n_candidates: Candidates per round (default: SPECULATIVE_CANDIDATES)
+        max_concurrency: Candidates generated/executed at once (default: SPECULATIVE_CONCURRENCY, or all)
+        temperature_spread: Candidates sample from coder_temperature to coder_temperature + spread
+        max_rounds: Rounds before giving up
+
+    Returns:
+        dict like async_run_trial, plus the number of candidates generated
+    """
+    datasets, schema, coder_messages, evaluator_messages = await prepare_trial(data_entry, user_input)
+    n_candidates = n_candidates or SPECULATIVE_CANDIDATES
+    temperatures = get_candidate_temperatures(n_candidates, coder_temperature, SPECULATIVE_TEMPERATURE_SPREAD if temperature_spread is None else temperature_spread)
+    limit = asyncio.Semaphore(max_concurrency or SPECULATIVE_CONCURRENCY or n_candidates)
+
+    async def run_candidate(candidate, temperature, cancel):
+        tag(candidate=candidate)
+        async with limit:
+            try:
+                coder_response, _ = await async_get_coder_response(model_name=model_name, message=coder_messages, temperature=temperature, scheduler=scheduler)
+                code = postprocess_code(coder_response["code"])
+            except Exception:
+                return {"code": "llm error", "llm_error": True, "checked": True, "success": False, "stdout": "llm error", "profile": None, "figures": [], "evaluation": None}
+            with span("check") as static_check:
+                checked, stdout = await asyncio.to_thread(check_code, code, schema)
+                static_check.set(ok=checked)
+            success, profile, figures, evaluation = False, None, [], None
+            if checked:
+                success, stdout, profile, figures = await asyncio.to_thread(run_code, code, datasets, cancel)
+            if success:
+                try:
+                    evaluation, _ = await async_get_evaluator_response(model_name=model_name, message=evaluator_messages + get_evaluator_prompt(code, stdout, profile), temperature=evaluator_temperature, scheduler=scheduler)
+                except Exception:
+                    evaluation = {"retry": False, "comment": "llm error"}
+            return {"code": code, "llm_error": False, "checked": checked, "success": success, "stdout": stdout, "profile": profile, "figures": figures, "evaluation": evaluation}
+
+    profiles = []
+    triaged = 0
+    generated = 0
+    result = None
+    for attempt in range(max_rounds):
+        cancel = threading.Event()
+        # the candidate tasks inherit the round's tags
+        tag(retry=attempt)
+        tasks = [asyncio.create_task(run_candidate(i, temperature, cancel)) for i, temperature in enumerate(temperatures)]
+        results = []
+        try:
+            for future in asyncio.as_completed(tasks):
+                try:
+                    candidate = await future
+                except Exception as e:
+                    candidate = {"code": "llm error", "llm_error": True, "checked": True, "success": False, "stdout": repr(e), "profile": None, "figures": [], "evaluation": None}
+                results.append(candidate)
+                profiles.append(candidate["profile"])
+                if candidate["success"] and not candidate["evaluation"]["retry"]:
+                    break
+        finally:
+            # the winner is known: stop the other generations and executions
+            cancel.set()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        generated += len(results)
+        print(f"===================round {attempt + 1}: {len(results)} of {n_candidates} candidates finished====================")
+
+        # a candidate that passed the review, else one that ran (the sequential loop stops there too)
+        result = next((c for c in results if c["success"] and not c["evaluation"]["retry"]), None) or next((c for c in results if c["success"]), None)
+        if result is not None or attempt == max_rounds - 1:
+            break
+
+        # no candidate ran: feed the first real failure (one that ran or failed the static check) back to
+        # the coder; when every generation failed, the next round samples again from the same prompt
+        failure = next((c for c in results if not c["llm_error"]), None)
+        if failure is None:
+            continue
+        if not failure["checked"]:
+            comment = STATIC_CHECK_COMMENT
+        else:
+            triage = await traced_triage(failure["stdout"], failure["code"], schema)
+            if triage is not None:
+                comment = triage["comment"]
+                triaged += 1
+            else:
+                evaluator_messages += get_evaluator_prompt(failure["code"], failure["stdout"], failure["profile"])
+                try:
+                    evaluation, evaluator_messages = await async_get_evaluator_response(model_name=model_name, message=evaluator_messages, history=True, temperature=evaluator_temperature, scheduler=scheduler)
+                    comment = evaluation["comment"]
+                except Exception:
+                    comment = "llm error"
+        coder_messages += [{"role": "assistant", "content": failure["code"]}] + get_coder_prompt(failure["code"], failure["stdout"], comment)
+
+    final = result or next((c for c in results if not c["llm_error"]), results[0])
+    return {
+        "model_name": model_name,
+        "code": final["code"],
+        "success": result is not None,
+        "retries": attempt,
+        "triaged": triaged,
+        "profiles": profiles,
+        "figures": final["figures"],
+        "candidates": generated,
+    }
+
+
+def run_trial(model_name, data_entry, user_input, coder_temperature=0.3, evaluator_temperature=0.5, max_retries=20, n_candidates=1, trial=None):
+    """
+    Sync wrapper around async_run_trial
+    """
+    return run_sync(async_run_trial(model_name, data_entry, user_input, coder_temperature, evaluator_temperature, max_retries, n_candidates=n_candidates, trial=trial))
+
+
+async def run_workflows(model_name, data_entry, user_inputs, max_concurrency=None, **kwargs):
+    """
+    Run several workflows on one event loop, sharing a single request scheduler
+
+    Args:
+        user_inputs: One visualization request per workflow run
+        max_concurrency: Maximum number of generations in flight (default: LLM_MAX_CONCURRENCY)
+
+    Returns:
+        list of trial results, in the order of user_inputs
+    """
+    scheduler = LLMScheduler(max_concurrency)
+    return await asyncio.gather(*[
+        async_run_trial(model_name, data_entry, user_input, scheduler=scheduler, trial=i, **kwargs)
+        for i, user_input in enumerate(user_inputs)
+    ])
@@ -0,0 +1,36 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# caches, checkpoints and figures of the tests go to a scratch directory instead of the repository;
+# set before src is imported, so the execution workers see the same settings
+SCRATCH = tempfile.mkdtemp(prefix="llm-vis-tests-")
+os.environ.update({
+    "DATASET_CACHE_DIR": os.path.join(SCRATCH, "dataset_cache"),
+    "CATALOG_PATH": os.path.join(SCRATCH, "dataset_cache", "catalog.json"),
+    "EXEC_CHECKPOINT_DIR": os.path.join(SCRATCH, "checkpoints"),
+    "EXEC_MEMO_PATH": os.path.join(SCRATCH, "exec_memo.sqlite"),
+    "FIGURE_DIR": os.path.join(SCRATCH, "figures"),
+    "LLM_CACHE_PATH": os.path.join(SCRATCH, "llm_cache.sqlite"),
+    "LLM_CACHE_MODE": "off",
+    "EXEC_POOL_SIZE": "1",
+})
+
+
+@pytest.fixture
+def csv_file(tmp_path):
+    """
+    Small expression-like table: samples as rows, genes as columns
+    """
+    import numpy as np
+    import pandas as pd
+
+    data = pd.DataFrame(np.random.default_rng(0).normal(size=(30, 6)), columns=[f"GENE{i}" for i in range(6)], index=[f"S{i}" for i in range(30)])
+    path = tmp_path / "expression.csv"
+    data.to_csv(path)
+    return str(path)
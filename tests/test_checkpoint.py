@@ -0,0 +1,71 @@
+import io
+from contextlib import redirect_stdout
+
+import matplotlib
+import pandas as pd
+import pytest
+
+from src import checkpoint
+from src.checkpoint import get_global_state, run_statements, set_global_state
+
+CODE = """
+import matplotlib.pyplot as plt
+import pandas as pd
+pd.set_option("display.max_columns", 3)
+plt.rcParams["lines.linewidth"] = 7
+x = 41
+print("prefix done")
+y = x + 1
+print(y)
+"""
+
+
+@pytest.fixture
+def checkpoints(tmp_path, monkeypatch):
+    """
+    Checkpoint every statement into a fresh directory, and undo the settings the code changes
+    """
+    monkeypatch.setattr(checkpoint, "EXEC_CHECKPOINT_DIR", str(tmp_path))
+    monkeypatch.setattr(checkpoint, "CHECKPOINT_MIN_SECONDS", 0)
+    state = get_global_state()
+    yield
+    set_global_state(state)
+
+
+def run(code):
+    scope, output, stats = {}, io.StringIO(), {}
+    with redirect_stdout(output):
+        run_statements(code, scope, output=output, stats=stats)
+    return scope, output.getvalue(), stats
+
+
+def test_rerun_resumes_with_namespace_output_and_settings(checkpoints):
+    default_columns, default_linewidth = pd.get_option("display.max_columns"), matplotlib.rcParams["lines.linewidth"]
+    first_scope, first_output, stats = run(CODE)
+    assert stats == {"statements": 8, "resumed": 0, "checkpoints": 7}
+
+    # another execution of the same worker in between
+    pd.set_option("display.max_columns", default_columns)
+    matplotlib.rcParams["lines.linewidth"] = default_linewidth
+
+    scope, output, stats = run(CODE)
+    assert stats["resumed"] == 7
+    assert output == first_output == "prefix done\n42\n"
+    assert scope["y"] == first_scope["y"] == 42
+    assert pd.get_option("display.max_columns") == 3
+    assert matplotlib.rcParams["lines.linewidth"] == 7
+
+
+def test_edited_tail_resumes_after_the_unchanged_prefix(checkpoints):
+    run(CODE)
+    scope, output, stats = run(CODE.replace("y = x + 1", "y = x - 1"))
+    assert stats["resumed"] == 6
+    assert output == "prefix done\n40\n"
+    assert scope["y"] == 40
+
+
+def test_edited_prefix_runs_from_the_start(checkpoints):
+    run(CODE)
+    scope, output, stats = run("z = 0\n" + CODE)
+    assert stats["resumed"] == 0
+    assert output == "prefix done\n42\n"
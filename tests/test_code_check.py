@@ -0,0 +1,46 @@
+from src.code_check import EMPTY_CODE_MESSAGE, check_code
+
+HEADER = "import pandas as pd\ndf = pd.read_csv('data.csv', index_col=0)\n"
+
+
+def check(body, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data.csv").write_text("sample,GENE1,GENE2\nS1,1,2\n")
+    schema = {str(tmp_path / "data.csv"): {"sample", "GENE1", "GENE2"}}
+    return check_code(HEADER + body, schema)
+
+
+def test_unknown_column_is_rejected(tmp_path, monkeypatch):
+    ok, message = check("print(df['GENE3'])\n", tmp_path, monkeypatch)
+    assert not ok and "KeyError: 'GENE3'" in message
+
+
+def test_created_column_is_accepted(tmp_path, monkeypatch):
+    assert check("df['total'] = df['GENE1'] + df['GENE2']\nprint(df['total'])\n", tmp_path, monkeypatch)[0]
+
+
+def test_insert_is_accepted(tmp_path, monkeypatch):
+    assert check("df.insert(0, 'cluster', 1)\nprint(df['cluster'])\n", tmp_path, monkeypatch)[0]
+
+
+def test_computed_column_name_is_accepted(tmp_path, monkeypatch):
+    body = "for i in range(2):\n    df[f'score{i}'] = i\nprint(df['score1'])\n"
+    assert check(body, tmp_path, monkeypatch)[0]
+
+
+def test_computed_loc_column_is_accepted(tmp_path, monkeypatch):
+    body = "name = 'flag'\ndf.loc[:, name] = True\nprint(df.loc[:, 'flag'])\n"
+    assert check(body, tmp_path, monkeypatch)[0]
+
+
+def test_assign_and_rename_stored_back_are_accepted(tmp_path, monkeypatch):
+    assert check("df = df.assign(ratio=df['GENE1'] / df['GENE2'])\nprint(df['ratio'])\n", tmp_path, monkeypatch)[0]
+    assert check("df = df.rename(columns={'GENE1': 'A'})\nprint(df['A'])\n", tmp_path, monkeypatch)[0]
+
+
+def test_mutating_helper_is_accepted(tmp_path, monkeypatch):
+    assert check("df.rename(columns={'GENE1': 'A'}, inplace=True)\nprint(df['A'])\n", tmp_path, monkeypatch)[0]
+
+
+def test_empty_code_is_rejected():
+    assert check_code("  \n") == (False, EMPTY_CODE_MESSAGE)
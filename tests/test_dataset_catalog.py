@@ -0,0 +1,43 @@
+import os
+import shutil
+
+import pandas as pd
+
+from src import dataset_catalog
+from src.dataset_catalog import get_data_entries
+
+
+def test_analyzed_files_are_sniffed_on_a_bounded_sample(csv_file, monkeypatch):
+    monkeypatch.setattr(dataset_catalog, "CATALOG_PROFILE_ROWS", 10)
+    reads = []
+    reader = pd.read_csv
+
+    def read_csv(*args, **kwargs):
+        reads.append(kwargs.get("nrows"))
+        return reader(*args, **kwargs)
+
+    monkeypatch.setattr(pd, "read_csv", read_csv)
+    (entry,) = get_data_entries([csv_file])
+
+    assert reads == [10]
+    assert entry["file_path"] == os.path.abspath(csv_file)
+    assert entry["data_description"]["stats_from_sampled_rows"] == 10
+    assert entry["data_description"]["rows_estimated_from_file_size"]
+
+    # unchanged file: described from the persistent index without reading it again
+    assert get_data_entries([csv_file]) == [entry]
+    assert reads == [10]
+
+
+def test_directory_scan_adds_the_other_files_once(csv_file, tmp_path, monkeypatch):
+    monkeypatch.setattr(dataset_catalog, "CATALOG_PROFILE_ROWS", 10)
+    other = str(tmp_path / "other.csv")
+    shutil.copy(csv_file, other)
+    (tmp_path / "notes.txt").write_text("not a dataset")
+
+    entries = get_data_entries([csv_file], directory=str(tmp_path))
+
+    assert [entry["file_path"] for entry in entries] == [os.path.abspath(csv_file), os.path.abspath(other)]
+    # the other file is sniffed from CATALOG_SNIFF_ROWS rows, more than it has
+    assert "stats_from_sampled_rows" in entries[0]["data_description"]
+    assert "stats_from_sampled_rows" not in entries[1]["data_description"]
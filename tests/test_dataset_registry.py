@@ -0,0 +1,38 @@
+import pandas as pd
+import pytest
+
+from src.dataset_registry import install_read_hooks, register_dataset
+
+
+@pytest.fixture
+def hooked(csv_file, monkeypatch):
+    """
+    Registered csv_file with the read hooks installed, and the real reader to compare against
+    """
+    reader = pd.read_csv
+    for name in ("read_csv", "read_table", "read_excel"):
+        # undone after the test
+        monkeypatch.setattr(pd, name, getattr(pd, name))
+    install_read_hooks([register_dataset(csv_file)])
+    assert pd.read_csv is not reader
+    return csv_file, reader
+
+
+@pytest.mark.parametrize("kwargs", [
+    {},
+    {"index_col": 0},
+    {"usecols": [3, 0, 1]},
+    {"usecols": [3, 0, 1], "index_col": 0},
+    {"usecols": ["GENE3", "GENE1"]},
+    {"usecols": lambda column: column.endswith(("1", "2"))},
+])
+def test_hook_returns_what_read_csv_returns(hooked, kwargs):
+    path, reader = hooked
+    pd.testing.assert_frame_equal(pd.read_csv(path, **kwargs), reader(path, **kwargs), check_dtype=False)
+
+
+@pytest.mark.parametrize("usecols", [["GENE9"], [0, 99]])
+def test_invalid_usecols_raise_like_read_csv(hooked, usecols):
+    path, _ = hooked
+    with pytest.raises(ValueError):
+        pd.read_csv(path, usecols=usecols)
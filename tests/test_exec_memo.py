@@ -0,0 +1,44 @@
+import os
+
+import src.exec_memo as exec_memo
+from src.exec_memo import memoized_run
+from src.metrics import get_trial_metrics
+
+
+def make_run(calls, figures=()):
+    def run():
+        calls.append(1)
+        return {
+            "success": True, "stdout": "ok", "error": None, "n_figures": len(figures), "figures": list(figures),
+            "duration": 2.0, "timed_out": False, "profile": {"wall_time": 2.0, "limit_exceeded": None},
+        }
+    return run
+
+
+def test_memo_is_off_by_default():
+    assert exec_memo.EXEC_MEMO_MODE == "off"
+    calls = []
+    memoized_run("print(1)", [], make_run(calls))
+    memoized_run("print(1)", [], make_run(calls))
+    assert len(calls) == 2
+
+
+def test_memoized_outcome_does_not_count_as_execution_time():
+    calls = []
+    first = memoized_run("print('memo')", [], make_run(calls), mode="on")
+    second = memoized_run("print('memo')  # same code", [], make_run(calls), mode="on")
+    assert len(calls) == 1
+    assert not first["memoized"] and second["memoized"] and second["profile"]["memoized"]
+    metrics = get_trial_metrics({"success": True, "retries": 1, "profiles": [first["profile"], second["profile"]]}, [])
+    assert metrics["execution_time"] == 2.0
+
+
+def test_outcome_with_missing_figure_files_runs_again(tmp_path):
+    png = tmp_path / "figure.png"
+    png.write_bytes(b"png")
+    figures = [{"figure": 0, "hash": "abc", "files": {"png": str(png)}}]
+    calls = []
+    memoized_run("print('figure')", [], make_run(calls, figures), mode="on")
+    os.remove(png)
+    result = memoized_run("print('figure')", [], make_run(calls, figures), mode="on")
+    assert len(calls) == 2 and not result["memoized"]
@@ -0,0 +1,52 @@
+import copy
+
+from src.history import SUMMARY_HEADER, compact_messages, count_message_tokens, parse_turn
+
+TRACEBACK = 'Traceback (most recent call last):\n  File "<string>", line 3, in <module>\nKeyError: \'{}\''
+
+
+def make_history(errors, code_lines: int = 5):
+    """
+    Coder history: system message, request, then one (code, error) turn per error
+    """
+    messages = [{"role": "system", "content": "You write Python code."}, {"role": "user", "content": "Plot a clustermap."}]
+    for attempt, error in enumerate(errors, 1):
+        code = "\n".join(f"value_{attempt}_{i} = {i}" for i in range(code_lines))
+        messages.append({"role": "assistant", "content": code})
+        messages.append({"role": "user", "content": str({"code": code, "error": TRACEBACK.format(error)})})
+    return messages
+
+
+def test_short_history_is_sent_as_is():
+    messages = make_history(["gene"])
+    assert compact_messages(messages, "model") == messages
+
+
+def test_older_attempts_collapse_into_one_summary():
+    messages = make_history(["gene", "gene", "sample", "cluster"])
+    original = copy.deepcopy(messages)
+
+    context = compact_messages(messages, "model")
+
+    assert messages == original
+    assert context[:2] == messages[:2]
+    assert context[-2:] == messages[-2:]
+    (summary,) = context[2:-2]
+    assert summary["content"].startswith(SUMMARY_HEADER)
+    assert "KeyError: 'gene' (attempt 1, 2)" in summary["content"]
+    assert "KeyError: 'sample' (attempt 3)" in summary["content"]
+    # the code of older attempts is dropped
+    assert "value_1_0" not in summary["content"]
+
+
+def test_over_budget_cuts_the_latest_error_but_not_its_code():
+    messages = make_history(["gene", "sample", "x" * 20000])
+    budget = 1500
+    assert count_message_tokens(messages[-2:]) > budget
+
+    context = compact_messages(messages, "model", budget=budget)
+
+    assert count_message_tokens(context) <= budget
+    latest = parse_turn(context[-1]["content"])
+    assert latest["code"] == parse_turn(messages[-1]["content"])["code"]
+    assert "...[truncated]..." in latest["error"]
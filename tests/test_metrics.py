@@ -0,0 +1,48 @@
+from src.metrics import aggregate_metrics, compare_to_baseline, format_regressions
+
+
+def make_records(model, retries_to_success, wall_time=10.0):
+    """
+    Trial metrics records: one per entry of retries_to_success, None for a failed trial
+    """
+    return [
+        {
+            "model": model,
+            "success": k is not None,
+            "retries": 2 if k is None else k,
+            "retries_to_success": k,
+            "wall_time": wall_time,
+            "llm_calls": 2,
+        }
+        for k in retries_to_success
+    ]
+
+
+def test_unchanged_run_has_no_regressions():
+    aggregates = aggregate_metrics(make_records("m", [0, 0, 1, None]))
+    assert compare_to_baseline(aggregates, aggregates) == []
+
+
+def test_increase_from_zero_is_a_regression():
+    baseline = aggregate_metrics(make_records("m", [0, 0, 0, 0]))
+    current = aggregate_metrics(make_records("m", [0, 0, 1, 1]))
+    assert baseline["m"]["retries_to_success"]["mean"] == 0
+
+    regressions = compare_to_baseline(current, baseline)
+
+    assert [r["metric"] for r in regressions] == ["success_curve[0]", "retries_to_success.mean"]
+    assert regressions[1]["change"] == float("inf")
+    assert "retries_to_success.mean: 0 -> 0.5 (change +inf" in format_regressions(regressions)
+
+
+def test_zero_to_zero_is_no_change():
+    aggregates = aggregate_metrics(make_records("m", [0, 0], wall_time=0.0))
+    assert compare_to_baseline(aggregates, aggregates) == []
+
+
+def test_growth_within_threshold_is_not_a_regression():
+    baseline = aggregate_metrics(make_records("m", [0, 0], wall_time=10.0))
+    assert compare_to_baseline(aggregate_metrics(make_records("m", [0, 0], wall_time=10.5)), baseline) == []
+    (regression,) = compare_to_baseline(aggregate_metrics(make_records("m", [0, 0], wall_time=12.0)), baseline)
+    assert regression["metric"] == "wall_time.p50"
+    assert regression["change"] == 0.2
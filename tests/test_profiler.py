@@ -0,0 +1,29 @@
+from src.profiler import format_profile
+
+
+def profile(wall_time, cpu_time, peak_rss_mb, share=0.5):
+    return {
+        "wall_time": wall_time,
+        "cpu_time": cpu_time,
+        "peak_rss_mb": peak_rss_mb,
+        "limit_exceeded": None,
+        "hot_lines": [{"line": 3, "code": "sns.clustermap(df)", "share": share}],
+        "hot_functions": [{"function": "linkage (scipy/cluster/hierarchy.py)", "share": share}],
+    }
+
+
+def test_run_to_run_noise_gives_the_same_text():
+    # the same fast snippet measured twice
+    assert format_profile(profile(0.41, 0.38, 212.5, 0.61)) == format_profile(profile(0.57, 0.52, 238.9, 0.44))
+    # the same slow snippet measured twice
+    assert format_profile(profile(23.4, 22.9, 1210.0, 0.71)) == format_profile(profile(31.0, 29.8, 1380.0, 0.68))
+
+
+def test_slow_runs_keep_their_hot_spots():
+    text = format_profile(profile(75.0, 70.0, 3000.0, 0.8))
+    assert "1-5 min" in text and "about 3000 MB" in text
+    assert "sns.clustermap(df)" in text and "80%" in text
+
+
+def test_limit_exceeded_is_reported():
+    assert "Killed: memory limit exceeded" in format_profile({**profile(2.0, 2.0, 900.0), "limit_exceeded": "memory"})
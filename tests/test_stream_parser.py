@@ -0,0 +1,94 @@
+import asyncio
+import json
+
+from pydantic import BaseModel
+
+import src.llm_cache as llm_cache
+from src.stream_parser import RepairedResponse, is_runaway, parse_stream
+
+
+class OUTPUT_FORMAT(BaseModel):
+    thought: str
+    code: str
+
+
+def stream_prefixes(code: str, step: int = 7):
+    """
+    Every prefix of the raw JSON stream of a response with this code, as parse_stream checks it
+    """
+    text = json.dumps({"thought": "plot it", "code": code})
+    return [text[:end] for end in range(step, len(text) + step, step)]
+
+
+def never_runaway(code: str):
+    return not any(is_runaway(prefix) for prefix in stream_prefixes(code))
+
+
+async def deltas(text: str, step: int = 5):
+    for i in range(0, len(text), step):
+        yield text[i:i + step]
+
+
+def test_separator_comments_are_not_runaway():
+    separator = "# " + "-" * 76
+    code = "\n".join([separator, "import pandas as pd", separator, "# " + "=" * 76, "df = pd.read_csv('data.csv')", separator])
+    assert never_runaway(code)
+
+
+def test_separator_literals_are_not_runaway():
+    code = 'print("' + "=" * 120 + '")\nprint("-" * 80)\nprint("' + "#" * 200 + '")\n'
+    assert never_runaway(code)
+
+
+def test_long_literal_lists_are_not_runaway():
+    assert never_runaway("weights = [" + ", ".join(["0"] * 300) + "]\n")
+    assert never_runaway("weights = [" + ", ".join(["1.0"] * 200) + "]\n")
+    assert never_runaway("mask = [" + ", ".join(["True"] * 150) + "]\n")
+
+
+def test_repeated_lines_are_runaway():
+    assert is_runaway(json.dumps({"thought": "", "code": "plt.show()\n" * 200})[:-2])
+    assert is_runaway('{"thought": "' + "and then " * 300)
+
+
+def test_whitespace_run_is_runaway():
+    assert is_runaway('{"thought": "x", "code": "import pandas' + " " * 300)
+
+
+def test_too_long_is_runaway():
+    assert is_runaway("x" * 20, max_chars=10)
+
+
+def test_parse_stream_keeps_valid_code_with_separators():
+    code = "# " + "-" * 76 + "\nx = [" + ", ".join(["0"] * 300) + "]\n"
+    response = asyncio.run(parse_stream(deltas(json.dumps({"thought": "t", "code": code})), OUTPUT_FORMAT))
+    assert response == {"thought": "t", "code": code}
+    assert not isinstance(response, RepairedResponse)
+
+
+def test_aborted_response_is_repaired_and_not_cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_cache, "LLM_CACHE_PATH", str(tmp_path / "cache.sqlite"))
+    text = '{"thought": "t", "code": "' + "plt.show()\\n" * 400
+    calls = []
+
+    async def generate():
+        calls.append(1)
+        return await parse_stream(deltas(text), OUTPUT_FORMAT)
+
+    async def request():
+        return await llm_cache.cached_response("mock", [{"role": "user", "content": "plot"}], 0.0, OUTPUT_FORMAT, generate, mode="on")
+
+    response = asyncio.run(request())
+    assert isinstance(response, RepairedResponse) and response.aborted
+    asyncio.run(request())
+    assert len(calls) == 2
+
+
+def test_repaired_response_without_a_required_field_is_rejected():
+    text = '{"thought": "' + "loop " * 2000
+    try:
+        asyncio.run(parse_stream(deltas(text), OUTPUT_FORMAT))
+    except ValueError as e:
+        assert "code" in str(e)
+    else:
+        raise AssertionError("a response without code was accepted")
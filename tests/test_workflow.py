@@ -0,0 +1,41 @@
+import contextlib
+import io
+
+import src.llm_client as llm_client
+from src.mock_server import start_server
+from src.workflow import run_trial
+
+GOOD_CODE = "import pandas as pd\nprint('columns', 6)\n"
+
+
+def run_mock_trial(script, data_entry, max_retries=3):
+    server = start_server(script=script, ttft=0, tokens_per_sec=0)
+    url = llm_client.OLLAMA_URL
+    llm_client.OLLAMA_URL = server.base_url
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            return run_trial("mock", data_entry, "print the number of columns", max_retries=max_retries)
+    finally:
+        llm_client.OLLAMA_URL = url
+        server.shutdown()
+
+
+def test_runaway_coder_output_is_retried_not_run_as_empty_code(csv_file):
+    script = {
+        "coder": [{"thought": "loop " * 2000, "code": GOOD_CODE}, {"thought": "print it", "code": GOOD_CODE}],
+        "evaluator": [{"thought": "fine", "retry": False, "comment": "ok"}],
+    }
+    result = run_mock_trial(script, [{"file_path": csv_file, "data_description": {}}])
+    assert result["success"]
+    assert result["retries"] == 1
+    assert result["code"].strip() == GOOD_CODE.strip()
+
+
+def test_empty_code_is_not_a_success(csv_file):
+    script = {
+        "coder": [{"thought": "nothing to do", "code": ""}],
+        "evaluator": [{"thought": "fine", "retry": False, "comment": "ok"}],
+    }
+    result = run_mock_trial(script, [{"file_path": csv_file, "data_description": {}}], max_retries=1)
+    assert not result["success"]
+    assert result["retries"] == 1
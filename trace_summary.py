@@ -0,0 +1,116 @@
+"""
+Where the wall-clock time of each trial goes, from a trace file written by src/tracing.py.
+
+Record a trace by setting TRACE_PATH (and optionally TRACE_FORMAT=otlp) for any workflow script:
+
+    TRACE_PATH=trace.jsonl python benchmark.py
+
+Every trial is broken down into its stages (datasets, prompt, llm.coder, llm.evaluator, check,
+execute, triage); the LLM line splits the generations into queue time, time to first token and
+decode time, and the generation lines show the TTFT and inter-token latency histograms and the
+prefill/decode speed the server reported. Stages of concurrent candidates overlap, so in the speculative mode their shares
+can add up to more than 100%.
+
+usage: python trace_summary.py trace.jsonl [--model gemma3:12b] [--per-trial]
+"""
+import argparse
+import statistics
+from collections import defaultdict
+
+from src.generation_stats import add_to_histogram, format_histogram, merge_histograms, new_histogram
+from src.metrics import get_children, summarize_trial
+from src.tracing import read_spans
+
+STAGES = ["datasets", "prompt", "llm.coder", "llm.evaluator", "check", "execute", "triage"]
+
+
+def format_stages(stages, other, wall):
+    parts = []
+    for name in STAGES + sorted(set(stages) - set(STAGES)):
+        if name in stages:
+            seconds = stages[name]["seconds"]
+            parts.append(f"{name} {seconds:.2f}s ({seconds / wall:.0%}, x{stages[name]['count']})" if wall else f"{name} {seconds:.2f}s")
+    parts.append(f"other {other:.2f}s")
+    return " | ".join(parts)
+
+
+def format_llm(llm):
+    ttft = f"{llm['ttft']:.2f}s" if llm["ttft"] is not None else "-"
+    speed = f"{llm['tokens_per_sec']:.1f} tok/s" if llm["tokens_per_sec"] else "-"
+    return (
+        f"{llm['calls']} calls ({llm['cached']} cached) | queue {llm['queue']:.2f}s | mean ttft {ttft} | decode {llm['decode']:.2f}s"
+        f" | {llm['prompt_tokens']} prompt / {llm['output_tokens']} output tokens | {speed}"
+    )
+
+
+def format_generation(requests):
+    """
+    Latency histograms and server-side speeds of llm.request span attributes
+    """
+    ttft = new_histogram()
+    for attributes in requests:
+        if attributes.get("ttft") is not None:
+            add_to_histogram(ttft, attributes["ttft"])
+    inter_token = merge_histograms(a.get("inter_token_histogram") for a in requests)
+
+    def speed(count, duration):
+        counts = sum(a.get(count) or 0 for a in requests if a.get(duration))
+        seconds = sum(a.get(duration) or 0 for a in requests)
+        return f"{counts / seconds:.1f} tok/s" if seconds else "-"
+
+    return (
+        f"    ttft: {format_histogram(ttft)}\n"
+        f"    inter-token: {format_histogram(inter_token)}\n"
+        f"    server: prefill {speed('prompt_eval_count', 'prompt_eval_duration')} | decode {speed('eval_count', 'eval_duration')}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("trace", help="trace file (TRACE_PATH) in jsonl or otlp format")
+    parser.add_argument("--model", help="only trials of this model")
+    parser.add_argument("--per-trial", action="store_true", help="also print the breakdown of every trial")
+    args = parser.parse_args()
+
+    spans = read_spans(args.trace)
+    children = get_children(spans)
+    trials = [r for r in spans if r["name"] == "trial" and (args.model is None or r["attributes"].get("model") == args.model)]
+    if not trials:
+        raise SystemExit(f"no trials in {args.trace}")
+
+    summaries = defaultdict(list)
+    for trial in sorted(trials, key=lambda r: r["start"]):
+        summary = summarize_trial(trial, children)
+        summaries[summary["model"]].append(summary)
+        if args.per_trial:
+            print(f"[{summary['model']} trial {summary['trial']}] {summary['wall']:.2f}s, success {summary['success']}, retries {summary['retries']}")
+            print(f"    {format_stages(summary['stages'], summary['other'], summary['wall'])}")
+            print(f"    llm: {format_llm(summary['llm'])}")
+
+    for model, model_summaries in summaries.items():
+        walls = [s["wall"] for s in model_summaries]
+        total = sum(walls)
+        stages = defaultdict(lambda: {"count": 0, "seconds": 0.0})
+        llm = defaultdict(float)
+        for summary in model_summaries:
+            for name, stage in summary["stages"].items():
+                stages[name]["count"] += stage["count"]
+                stages[name]["seconds"] += stage["seconds"]
+            for key in ("calls", "cached", "queue", "decode", "prompt_tokens", "output_tokens"):
+                llm[key] += summary["llm"][key]
+        ttfts = [s["llm"]["ttft"] for s in model_summaries if s["llm"]["ttft"] is not None]
+        llm = {
+            **{key: int(llm[key]) if key in ("calls", "cached", "prompt_tokens", "output_tokens") else llm[key] for key in llm},
+            "ttft": statistics.mean(ttfts) if ttfts else None,
+            "tokens_per_sec": llm["output_tokens"] / llm["decode"] if llm["decode"] else None,
+        }
+        print(
+            f"===== {model}: {len(model_summaries)} trials, {sum(bool(s['success']) for s in model_summaries)} successful,"
+            f" median {statistics.median(walls):.2f}s, total {total:.2f}s ====="
+        )
+        print(f"    {format_stages(dict(stages), sum(s['other'] for s in model_summaries), total)}")
+        print(f"    llm: {format_llm(llm)}")
+        print(format_generation([
+            r["attributes"] for r in spans
+            if r["name"] == "llm.request" and r["attributes"].get("model") == model
+        ]))
@@ -0,0 +1,129 @@
+"""
+Latency and structured-output reliability of the two LLM transports against the same model.
+
+Sends the same coder (or evaluator) request through the OpenAI-compatible endpoint and the native
+Ollama API, alternating between them so both see the same server state, and compares the time to
+first token, the total latency, the decode speed and how often the response parsed as-is, only
+after repair, or not at all. Runs against the mock server by default, or a real Ollama server
+with --base-url.
+
+usage: python transport_benchmark.py [--calls 10] [--role coder] [--base-url http://localhost:11434 --model gemma3:12b] [--num-ctx 8192 --num-thread 8]
+"""
+import argparse
+import contextlib
+import io
+import os
+import time
+
+import src.llm_cache as llm_cache
+import src.llm_client as llm_client
+from src.dataset_catalog import get_data_entries
+from src.llm_backend import BACKENDS, get_backend
+from src.llm_client import load_model
+from src.llm_scheduler import run_sync
+from src.metrics import percentile
+from src.mock_server import start_server
+from src.output_formats import CODER_OUTPUT_FORMAT, EVALUATOR_OUTPUT_FORMAT
+from src.utils import build_messages, get_coder_init_prompt, get_evaluator_init_prompt, get_evaluator_prompt, init_prompt
+
+CODE = "import pandas as pd\ndata = pd.read_csv('data.csv', index_col=0)\nprint(data['cluster'])\n"
+ERROR = "Traceback (most recent call last):\n  File \"<string>\", line 3, in <module>\nKeyError: 'cluster'"
+
+
+def call(backend, role, model_name, messages, temperature):
+    """
+    One request through a backend
+
+    Returns:
+        {"outcome": "ok" / "repaired" / "failed", "latency", "stats", "error"}
+    """
+    module = get_backend(backend)
+    get_response = module.async_get_coder_response if role == "coder" else module.async_get_evaluator_response
+    output_format = CODER_OUTPUT_FORMAT if role == "coder" else EVALUATOR_OUTPUT_FORMAT
+    output = io.StringIO()
+    start = time.perf_counter()
+    try:
+        # the streamed tokens are just noise here; the parser reports repairs on the same stream
+        with contextlib.redirect_stdout(output):
+            response, _, stats = run_sync(get_response(model_name, list(messages), temperature=temperature, return_stats=True))
+        output_format.model_validate(response)
+    except Exception as e:
+        return {"outcome": "failed", "latency": time.perf_counter() - start, "stats": None, "error": f"{type(e).__name__}: {e}"}
+    latency = time.perf_counter() - start
+    # a repaired response, or one whose text fields came back empty, did not follow the format
+    repaired = "[repaired" in output.getvalue() or any(
+        isinstance(response.get(name), str) and not response[name].strip() for name in output_format.model_fields
+    )
+    return {"outcome": "repaired" if repaired else "ok", "latency": latency, "stats": stats.to_dict(), "error": None}
+
+
+def summarize(backend, results):
+    def dist(values, unit="s", scale=1.0):
+        values = [v for v in values if v is not None]
+        if not values:
+            return "-"
+        return f"p50 {percentile(values, 50) * scale:.4g}{unit} p90 {percentile(values, 90) * scale:.4g}{unit}"
+
+    stats = [r["stats"] for r in results if r["stats"]]
+    counts = {outcome: sum(r["outcome"] == outcome for r in results) for outcome in ("ok", "repaired", "failed")}
+    print(
+        f"{backend:>7}: ok {counts['ok']}/{len(results)} | repaired {counts['repaired']} | failed {counts['failed']}"
+        f" | latency {dist([r['latency'] for r in results])} | ttft {dist([s['ttft'] for s in stats])}"
+    )
+    print(
+        f"{'':>7}  client {dist([s['tokens_per_sec'] for s in stats], ' tok/s')}"
+        f" | server prefill {dist([s['prefill_tokens_per_sec'] for s in stats], ' tok/s')} | server decode {dist([s['decode_tokens_per_sec'] for s in stats], ' tok/s')}"
+        f" | inter-token {dist([s['inter_token_p50'] for s in stats], 'ms', 1000)}"
+    )
+    for error in sorted({r["error"] for r in results if r["error"]}):
+        print(f"{'':>7}  error: {error[:200]}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=10, help="requests per backend")
+    parser.add_argument("--role", choices=("coder", "evaluator"), default="coder")
+    parser.add_argument("--base-url", help="real Ollama server (default: mock server)")
+    parser.add_argument("--model", default="mock")
+    parser.add_argument("--data", default="brca_umich_proteomics_imputed.csv")
+    parser.add_argument("--temperature", type=float, default=0.3)
+    parser.add_argument("--keep-alive", default=None, help="keep_alive sent with every request (e.g. 30m)")
+    parser.add_argument("--num-ctx", type=int, default=None)
+    parser.add_argument("--num-predict", type=int, default=None)
+    parser.add_argument("--num-thread", type=int, default=None)
+    args = parser.parse_args()
+
+    # every call has to reach the model
+    llm_cache.LLM_CACHE_MODE = "off"
+    for name, value in (("LLM_KEEP_ALIVE", args.keep_alive), ("LLM_NUM_CTX", args.num_ctx), ("LLM_NUM_PREDICT", args.num_predict), ("LLM_NUM_THREAD", args.num_thread)):
+        if value is not None:
+            setattr(llm_client, name, value)
+
+    server = None
+    if args.base_url:
+        llm_client.OLLAMA_URL = args.base_url
+        # load the model first so the first measured call does not include the load time
+        run_sync(load_model(args.model))
+    else:
+        server = start_server(ttft=0.1, tokens_per_sec=100, prefill_tokens_per_sec=2000)
+        llm_client.OLLAMA_URL = server.base_url
+
+    if os.path.exists(args.data):
+        data_entry = get_data_entries([args.data])
+    else:
+        data_entry = [{"file_path": args.data, "data_description": {"shape": (100, 10000), "columns (first 7)": [f"GENE{i}" for i in range(7)]}}]
+    prompt = init_prompt(data_entry, "Draw a clustermap of the 100 most variable genes per sample cluster and print the genes of each cluster.")
+    if args.role == "coder":
+        messages = build_messages(prompt, get_coder_init_prompt(data_entry[0]["file_path"]))
+    else:
+        messages = build_messages(prompt, get_evaluator_init_prompt()) + get_evaluator_prompt(CODE, ERROR)
+
+    results = {backend: [] for backend in BACKENDS}
+    for _ in range(args.calls):
+        for backend in BACKENDS:
+            results[backend].append(call(backend, args.role, args.model, messages, args.temperature))
+    print(f"{args.model}, {args.role} requests, {args.calls} per backend")
+    for backend, backend_results in results.items():
+        summarize(backend, backend_results)
+    if server is not None:
+        server.shutdown()
@@ -0,0 +1,115 @@
+"""
+Coverage and accuracy of the rule-based error triage (src/error_triage.py).
+
+Runs a labeled set of failing snippets, typical of generated visualization code, and checks the
+failure class the rules assign against the expected one. Ambiguous failures are labeled None:
+they must go to the evaluator, and a rule answering them counts as a false positive. With --logs,
+the tracebacks found in benchmark trial logs are triaged too, to measure coverage on real errors.
+
+usage: python triage_report.py [--logs "benchmark_results_*/trial_*.log"]
+"""
+import argparse
+import glob
+import os
+import re
+import tempfile
+from collections import Counter
+
+import pandas as pd
+
+from src.error_triage import classify_error
+from src.exec_worker import run_snippet
+
+HEADER = "import pandas as pd\nimport numpy as np\ndata = pd.read_csv({path!r}, index_col=0)\n"
+
+# (expected class or None, code run after HEADER)
+CASES = [
+    ("missing_column", "print(data['TP53'])"),
+    ("missing_column", "print(data[['sample_1', 'smaple_2']])"),
+    ("missing_column", "data = data.set_index('gene')"),
+    ("missing_column", "print(data.loc['GENE_9999'])"),
+    ("module_not_found", "import pycomplexheatmap"),
+    ("module_not_found", "import scanpy as sc"),
+    ("import_path", "from sklearn.clustering import KMeans"),
+    ("import_name", "from scipy.cluster.hierarchy import linkages"),
+    ("missing_import", "import seaborn\ng = sns.clustermap(data)"),
+    ("missing_import", "z = linkage(data.values, 'ward')"),
+    ("undefined_name", "print(cluster_colors)"),
+    ("file_not_found", "other = pd.read_csv('data/brca.csv')"),
+    ("unexpected_argument", "import seaborn as sns\ng = sns.clustermap(data, col_color=None)"),
+    ("unexpected_argument", "print(data.var(axis=1, skip_na=True))"),
+    ("module_attribute", "print(np.variance(data.values))"),
+    ("module_attribute", "import seaborn as sns\nsns.heatmapp(data)"),
+    ("non_numeric_data", "data['label'] = 'x'\nprint(data.values.astype(float))"),
+    # ambiguous: the fix depends on what the code is trying to do
+    (None, "print(data.values.reshape(7, 3))"),
+    (None, "import numpy as np\nprint(np.linalg.inv(np.zeros((3, 3))))"),
+    (None, "print(data.iloc[:, 100])"),
+    (None, "print(data / 'x')"),
+    (None, "assert len(data) > 100, 'not enough samples'"),
+    (None, "raise RuntimeError('clustering did not converge')"),
+    (None, "print(1 / 0)"),
+    (None, "print(dict(a=1)[0])"),
+]
+
+
+def make_dataset(directory):
+    """
+    Small expression-like table: genes as rows, samples as columns
+    """
+    path = os.path.join(directory, "expression.csv")
+    genes = [f"GENE_{i}" for i in range(20)]
+    values = [[(i * 7 + j * 3) % 11 / 10 for j in range(6)] for i in range(20)]
+    pd.DataFrame(values, index=pd.Index(genes, name="gene"), columns=[f"sample_{j + 1}" for j in range(6)]).to_csv(path)
+    return path
+
+
+def read_log_errors(paths):
+    """
+    Tracebacks printed by the retry loop ("====error====" blocks) in trial logs
+    """
+    errors = []
+    for path in paths:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            text = f.read()
+        for block in re.findall(r"=+error=+\n(.*?)(?=\n=+|\Z)", text, flags=re.DOTALL):
+            errors.append(block.strip())
+    return errors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logs", default=None, help="glob of trial logs to measure coverage on real tracebacks")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = make_dataset(directory)
+        schema = {path: set(pd.read_csv(path, index_col=0, nrows=0).columns)}
+        rows = []
+        for expected, snippet in CASES:
+            code = HEADER.format(path=path) + snippet
+            error = run_snippet(code)["error"]
+            triage = classify_error(error, code, schema)
+            rows.append((expected, triage["error_class"] if triage else None, snippet, triage))
+
+    classified = [row for row in rows if row[1] is not None]
+    mechanical = [row for row in rows if row[0] is not None]
+    correct = [row for row in classified if row[0] == row[1]]
+    false_positives = [row for row in classified if row[0] is None]
+    print(f"{'expected':<20} {'triaged as':<20} snippet")
+    for expected, actual, snippet, _ in rows:
+        mark = "ok" if expected == actual else "MISS"
+        print(f"{str(expected):<20} {str(actual):<20} {mark:<4} {snippet.splitlines()[-1][:60]}")
+    print()
+    print(f"coverage of mechanical errors: {sum(1 for row in mechanical if row[1] is not None)}/{len(mechanical)}")
+    print(f"accuracy of triaged errors:    {len(correct)}/{len(classified)}")
+    print(f"ambiguous errors triaged:      {len(false_positives)}/{len(rows) - len(mechanical)} (should be 0)")
+
+    if args.logs:
+        errors = read_log_errors(sorted(glob.glob(args.logs)))
+        results = [classify_error(error) for error in errors]
+        counts = Counter(result["error_class"] if result else "evaluator" for result in results)
+        print()
+        print(f"{len(errors)} tracebacks in {args.logs}: {len(errors) - counts['evaluator']} triaged ({(len(errors) - counts['evaluator']) / max(len(errors), 1):.0%})")
+        for name, count in counts.most_common():
+            print(f"  {name:<20} {count}")